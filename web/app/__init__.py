@@ -15,25 +15,45 @@ def create_app(config_class=DevConfig):
     app.config.from_object(config_class)
     db.init_app(app)
 
+    # Funciones SQL de la búsqueda libre (similarity() en SQLite)
+    from . import busqueda
+    busqueda.init_app(app)
+
+    # Caché compartida entre workers (CACHE_URL)
+    from . import cache
+    cache.init_app(app)
+
     # Blueprints centralizados en app.blueprints
     from .blueprints import (
         core_bp,
         trabajadores_bp,
         contratos_bp,
         obras_bp,
+        documentos_bp,
+        api_bp,
     )
-    from .blueprints.documentos import documentos_bp
 
     app.register_blueprint(core_bp)
     app.register_blueprint(trabajadores_bp)
     app.register_blueprint(contratos_bp)
     app.register_blueprint(obras_bp)
     app.register_blueprint(documentos_bp)
+    app.register_blueprint(api_bp)
 
     from .models import Trabajador  # fuerza carga de modelos
+    from . import catalogos  # noqa: F401  (eventos que invalidan la caché de tablas maestras)
+
+    # Versión de código para los ETag de las fichas (app/condicional.py)
+    from . import condicional
+    condicional.init_app(app)
+
+    # {% cache %} para filas de listados (app/fragmentos.py)
+    from . import fragmentos
+    fragmentos.init_app(app)
 
     with app.app_context():
         db.create_all()
+        _actualizar_esquema(app)
 
     # Registrar comandos CLI
     from .cli import register_cli
@@ -41,3 +61,25 @@ def create_app(config_class=DevConfig):
 
 
     return app
+
+
+def _actualizar_esquema(app):
+    """
+    Columnas nuevas en tablas que ya existían (create_all no hace ALTER):
+    se agregan al arrancar y, la primera vez, se llenan. Equivale a correr
+    `flask reindexar-busqueda` y `flask recalcular-derivados`.
+    """
+    from .busqueda import asegurar_esquema_busqueda, recalcular_busqueda
+    from .derivados import asegurar_esquema_derivados, recalcular_derivados
+
+    if asegurar_esquema_busqueda():
+        app.logger.warning("Columna trabajadores.busqueda agregada; calculándola...")
+        recalcular_busqueda()
+        # Suelta la transacción de la sesión: el ALTER siguiente va por otra conexión
+        db.session.remove()
+
+    agregadas = asegurar_esquema_derivados()
+    if agregadas:
+        app.logger.warning("Columnas derivadas agregadas (%s); calculándolas...", ", ".join(agregadas))
+        recalcular_derivados(confirmar=True)
+        db.session.remove()
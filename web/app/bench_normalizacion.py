@@ -0,0 +1,102 @@
+# web/app/bench_normalizacion.py
+
+"""
+Micro-benchmark de app/normalizacion.py sobre un corpus sintético de
+nombres y apellidos chilenos (por defecto un millón).
+
+Compara la implementación anterior (NFD + unicodedata.category por
+carácter) con la tabla Latin-1 sin caché y con caché, y verifica que las
+tres den exactamente el mismo resultado.
+
+Uso (desde web/):
+    python -m app.bench_normalizacion
+    python -m app.bench_normalizacion --n 200000 --semilla 7
+"""
+
+import argparse
+import random
+import time
+
+from .normalizacion import normalizar_texto, sin_tildes_unicode
+
+
+NOMBRES = [
+    "Héctor David", "María José", "José Ignacio", "Sebastián", "Matías", "Benjamín",
+    "Martín", "Joaquín", "Agustín", "Tomás", "Lucía", "Sofía", "Valentina", "Catalina",
+    "Ramón", "Víctor Hugo", "Germán", "Rubén", "Iván", "Ángel", "Begoña", "Inés",
+    "Juan Pablo", "Pedro", "Luis Alberto", "Cristóbal", "Nicolás", "Andrés", "Raúl",
+]
+
+APELLIDOS = [
+    "Paillaleve", "Guineo", "Núñez", "González", "Muñoz", "Rojas", "Díaz", "Pérez",
+    "Soto", "Contreras", "Silva", "Martínez", "Sepúlveda", "Morales", "Rodríguez",
+    "López", "Fuentes", "Hernández", "Torres", "Araya", "Flores", "Espinoza", "Valdés",
+    "Castillo", "Tapia", "Reyes", "Gutiérrez", "Castro", "Pizarro", "Álvarez", "Vásquez",
+    "Sánchez", "Fernández", "Ramírez", "Carrasco", "Gómez", "Cortés", "Herrera", "Nahuelpán",
+    "Huenchumilla", "Ñanculeo", "Peña", "Müller", "Quiñones", "Ibáñez", "Cárdenas",
+]
+
+# Entradas poco comunes: fuerzan el camino Unicode completo
+RAROS = ["Łukasz", "Dvořák", "Ğülşen", "Nguyễn", "Zoë", "José", "Şahin"]
+
+
+def _referencia(texto: str) -> str:
+    """Implementación anterior de config.py (para comparar)."""
+    if not texto:
+        return ""
+    return sin_tildes_unicode(texto.strip().upper())
+
+
+def generar_corpus(n: int, semilla: int) -> list[str]:
+    azar = random.Random(semilla)
+    corpus = []
+    for i in range(n):
+        r = azar.random()
+        if r < 0.001:
+            valor = azar.choice(RAROS)
+        elif r < 0.35:
+            valor = azar.choice(NOMBRES)
+        else:
+            valor = azar.choice(APELLIDOS)
+        # Variantes de mayúsculas/espacios como vienen en las planillas
+        if i % 3 == 0:
+            valor = f" {valor.upper()} "
+        corpus.append(valor)
+    return corpus
+
+
+def _medir(nombre: str, funcion, corpus: list[str]):
+    inicio = time.perf_counter()
+    resultado = [funcion(v) for v in corpus]
+    segundos = time.perf_counter() - inicio
+    print(f"  {nombre:<28} {segundos:8.3f} s   {len(corpus) / segundos / 1e6:6.2f} M/s")
+    return resultado, segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=1_000_000, help="Cantidad de nombres del corpus.")
+    parser.add_argument("--semilla", type=int, default=2024)
+    args = parser.parse_args()
+
+    corpus = generar_corpus(args.n, args.semilla)
+    print(f"Corpus: {len(corpus):,} nombres ({len(set(corpus)):,} distintos)")
+
+    referencia, t_ref = _medir("NFD + category (anterior)", _referencia, corpus)
+    sin_cache, t_tabla = _medir("tabla Latin-1, sin caché", normalizar_texto.__wrapped__, corpus)
+    normalizar_texto.cache_clear()
+    con_cache, t_cache = _medir("tabla Latin-1 + LRU", normalizar_texto, corpus)
+
+    if not (referencia == sin_cache == con_cache):
+        distintos = next(
+            (v, a, b, c) for v, a, b, c in zip(corpus, referencia, sin_cache, con_cache)
+            if not a == b == c
+        )
+        raise SystemExit(f"❌ Resultados distintos: {distintos}")
+
+    print(f"✅ Resultados idénticos. Aceleración: tabla ×{t_ref / t_tabla:.1f}, "
+          f"tabla + caché ×{t_ref / t_cache:.1f}  ({normalizar_texto.cache_info()})")
+
+
+if __name__ == "__main__":
+    main()
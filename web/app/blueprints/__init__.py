@@ -12,3 +12,5 @@ from .core import bp as core_bp
 from .trabajadores import bp as trabajadores_bp
 from .contratos import bp as contratos_bp
 from .obras import bp as obras_bp
+from .documentos import bp as documentos_bp
+from .api import bp as api_bp
@@ -0,0 +1,320 @@
+# web/app/blueprints/api/routes.py
+
+"""
+Endpoints JSON livianos para autocompletar (typeahead) en formularios.
+
+    GET /api/buscar/trabajadores?q=paill&limite=10
+    GET /api/buscar/obras?q=quin
+    GET /api/buscar/cargos?q=maes
+    GET /api/buscar/empleadores?q=vale
+    GET /api/catalogos/estado   (aciertos / fallos de app/catalogos.py)
+    GET /api/cache/estado       (caché compartida de app/cache.py)
+    GET /api/fragmentos/estado  (aciertos por fragmento de app/fragmentos.py)
+
+Responden solo lo necesario para armar la opción (id, rut, texto).
+
+Obras, cargos y empleadores salen de app/catalogos.py y se cachean en
+memoria por prefijo: si "PAIL" ya trajo la lista completa, "PAILL" se
+resuelve filtrando esa lista. Las entradas llevan la versión de los
+catálogos, así una edición no deja opciones viejas.
+
+Trabajadores va siempre a la base de datos (índices de prefijo y de
+trigramas, con presupuesto de tiempo): no hay un sello barato de esa
+tabla y un trabajador recién creado tiene que aparecer al tiro en el
+formulario de contrato.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, jsonify, request
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from ... import catalogos
+from ...cache import obtener_cache
+from ...extensions import db
+from ...models import Trabajador
+from ...busqueda import filtro_busqueda, ranking_busqueda, escapar_like
+from ...config import normalizar_consulta_busqueda, normalizar_texto_busqueda
+
+from . import bp
+
+
+LIMITE_DEFECTO = 10
+LIMITE_MAXIMO = 50
+
+# Presupuesto de tiempo por consulta; si se excede se responde vacío y "parcial".
+PRESUPUESTO_MS = 150
+
+
+# ==========================
+# Caché por prefijo
+# ==========================
+
+class _CachePrefijos:
+    """
+    LRU con TTL de resultados por (tipo, modo, término, límite).
+
+    Una entrada es "completa" si trajo menos filas que el límite: en ese
+    caso contiene TODAS las coincidencias y sirve para cualquier término
+    más largo que la extienda.
+    """
+
+    def __init__(self, max_entradas: int = 512, ttl: int = 30):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()   # la comparten los hilos del worker
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _vigente(self, clave):
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            return None
+        expira, completa, items = entrada
+        if expira < time.monotonic():
+            self._datos.pop(clave, None)
+            return None
+        self._datos.move_to_end(clave)
+        return completa, items
+
+    def obtener(self, tipo, modo, termino, limite, filtrar):
+        with self._lock:
+            exacta = self._vigente((tipo, modo, termino, limite))
+            if exacta is not None:
+                self.aciertos += 1
+                return exacta[1]
+
+            previa = None
+            for largo in range(len(termino) - 1, 0, -1):
+                previa = self._vigente((tipo, modo, termino[:largo], limite))
+                if previa is not None and previa[0]:
+                    self.aciertos += 1
+                    break
+            else:
+                self.fallos += 1
+                return None
+
+        items = filtrar(previa[1], termino)
+        self.guardar(tipo, modo, termino, limite, items)
+        return items
+
+    def guardar(self, tipo, modo, termino, limite, items):
+        completa = len(items) < limite
+        with self._lock:
+            self._datos[(tipo, modo, termino, limite)] = (time.monotonic() + self.ttl, completa, items)
+            self._datos.move_to_end((tipo, modo, termino, limite))
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+
+_cache = _CachePrefijos()
+
+
+def _coincide(texto: str, termino: str, modo: str) -> bool:
+    tokens = termino.split()
+    if modo == "rut" and not texto.startswith(tokens.pop(0)):
+        return False
+    return all(token in texto for token in tokens)
+
+
+def _filtrar_en_orden(items, termino, modo="texto"):
+    return [i for i in items if _coincide(i["_texto"], termino, modo)]
+
+
+# ==========================
+# Presupuesto de latencia
+# ==========================
+
+@contextmanager
+def _presupuesto(ms: int):
+    """
+    Corta la consulta si pasa de `ms` milisegundos.
+    PostgreSQL: statement_timeout local a la transacción.
+    SQLite: progress handler que interrumpe la sentencia.
+    """
+    conexion = db.session.connection()
+    dialecto = conexion.dialect.name
+
+    if dialecto == "postgresql":
+        conexion.execute(text(f"SET LOCAL statement_timeout = {int(ms)}"))
+        yield
+        return
+
+    if dialecto == "sqlite":
+        crudo = conexion.connection.dbapi_connection
+        limite = time.monotonic() + ms / 1000
+        crudo.set_progress_handler(lambda: int(time.monotonic() > limite), 1000)
+        try:
+            yield
+        finally:
+            crudo.set_progress_handler(None, 0)
+        return
+
+    yield
+
+
+# ==========================
+# Búsquedas por tipo
+# ==========================
+
+def _buscar_trabajadores(termino, modo, limite, consulta):
+    query = db.session.query(
+        Trabajador.id,
+        Trabajador.rut,
+        Trabajador.nombres,
+        Trabajador.ap_paterno,
+        Trabajador.ap_materno,
+    )
+    if modo == "rut":
+        # Prefijo del RUT: usa el índice varchar_pattern_ops en PostgreSQL;
+        # el resto de las palabras, como en la búsqueda de texto
+        rut, _, resto = termino.partition(" ")
+        query = query.filter(Trabajador.busqueda.like(f"{escapar_like(rut)}%", escape="\\"))
+        if resto:
+            query = query.filter(filtro_busqueda(Trabajador.busqueda, resto))
+        query = query.order_by(Trabajador.busqueda)
+    else:
+        query = query.filter(filtro_busqueda(Trabajador.busqueda, consulta))
+        query = query.order_by(
+            ranking_busqueda(Trabajador.busqueda, consulta).desc(),
+            Trabajador.ap_paterno,
+            Trabajador.id,
+        )
+
+    return [
+        {
+            "id": f.id,
+            "rut": f.rut,
+            "texto": f"{f.nombres} {f.ap_paterno} {f.ap_materno}",
+        }
+        for f in query.limit(limite)
+    ]
+
+
+def _buscar_catalogo(filas, termino, modo, limite):
+    """Catálogos chicos: se filtran normalizados en Python (insensible a tildes)."""
+    return _filtrar_en_orden(filas, termino, modo)[:limite]
+
+
+def _filas_obras():
+    return [
+        {
+            "id": o.id,
+            "codigo": o.codigo,
+            "texto": o.nombre + (f" ({o.centro_costo})" if o.centro_costo else ""),
+            "_texto": normalizar_texto_busqueda(f"{o.codigo} {o.nombre} {o.centro_costo or ''}"),
+        }
+        for o in catalogos.obras_activas()
+    ]
+
+
+def _filas_cargos():
+    return [
+        {
+            "id": c.id,
+            "texto": c.nombre,
+            "_texto": normalizar_texto_busqueda(c.nombre),
+        }
+        for c in catalogos.cargos_por_nombre()
+    ]
+
+
+def _filas_empleadores():
+    return [
+        {
+            "id": e.id,
+            "rut": e.rut,
+            "texto": e.razon_social,
+            "_texto": normalizar_texto_busqueda(f"{e.razon_social} {e.rut or ''}"),
+        }
+        for e in catalogos.empleadores()
+    ]
+
+
+_CATALOGOS = {
+    "obras": _filas_obras,
+    "cargos": _filas_cargos,
+    "empleadores": _filas_empleadores,
+}
+
+
+def _modo(termino: str) -> str:
+    """
+    Si empieza con un dígito, la primera palabra se busca como prefijo de
+    RUT ("12345", "12345678K", "1234 PAILL"): la columna de búsqueda parte
+    con el RUT pegado. Las demás palabras se buscan como en modo texto.
+    """
+    return "rut" if termino[:1].isdigit() else "texto"
+
+
+@bp.route("/buscar/<tipo>")
+def buscar(tipo):
+    if tipo != "trabajadores" and tipo not in _CATALOGOS:
+        return jsonify({"error": f"Tipo de búsqueda desconocido: {tipo}"}), 404
+
+    consulta = request.args.get("q", "", type=str)
+    limite = request.args.get("limite", LIMITE_DEFECTO, type=int)
+    limite = min(max(limite, 1), LIMITE_MAXIMO)
+
+    termino = normalizar_consulta_busqueda(consulta)
+    if not termino:
+        return jsonify({"q": consulta, "resultados": []})
+
+    modo = _modo(termino)
+    items, parcial = None, False
+    if tipo != "trabajadores":
+        clave = (tipo, catalogos.version())
+        items = _cache.obtener(clave, modo, termino, limite, lambda xs, t: _filtrar_en_orden(xs, t, modo))
+
+    if items is None:
+        presupuesto = current_app.config.get("API_BUSCAR_PRESUPUESTO_MS", PRESUPUESTO_MS)
+        try:
+            with _presupuesto(presupuesto):
+                if tipo == "trabajadores":
+                    items = _buscar_trabajadores(termino, modo, limite, consulta)
+                else:
+                    items = _buscar_catalogo(_CATALOGOS[tipo](), termino, modo, limite)
+        except OperationalError:
+            db.session.rollback()
+            current_app.logger.warning("Búsqueda %s '%s' excedió %s ms", tipo, termino, presupuesto)
+            items, parcial = [], True
+        else:
+            if tipo != "trabajadores":
+                _cache.guardar(clave, modo, termino, limite, items)
+
+    respuesta = jsonify({
+        "q": consulta,
+        "resultados": [
+            {k: v for k, v in item.items() if not k.startswith("_")}
+            for item in items[:limite]
+        ],
+        "parcial": parcial,
+    })
+    # Trabajadores: sin caché del navegador, por la misma razón que arriba
+    respuesta.headers["Cache-Control"] = (
+        "private, no-cache" if tipo == "trabajadores" else "private, max-age=30"
+    )
+    return respuesta
+
+
+@bp.route("/catalogos/estado")
+def estado_catalogos():
+    """Contadores de la caché de tablas maestras de este worker."""
+    return jsonify(catalogos.estadisticas())
+
+
+@bp.route("/cache/estado")
+def estado_cache():
+    """Contadores de la caché compartida, vistos desde este worker."""
+    return jsonify(obtener_cache().estadisticas())
+
+
+@bp.route("/fragmentos/estado")
+def estado_fragmentos():
+    """Caché de fragmentos de plantilla de este worker."""
+    return jsonify(current_app.jinja_env.fragmentos.estadisticas())
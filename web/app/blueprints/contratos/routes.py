@@ -1,55 +1,154 @@
 # web/app/blueprints/contratos/routes.py
 
-from flask import render_template, request, redirect, url_for, flash
+from datetime import date
 
-from sqlalchemy import or_
+from flask import abort, render_template, request, redirect, url_for, flash
 
+from sqlalchemy import func
+from sqlalchemy.orm import contains_eager, load_only
+
+from ... import catalogos
+from ...condicional import respuesta_condicional, validador_contrato
 from ...extensions import db
 from ...models import Trabajador, Obra, Cargo, Contrato, Empleador
 from ...utils import parse_date, parse_int, parse_decimal
+from ...paginacion import Clave, paginar_listado, contar_exacto, listado_completo, responder_en_stream
+from ...exportar import FORMATOS_EXPORTACION, iterar_filas, respuesta_exportacion
 
 from . import bp
 
 
+# Orden del listado = clave del cursor (fecha_inicio puede venir vacía)
+CLAVES_CONTRATOS = [
+    Clave(Obra.nombre),
+    Clave(Trabajador.ap_paterno),
+    Clave(Trabajador.ap_materno),
+    Clave(func.coalesce(Contrato.fecha_inicio, date(1900, 1, 1)), desc=True),
+    Clave(Contrato.id, desc=True),
+]
+
+
+# Columnas de la exportación: mismos nombres que lee import_contratos_quintero
+ENCABEZADOS_CONTRATOS = [
+    "RUT",
+    "TRABAJADOR",
+    "EMPLEADOR",
+    "OBRA",
+    "CARGO",
+    "TIPO_CONTRATO",
+    "FECHA_INICIO",
+    "FECHA_TERMINO",
+    "JORNADA",
+    "HORAS_SEMANALES",
+    "SUELDO_BASE",
+    "ASIG_MOVILIZACION",
+    "ASIG_COLACION",
+    "ASIG_HERRAMIENTAS",
+    "ESTADO_CONTRATO",
+    "CAUSAL_TERMINO",
+    "FECHA_FINIQUITO",
+]
+
+
+def _leer_filtros(args) -> dict:
+    return {
+        "empleador_id": args.get("empleador_id", type=int),
+        "obra_id": args.get("obra_id", type=int),
+        # Sin parámetro se muestran los VIGENTES; "Todos" llega como estado=""
+        "estado": args.get("estado", "VIGENTE", type=str),
+    }
+
+
+def _filtrar_contratos(query, filtros: dict):
+    if filtros["empleador_id"]:
+        query = query.filter(Contrato.empleador_id == filtros["empleador_id"])
+
+    if filtros["obra_id"]:
+        query = query.filter(Contrato.obra_id == filtros["obra_id"])
+
+    if filtros["estado"]:
+        query = query.filter(Contrato.estado_contrato == filtros["estado"])
+
+    return query
+
+
 @bp.route("/")
 def lista_contratos():
-    empleador_id = request.args.get("empleador_id", type=int)
-    obra_id = request.args.get("obra_id", type=int)
-    estado = request.args.get("estado", type=str)
-
+    filtros_url = _leer_filtros(request.args)
+    empleador_id = filtros_url["empleador_id"]
+    obra_id = filtros_url["obra_id"]
+    estado = filtros_url["estado"]
+    imprimir = request.args.get("imprimir", type=int) == 1
+    per_page = 50
+
+    # Un solo SELECT con los joins, cargando solo las columnas que usa
+    # contratos.html (nada de lazy loads por fila).
     query = (
         Contrato.query
-        .join(Trabajador)
-        .join(Obra)
-        .outerjoin(Empleador)
+        .join(Trabajador, Contrato.trabajador_id == Trabajador.id)
+        .join(Obra, Contrato.obra_id == Obra.id)
+        .outerjoin(Empleador, Contrato.empleador_id == Empleador.id)
+        .outerjoin(Cargo, Contrato.cargo_id == Cargo.id)
+        .options(
+            load_only(
+                Contrato.tipo_contrato,
+                Contrato.fecha_inicio,
+                Contrato.fecha_termino,
+                Contrato.estado_contrato,
+                # Clave de {% cache %} de la fila
+                Contrato.actualizado_en,
+                Contrato.creado_en,
+            ),
+            contains_eager(Contrato.trabajador).load_only(
+                Trabajador.rut,
+                Trabajador.nombres,
+                Trabajador.ap_paterno,
+                Trabajador.ap_materno,
+                Trabajador.actualizado_en,
+                Trabajador.creado_en,
+            ),
+            contains_eager(Contrato.obra).load_only(Obra.nombre, Obra.centro_costo),
+            contains_eager(Contrato.empleador).load_only(Empleador.razon_social),
+            contains_eager(Contrato.cargo).load_only(Cargo.nombre),
+        )
     )
 
-    if empleador_id:
-        query = query.filter(Contrato.empleador_id == empleador_id)
-
-    if obra_id:
-        query = query.filter(Contrato.obra_id == obra_id)
-
-    if estado:
-        query = query.filter(Contrato.estado_contrato == estado)
-
-    contratos = (
-        query
-        .order_by(
-            Obra.nombre,
-            Trabajador.ap_paterno,
-            Trabajador.ap_materno,
-            Contrato.fecha_inicio.desc()
+    query = _filtrar_contratos(query, filtros_url)
+
+    total_registros = contar_exacto(query, Contrato.id)
+    if imprimir:
+        # Listado completo sin paginar: las filas se leen mientras se envían
+        contratos = listado_completo(query, CLAVES_CONTRATOS)
+        pagina, page, total_pages = None, 1, 1
+    else:
+        pagina, page, total_pages = paginar_listado(
+            query,
+            CLAVES_CONTRATOS,
+            request.args,
+            total_registros,
+            per_page,
         )
-        .all()
-    )
+        contratos = pagina.items
 
-    empleadores = Empleador.query.order_by(Empleador.razon_social).all()
-    obras = Obra.query.order_by(Obra.nombre).all()
+    empleadores = catalogos.empleadores()
+    obras = catalogos.obras()
 
-    return render_template(
+    # Filtros vigentes, para repetirlos en los links del paginador
+    filtros = {"estado": estado}
+    if empleador_id:
+        filtros["empleador_id"] = empleador_id
+    if obra_id:
+        filtros["obra_id"] = obra_id
+
+    return responder_en_stream(
         "contratos.html",
         contratos=contratos,
+        pagina=pagina,
+        imprimir=imprimir,
+        page=page,
+        total_pages=total_pages,
+        total_registros=total_registros,
+        filtros=filtros,
         empleadores=empleadores,
         obras=obras,
         filtro_empleador_id=empleador_id,
@@ -58,6 +157,53 @@ def lista_contratos():
     )
 
 
+@bp.route("/exportar.<formato>")
+def exportar_contratos(formato):
+    """
+    Descarga todos los contratos que cumplen los filtros de la lista
+    (mismos parámetros) como CSV ';' con BOM o XLSX, en streaming.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        abort(404)
+
+    query = (
+        db.session.query(
+            Trabajador.rut,
+            Trabajador.nombres,
+            Trabajador.ap_paterno,
+            Trabajador.ap_materno,
+            Empleador.razon_social,
+            Obra.nombre,
+            Cargo.nombre,
+            Contrato.tipo_contrato,
+            Contrato.fecha_inicio,
+            Contrato.fecha_termino,
+            Contrato.jornada,
+            Contrato.horas_semanales,
+            Contrato.sueldo_base,
+            Contrato.asignacion_movilizacion,
+            Contrato.asignacion_colacion,
+            Contrato.asignacion_herramientas,
+            Contrato.estado_contrato,
+            Contrato.causal_termino,
+            Contrato.fecha_finiquito,
+        )
+        .select_from(Contrato)
+        .join(Trabajador, Contrato.trabajador_id == Trabajador.id)
+        .join(Obra, Contrato.obra_id == Obra.id)
+        .outerjoin(Empleador, Contrato.empleador_id == Empleador.id)
+        .outerjoin(Cargo, Contrato.cargo_id == Cargo.id)
+    )
+    query = _filtrar_contratos(query, _leer_filtros(request.args))
+    query = query.order_by(*[c.expr.desc() if c.desc else c.expr for c in CLAVES_CONTRATOS])
+
+    filas = (
+        (f[0], " ".join(p for p in f[1:4] if p), *f[4:])
+        for f in iterar_filas(query)
+    )
+    return respuesta_exportacion(formato, "contratos", ENCABEZADOS_CONTRATOS, filas)
+
+
 @bp.route("/nuevo", methods=["GET", "POST"])
 def nuevo_contrato():
     trabajador_id_param = request.args.get("trabajador_id") or request.form.get("trabajador_id")
@@ -164,9 +310,9 @@ def nuevo_contrato():
         return redirect(url_for("trabajadores.detalle_trabajador", trabajador_id=trabajador.id))
 
     # GET
-    empleadores = Empleador.query.order_by(Empleador.razon_social).all()
-    obras = Obra.query.filter_by(estado="ACTIVA").order_by(Obra.nombre).all()
-    cargos = Cargo.query.order_by(Cargo.nombre).all()
+    empleadores = catalogos.empleadores()
+    obras = catalogos.obras_activas()
+    cargos = catalogos.cargos_por_nombre()
 
     empleador_default_id = None
     obra_default_id = None
@@ -189,6 +335,7 @@ def nuevo_contrato():
 
 
 @bp.route("/<int:contrato_id>")
+@respuesta_condicional(validador_contrato)
 def contrato_detalle(contrato_id):
     contrato = Contrato.query.get_or_404(contrato_id)
     return render_template("contrato_detalle.html", contrato=contrato)
@@ -1,105 +1,185 @@
 # web/app/blueprints/core/routes.py
 
-from flask import render_template, request
-from sqlalchemy import or_
+from flask import abort, request
+from sqlalchemy.orm import contains_eager
 
+from ... import catalogos
+from ...cache import obtener_cache
 from ...extensions import db
-from ...models import Trabajador, Obra
+from ...models import Trabajador, Obra, Cargo
+from ...busqueda import filtro_busqueda, ranking_busqueda
+from ...paginacion import (
+    Clave,
+    paginar_listado,
+    contar_exacto,
+    contar_tabla,
+    listado_completo,
+    responder_en_stream,
+)
+from ...exportar import FORMATOS_EXPORTACION, iterar_filas, respuesta_exportacion
 
 from . import bp
 
 
-@bp.route("/")
-def index():
-    # Filtros antiguos
-    q = request.args.get("q", type=str)
-    obra_id = request.args.get("obra_id", type=int)
-    estado = request.args.get("estado", type=str)
-
-    # Filtros nuevos
-    obra_nombre = request.args.get("obra", "", type=str).strip()
-    cargo = request.args.get("cargo", "", type=str).strip()
-
-    # Paginación
-    page = request.args.get("page", 1, type=int)
-    per_page = 25
-
-    # Base query con join a Obra
-    query = Trabajador.query.join(Obra)
-
-    # 1) Filtro de búsqueda libre
-    if q:
-        texto = f"%{q.strip()}%"
-        query = query.filter(
-            or_(
-                Trabajador.rut.ilike(texto),
-                Trabajador.nombres.ilike(texto),
-                Trabajador.ap_paterno.ilike(texto),
-                Trabajador.ap_materno.ilike(texto),
-            )
-        )
+# Los cargos asignados cambian con cada alta; basta con refrescarlos cada minuto
+CARGOS_ASIGNADOS_TTL = 60
+
+# Orden del listado = clave del cursor. El id desempata apellidos repetidos.
+CLAVES_TRABAJADORES = [
+    Clave(Obra.nombre),
+    Clave(Trabajador.ap_paterno),
+    Clave(Trabajador.ap_materno),
+    Clave(Trabajador.id),
+]
+
+# Mismos nombres de columna que lee import_trabajadores_quintero (+ cargo y estado)
+ENCABEZADOS_TRABAJADORES = [
+    "RUT",
+    "Nombres",
+    "Ap. Paterno",
+    "Ap. Materno",
+    "Fecha Nacimiento",
+    "Nacionalidad",
+    "Sexo",
+    "Estado Civil",
+    "Dirección Trabajador",
+    "Comuna Trabajador",
+    "Fono",
+    "Fono Emergencia",
+    "Correo electrónico",
+    "Obra",
+    "Cargo",
+    "Estado",
+]
+
+
+def _leer_filtros(args) -> dict:
+    """Filtros del listado de trabajadores, tal como vienen en la URL."""
+    return {
+        # Filtros antiguos
+        "q": args.get("q", type=str),
+        "obra_id": args.get("obra_id", type=int),
+        "estado": args.get("estado", type=str),
+        # Filtros nuevos
+        "obra": args.get("obra", "", type=str).strip(),
+        "cargo": args.get("cargo", "", type=str).strip(),
+    }
+
+
+def _filtrar_trabajadores(query, filtros: dict):
+    """
+    Aplica los filtros del listado a una query que ya tiene join a Obra
+    y outerjoin a Cargo. Devuelve (query, claves de orden).
+    La usan tanto la vista HTML como la exportación.
+    """
+    claves = CLAVES_TRABAJADORES
+
+    # 1) Filtro de búsqueda libre (columna normalizada, sin tildes)
+    if filtros["q"]:
+        condicion = filtro_busqueda(Trabajador.busqueda, filtros["q"])
+        if condicion is not None:
+            query = query.filter(condicion)
+            # Los más parecidos primero; el resto de la clave desempata
+            claves = [Clave(ranking_busqueda(Trabajador.busqueda, filtros["q"]), desc=True)] + claves
 
     # 2) Filtro por obra (ID)
-    if obra_id:
-        query = query.filter(Trabajador.obra_id == obra_id)
+    if filtros["obra_id"]:
+        query = query.filter(Trabajador.obra_id == filtros["obra_id"])
 
     # 3) Filtro por estado laboral
-    if estado:
-        query = query.filter(Trabajador.estado_trabajador == estado)
+    if filtros["estado"]:
+        query = query.filter(Trabajador.estado_trabajador == filtros["estado"])
 
     # 4) Filtro nuevo: obra por nombre
-    if obra_nombre:
-        query = query.filter(Obra.nombre == obra_nombre)
+    if filtros["obra"]:
+        query = query.filter(Obra.nombre == filtros["obra"])
+
+    # 5) Filtro nuevo: cargo (por nombre en la tabla maestra)
+    if filtros["cargo"]:
+        query = query.filter(Cargo.nombre == filtros["cargo"])
 
-    # 5) Filtro nuevo: cargo
-    if cargo:
-        query = query.filter(Trabajador.cargo == cargo)
+    return query, claves
 
-    # Orden
-    query = query.order_by(Obra.nombre, Trabajador.ap_paterno, Trabajador.ap_materno)
 
-    # Resultados filtrados
-    trabajadores_filtrados = query.all()
-    total_registros = len(trabajadores_filtrados)
+def _cargos_asignados() -> list[str]:
+    return [
+        nombre for (nombre,) in (
+            db.session.query(Cargo.nombre)
+            .join(Trabajador, Trabajador.cargo_id == Cargo.id)
+            .distinct()
+            .order_by(Cargo.nombre)
+        )
+    ]
+
 
-    # Paginación
-    if total_registros == 0:
-        total_pages = 1
-        trabajadores_page = []
-        page = 1
+@bp.route("/")
+def index():
+    filtros_url = _leer_filtros(request.args)
+    q = filtros_url["q"]
+    obra_id = filtros_url["obra_id"]
+    estado = filtros_url["estado"]
+    obra_nombre = filtros_url["obra"]
+    cargo = filtros_url["cargo"]
+    imprimir = request.args.get("imprimir", type=int) == 1
+
+    # Paginación por cursor (ver app/paginacion.py)
+    per_page = 25
+
+    # Base query con join a Obra (y Cargo, que se muestra en la tabla)
+    query = (
+        Trabajador.query
+        .join(Obra, Trabajador.obra_id == Obra.id)
+        .outerjoin(Cargo, Trabajador.cargo_id == Cargo.id)
+        .options(contains_eager(Trabajador.obra), contains_eager(Trabajador.cargo))
+    )
+    query, claves = _filtrar_trabajadores(query, filtros_url)
+
+    # Conteo: exacto si hay filtros; sin filtros, conteo cacheado/estimado
+    hay_filtros = any([q, obra_id, estado, obra_nombre, cargo])
+    if hay_filtros:
+        total_registros = contar_exacto(query, Trabajador.id)
+        total_estimado = False
     else:
-        total_pages = (total_registros + per_page - 1) // per_page
-
-        if page < 1:
-            page = 1
-        if page > total_pages:
-            page = total_pages
-
-        start = (page - 1) * per_page
-        end = start + per_page
-        trabajadores_page = trabajadores_filtrados[start:end]
-
-    # Lista de obras para filtros (solo nombres)
-    obras_qs = (
-        Obra.query
-        .filter_by(estado="ACTIVA")
-        .order_by(Obra.nombre)
-        .all()
+        total_registros, total_estimado = contar_tabla(Trabajador)
+
+    if imprimir:
+        # Listado completo sin paginar: las filas se leen mientras se envían
+        trabajadores = listado_completo(query, claves)
+        pagina, page, total_pages = None, 1, 1
+    else:
+        pagina, page, total_pages = paginar_listado(
+            query,
+            claves,
+            request.args,
+            total_registros,
+            per_page,
+            total_estimado=total_estimado,
+        )
+        trabajadores = pagina.items
+
+    # Lista de obras para filtros (solo nombres), desde la caché de catálogos
+    obras = [obra.nombre for obra in catalogos.obras_activas()]
+
+    # Cargos efectivamente asignados a algún trabajador (caché compartida)
+    cargos = obtener_cache().obtener_o_calcular(
+        "core:cargos_asignados", _cargos_asignados, ttl=CARGOS_ASIGNADOS_TTL
     )
-    obras = [o.nombre for o in obras_qs]
 
-    # Lista de cargos disponibles (solución correcta)
-    cargos_rows = Trabajador.query.with_entities(Trabajador.cargo).distinct().all()
-    cargos = sorted({row[0] for row in cargos_rows if row[0]})
+    # Filtros vigentes, para repetirlos en los links del paginador
+    filtros = {k: v for k, v in filtros_url.items() if v}
 
-    return render_template(
+    return responder_en_stream(
         "index.html",
-        trabajadores=trabajadores_page,
+        trabajadores=trabajadores,
+        pagina=pagina,
+        imprimir=imprimir,
+        filtros=filtros,
         obras=obras,
         cargos=cargos,
         obra_seleccionada=obra_nombre,
         cargo_seleccionado=cargo,
         total_registros=total_registros,
+        total_estimado=total_estimado,
         page=page,
         total_pages=total_pages,
         # Filtros antiguos
@@ -109,6 +189,51 @@ def index():
     )
 
 
+@bp.route("/trabajadores/exportar.<formato>")
+def exportar_trabajadores(formato):
+    """
+    Descarga el listado filtrado completo (mismos parámetros que index)
+    como CSV ';' con BOM o como XLSX, generado en streaming.
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        abort(404)
+
+    filtros_url = _leer_filtros(request.args)
+
+    query = (
+        db.session.query(
+            Trabajador.rut,
+            Trabajador.nombres,
+            Trabajador.ap_paterno,
+            Trabajador.ap_materno,
+            Trabajador.fecha_nacimiento,
+            Trabajador.nacionalidad,
+            Trabajador.sexo,
+            Trabajador.estado_civil,
+            Trabajador.direccion,
+            Trabajador.comuna,
+            Trabajador.telefono,
+            Trabajador.telefono_emergencia,
+            Trabajador.correo,
+            Obra.nombre,
+            Cargo.nombre,
+            Trabajador.estado_trabajador,
+        )
+        .select_from(Trabajador)
+        .join(Obra, Trabajador.obra_id == Obra.id)
+        .outerjoin(Cargo, Trabajador.cargo_id == Cargo.id)
+    )
+    query, claves = _filtrar_trabajadores(query, filtros_url)
+    query = query.order_by(*[c.expr.desc() if c.desc else c.expr for c in claves])
+
+    return respuesta_exportacion(
+        formato,
+        "trabajadores",
+        ENCABEZADOS_TRABAJADORES,
+        iterar_filas(query),
+    )
+
+
 @bp.route("/ping")
 def ping():
     return {"status": "ok", "message": "RRHH app online 🤝"}
@@ -2,10 +2,6 @@
 
 from flask import Blueprint
 
-documentos_bp = Blueprint(
-    "documentos",
-    __name__,
-    url_prefix="/documentos"
-)
+bp = Blueprint("documentos", __name__, url_prefix="/documentos")
 
 from . import routes  # noqa
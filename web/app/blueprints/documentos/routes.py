@@ -1,20 +1,35 @@
-from datetime import datetime
+# web/app/blueprints/documentos/routes.py
+
+import mimetypes
+import os
+from datetime import date, datetime
+from urllib.parse import quote
 
 from flask import (
-    Blueprint,
     render_template,
     redirect,
     url_for,
     request,
     flash,
+    abort,
+    current_app,
+    send_file,
+    make_response,
+    Response,
+    stream_with_context,
 )
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
-from ... import db
+from ...extensions import db
 from ...models import Contrato, DocumentoLaboral
-from ...config import DOCUMENTO_TIPOS
-
+from ...config import DOCUMENTO_TIPOS, get_nextcloud_base_path, ruta_fisica_documento
+from ...derivados import rutas_documentos
+from ... import miniaturas
+from ...subidas import descartar_archivos, descartar_subida, guardar_archivo, parsear_formulario
+from ...zip_documentos import ALCANCES, generar_zip_documentos
 
-bp = Blueprint("documentos", __name__, url_prefix="/documentos")
+from . import bp
 
 
 def _parse_date(value: str):
@@ -28,7 +43,23 @@ def _parse_date(value: str):
 
 @bp.route("/contrato/<int:contrato_id>")
 def documentos_por_contrato(contrato_id):
-    contrato = Contrato.query.get_or_404(contrato_id)
+    # Trabajador, empleador y obra en la misma consulta que el contrato
+    contrato = (
+        Contrato.query
+        .options(
+            joinedload(Contrato.trabajador),
+            joinedload(Contrato.empleador),
+            joinedload(Contrato.obra),
+        )
+        .filter(Contrato.id == contrato_id)
+        .first_or_404()
+    )
+    documentos = (
+        DocumentoLaboral.query
+        .filter(DocumentoLaboral.contrato_id == contrato.id)
+        .order_by(DocumentoLaboral.id)
+        .all()
+    )
 
     # Mapeo value -> label para mostrar el nombre bonito del tipo
     tipos_dict = dict(DOCUMENTO_TIPOS)
@@ -36,46 +67,187 @@ def documentos_por_contrato(contrato_id):
     return render_template(
         "documentos/documentos_por_contrato.html",
         contrato=contrato,
+        documentos=documentos,
+        rutas=rutas_documentos(documentos, {contrato.id: contrato}),
         tipos_dict=tipos_dict,
+        con_miniatura={d.id for d in documentos if miniaturas.soportado(d.nombre_archivo)},
     )
 
 
-@bp.route("/contrato/<int:contrato_id>/nuevo", methods=["GET", "POST"])
-def nuevo_documento_contrato(contrato_id):
-    contrato = Contrato.query.get_or_404(contrato_id)
-
-    if request.method == "POST":
-        tipo = request.form.get("tipo_documento")
-        fecha_doc = _parse_date(request.form.get("fecha_documento"))
-        extension = request.form.get("extension") or "pdf"
-        enlace_nextcloud = request.form.get("enlace_nextcloud") or None
-        estado = request.form.get("estado") or "VIGENTE"
+def _registrar_documento(contrato, form, archivo):
+    tipo = form.get("tipo_documento")
+    fecha_doc = _parse_date(form.get("fecha_documento"))
+    extension = form.get("extension") or "pdf"
+    enlace_nextcloud = form.get("enlace_nextcloud") or None
+    estado = form.get("estado") or "VIGENTE"
 
-        if not tipo:
-            flash("Debes seleccionar el tipo de documento.", "error")
-            return redirect(url_for("documentos.nuevo_documento_contrato", contrato_id=contrato.id))
+    if archivo is not None and not archivo.filename:
+        archivo = None  # input de archivo sin elegir
+    if archivo is not None:
+        # La extensión la manda el archivo subido
+        extension = os.path.splitext(archivo.filename)[1].lstrip(".").lower() or extension
 
-        try:
-            doc = DocumentoLaboral.crear_para_contrato(
-                contrato=contrato,
-                tipo=tipo,
-                fecha_ref=fecha_doc,
-                extension=extension,
-                ruta_archivo=enlace_nextcloud,
-                estado=estado,
-            )
-        except ValueError as e:
-            flash(str(e), "error")
-            return redirect(url_for("documentos.nuevo_documento_contrato", contrato_id=contrato.id))
+    if not tipo:
+        flash("Debes seleccionar el tipo de documento.", "error")
+        return redirect(url_for("documentos.nuevo_documento_contrato", contrato_id=contrato.id))
 
+    try:
+        doc = DocumentoLaboral.crear_para_contrato(
+            contrato=contrato,
+            tipo=tipo,
+            fecha_ref=fecha_doc,
+            extension=extension,
+            ruta_archivo=enlace_nextcloud,
+            estado=estado,
+        )
         db.session.add(doc)
+        subida = guardar_archivo(doc, archivo.stream) if archivo is not None else None
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), "error")
+        return redirect(url_for("documentos.nuevo_documento_contrato", contrato_id=contrato.id))
+
+    try:
         db.session.commit()
+    except Exception as e:
+        # El archivo ya quedó en su carpeta: sin la fila no debe quedar ahí
+        db.session.rollback()
+        if subida is not None:
+            descartar_subida(subida)
+        if not isinstance(e, IntegrityError):
+            raise
+        flash(
+            "No se pudo registrar el documento. "
+            "Verifica que no exista ya uno con el mismo nombre.",
+            "error",
+        )
+        return redirect(url_for("documentos.nuevo_documento_contrato", contrato_id=contrato.id))
+
+    if subida is not None and miniaturas.soportado(doc.nombre_archivo):
+        miniaturas.generador(current_app._get_current_object()).encolar(doc.id)
+
+    flash("Documento registrado correctamente.", "success")
+    if subida is not None and subida.duplicado_de is not None:
+        original = subida.duplicado_de
+        flash(
+            f"El archivo es idéntico al documento #{original.id} (contrato #{original.contrato_id})"
+            + (": se enlazó sin guardar otra copia." if subida.enlazado else "."),
+            "info",
+        )
+    return redirect(url_for("documentos.documentos_por_contrato", contrato_id=contrato.id))
 
-        flash("Documento registrado correctamente.", "success")
-        return redirect(url_for("documentos.documentos_por_contrato", contrato_id=contrato.id))
+
+@bp.route("/contrato/<int:contrato_id>/nuevo", methods=["GET", "POST"])
+def nuevo_documento_contrato(contrato_id):
+    contrato = Contrato.query.get_or_404(contrato_id)
+
+    if request.method == "POST":
+        # El archivo va directo a disco mientras llega (ver app/subidas.py)
+        form, files = parsear_formulario(
+            request.environ, current_app.config.get("MAX_CONTENT_LENGTH")
+        )
+        try:
+            return _registrar_documento(contrato, form, files.get("archivo"))
+        finally:
+            descartar_archivos(files)
 
     return render_template(
         "documentos/nuevo_documento_contrato.html",
         contrato=contrato,
         documento_tipos=DOCUMENTO_TIPOS,
     )
+
+
+@bp.route("/<int:documento_id>/archivo")
+def archivo_documento(documento_id):
+    """
+    Sirve el archivo del documento desde la carpeta de Nextcloud montada
+    en el servidor (inline; ?descargar=1 lo baja como adjunto).
+
+    - Detrás de nginx (DOCUMENTOS_X_ACCEL_PREFIX) solo se valida y se
+      responde X-Accel-Redirect: nginx manda el archivo con sendfile,
+      Range y su propio ETag, y el worker queda libre al tiro. Ejemplo:
+
+          location /_documentos/ {
+              internal;
+              alias "/mnt/nextcloud/DOCUMENTACION LABORAL/";
+          }
+
+    - Con USE_X_SENDFILE=1, lo mismo vía la cabecera X-Sendfile.
+    - Si no, send_file con Range (PDF escaneados grandes) y ETag /
+      Last-Modified a partir de tamaño + mtime: las visitas repetidas
+      son 304 sin leer el archivo.
+    """
+    documento = DocumentoLaboral.query.get_or_404(documento_id)
+    ruta_logica = rutas_documentos([documento])[documento.id]
+    if not ruta_logica:
+        abort(404)
+    try:
+        ruta = ruta_fisica_documento(ruta_logica)
+    except ValueError:
+        abort(404)
+    if not ruta.is_file():
+        abort(404)
+
+    descargar = request.args.get("descargar") == "1"
+    prefijo = current_app.config.get("DOCUMENTOS_X_ACCEL_PREFIX")
+    if prefijo:
+        relativa = ruta.relative_to(get_nextcloud_base_path().resolve()).as_posix()
+        respuesta = make_response("")
+        respuesta.headers["X-Accel-Redirect"] = prefijo.rstrip("/") + "/" + quote(relativa)
+        respuesta.mimetype = mimetypes.guess_type(ruta.name)[0] or "application/octet-stream"
+        respuesta.headers.set(
+            "Content-Disposition",
+            "attachment" if descargar else "inline",
+            **{"filename*": "UTF-8''" + quote(documento.nombre_archivo)},
+        )
+    else:
+        # send_file respeta USE_X_SENDFILE por sí solo
+        respuesta = send_file(
+            ruta,
+            as_attachment=descargar,
+            download_name=documento.nombre_archivo,
+            conditional=True,
+            etag=True,
+        )
+    # Documentos personales: sin caché compartida, pero revalidables
+    respuesta.cache_control.private = True
+    return respuesta
+
+
+@bp.route("/zip/<alcance>/<int:id_>")
+def zip_documentos(alcance, id_):
+    """
+    ZIP con todos los documentos de un trabajador, contrato u obra, con la
+    estructura de carpetas de Nextcloud. Se arma mientras se descarga.
+    """
+    if alcance not in ALCANCES:
+        abort(404)
+    nombre = f"documentos_{alcance}_{id_}_{date.today():%Y-%m-%d}.zip"
+    respuesta = Response(
+        stream_with_context(generar_zip_documentos(alcance, id_)),
+        mimetype="application/zip",
+    )
+    respuesta.headers["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    respuesta.headers["Cache-Control"] = "no-store"
+    # Que nginx no acumule el ZIP antes de mandarlo
+    respuesta.headers["X-Accel-Buffering"] = "no"
+    return respuesta
+
+
+@bp.route("/<int:documento_id>/miniatura")
+def miniatura_documento(documento_id):
+    """
+    JPEG de la primera página. Si aún no está en caché se encola y se
+    responde 202 al tiro: la página vuelve a pedirla (ver la plantilla).
+    """
+    documento = DocumentoLaboral.query.get_or_404(documento_id)
+    estado, ruta, clave = miniaturas.miniatura(current_app._get_current_object(), documento)
+    if estado == miniaturas.PENDIENTE:
+        return "", 202, {"Retry-After": "2", "Cache-Control": "no-store"}
+    if estado != miniaturas.LISTA:
+        abort(404)
+    # La clave es el hash del contenido: sirve de ETag estable
+    respuesta = send_file(ruta, mimetype="image/jpeg", conditional=True, etag=clave)
+    respuesta.cache_control.private = True
+    return respuesta
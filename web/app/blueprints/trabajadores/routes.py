@@ -3,15 +3,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from sqlalchemy.exc import IntegrityError
 
+from ... import catalogos
+from ...condicional import respuesta_condicional, validador_trabajador
 from ...extensions import db
 from ...models import (
     Trabajador,
-    Obra,
-    AFP,
-    Salud,
-    Banco,
-    CajaCompensacion,
-    Cargo,
     Contrato,   # 👈 IMPORTANTE: para listar contratos del trabajador
 )
 from ...utils import parse_date, parse_int, parse_decimal
@@ -24,6 +20,7 @@ bp = Blueprint("trabajadores", __name__, url_prefix="/trabajadores")
 # FICHA (DETALLE) TRABAJADOR
 # ===========================
 @bp.route("/<int:trabajador_id>", methods=["GET"])
+@respuesta_condicional(validador_trabajador)
 def detalle_trabajador(trabajador_id):
     trabajador = Trabajador.query.get_or_404(trabajador_id)
 
@@ -139,12 +136,12 @@ def editar_trabajador(trabajador_id):
         return redirect(url_for("trabajadores.detalle_trabajador", trabajador_id=trabajador.id))
 
     # GET: cargar datos para el formulario
-    obras = Obra.query.filter_by(estado="ACTIVA").order_by(Obra.nombre).all()
-    bancos = Banco.query.order_by(Banco.nombre).all()
-    afps = AFP.query.order_by(AFP.nombre).all()
-    salud_list = Salud.query.order_by(Salud.nombre).all()
-    cajas = CajaCompensacion.query.order_by(CajaCompensacion.nombre).all()
-    cargos = Cargo.query.order_by(Cargo.id).all()
+    obras = catalogos.obras_activas()
+    bancos = catalogos.bancos()
+    afps = catalogos.afps()
+    salud_list = catalogos.salud()
+    cajas = catalogos.cajas()
+    cargos = catalogos.cargos()
 
     return render_template(
         "trabajador_editar.html",
@@ -358,16 +355,16 @@ def nuevo_trabajador():
         return redirect(url_for("core.index"))
 
     # GET
-    obras = Obra.query.filter_by(estado="ACTIVA").order_by(Obra.nombre).all()
+    obras = catalogos.obras_activas()
     if not obras:
         flash("Primero debes crear al menos una obra antes de registrar trabajadores.")
         return redirect(url_for("obras.lista_obras"))
 
-    bancos = Banco.query.order_by(Banco.nombre).all()
-    afps = AFP.query.order_by(AFP.nombre).all()
-    salud_list = Salud.query.order_by(Salud.nombre).all()
-    cajas = CajaCompensacion.query.order_by(CajaCompensacion.nombre).all()
-    cargos = Cargo.query.order_by(Cargo.id).all()
+    bancos = catalogos.bancos()
+    afps = catalogos.afps()
+    salud_list = catalogos.salud()
+    cajas = catalogos.cajas()
+    cargos = catalogos.cargos()
 
     return render_template(
         "nuevo_trabajador.html",
@@ -0,0 +1,182 @@
+# web/app/busqueda.py
+
+"""
+Búsqueda libre de trabajadores sobre la columna normalizada `busqueda`.
+
+- PostgreSQL: LIKE '%TOKEN%' usa el índice GIN de trigramas (pg_trgm) y
+  el ranking se hace con similarity().
+- SQLite (desarrollo): se registra una función similarity() equivalente
+  en Python, así que las consultas son las mismas en ambos motores.
+"""
+
+import sqlite3
+
+from sqlalchemy import Numeric, and_, cast, event, func, inspect, text
+
+from .config import normalizar_consulta_busqueda, texto_busqueda_trabajador
+from .extensions import db
+
+
+# ==========================
+# similarity() para SQLite
+# ==========================
+
+def _trigramas(texto: str) -> set[str]:
+    """
+    Mismo criterio que pg_trgm: cada palabra en minúsculas, con dos espacios
+    al inicio y uno al final, cortada en grupos de 3 caracteres.
+    """
+    trigramas = set()
+    for palabra in "".join(ch if ch.isalnum() else " " for ch in (texto or "").lower()).split():
+        relleno = f"  {palabra} "
+        for i in range(len(relleno) - 2):
+            trigramas.add(relleno[i:i + 3])
+    return trigramas
+
+
+def similitud(a: str, b: str) -> float:
+    ta, tb = _trigramas(a), _trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def _registrar_funciones_sqlite(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("similarity", 2, similitud, deterministic=True)
+
+
+def init_app(app):
+    """Registra similarity() en las conexiones SQLite del engine de la app."""
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _registrar_funciones_sqlite)
+
+
+# ==========================
+# Filtro y ranking
+# ==========================
+
+def escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filtro_busqueda(columna, consulta: str):
+    """
+    Condición "todas las palabras aparecen" sobre una columna normalizada.
+    Devuelve None si la consulta no tiene nada buscable.
+    """
+    termino = normalizar_consulta_busqueda(consulta)
+    if not termino:
+        return None
+    return and_(*[
+        columna.like(f"%{escapar_like(token)}%", escape="\\")
+        for token in termino.split()
+    ])
+
+
+def ranking_busqueda(columna, consulta: str):
+    """
+    Expresión de similitud (0..1) entre la columna y la consulta normalizada.
+
+    Redondeada a numeric: en PostgreSQL similarity() es real (float4) y,
+    como clave del cursor, el valor que vuelve en la URL (float8) nunca
+    sería igual al de la fila; con empates se repetían o saltaban filas.
+    """
+    similitud_ = func.similarity(columna, normalizar_consulta_busqueda(consulta))
+    return func.round(cast(similitud_, Numeric), 6)
+
+
+# ==========================
+# Esquema y backfill
+# ==========================
+
+def asegurar_esquema_busqueda() -> bool:
+    """
+    Agrega la columna `busqueda` y su índice en bases ya existentes
+    (db.create_all() no altera tablas creadas antes). Idempotente; la
+    llama create_app(). Devuelve True si la columna no existía (hay que
+    llenarla con recalcular_busqueda()).
+    """
+    from .models import Trabajador
+
+    columnas = {c["name"] for c in inspect(db.engine).get_columns(Trabajador.__tablename__)}
+    dialecto = db.engine.dialect.name
+    agregada = "busqueda" not in columnas
+
+    with db.engine.begin() as conn:
+        if agregada:
+            # IF NOT EXISTS: varios workers pueden arrancar a la vez
+            si_falta = "IF NOT EXISTS " if dialecto == "postgresql" else ""
+            conn.execute(text(f"ALTER TABLE trabajadores ADD COLUMN {si_falta}busqueda VARCHAR(400)"))
+        if dialecto == "postgresql":
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_trabajadores_busqueda_trgm "
+                "ON trabajadores USING gin (busqueda gin_trgm_ops)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_trabajadores_busqueda_prefijo "
+                "ON trabajadores (busqueda varchar_pattern_ops)"
+            ))
+        else:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_trabajadores_busqueda_trgm "
+                "ON trabajadores (busqueda)"
+            ))
+
+    return agregada
+
+
+def recalcular_busqueda(lote: int = 1000, ids=None, confirmar: bool = True) -> int:
+    """
+    Recalcula `busqueda` para todos los trabajadores (o solo `ids`).
+    Sirve para escrituras que no pasan por el ORM (importaciones masivas).
+    Devuelve cuántos cambió.
+    """
+    from .models import Trabajador
+
+    tabla = Trabajador.__table__
+    cambiados = 0
+    ultimo_id = 0
+
+    if ids is not None and not ids:
+        return 0
+
+    while True:
+        consulta = (
+            db.select(
+                tabla.c.id, tabla.c.rut, tabla.c.nombres,
+                tabla.c.ap_paterno, tabla.c.ap_materno, tabla.c.busqueda,
+            )
+            .where(tabla.c.id > ultimo_id)
+            .order_by(tabla.c.id)
+            .limit(lote)
+        )
+        if ids is not None:
+            consulta = consulta.where(tabla.c.id.in_(ids))
+        filas = db.session.execute(consulta).all()
+        if not filas:
+            break
+
+        cambios = []
+        for f in filas:
+            nuevo = texto_busqueda_trabajador(f.rut, f.nombres, f.ap_paterno, f.ap_materno)
+            if nuevo != f.busqueda:
+                cambios.append({"b_id": f.id, "b_busqueda": nuevo})
+
+        if cambios:
+            db.session.execute(
+                tabla.update()
+                .where(tabla.c.id == db.bindparam("b_id"))
+                .values(busqueda=db.bindparam("b_busqueda")),
+                cambios,
+            )
+            if confirmar:
+                db.session.commit()
+            cambiados += len(cambios)
+
+        ultimo_id = filas[-1].id
+
+    return cambiados
@@ -0,0 +1,551 @@
+# web/app/cache.py
+
+"""
+Caché compartida entre los workers de gunicorn, con backends
+intercambiables según CACHE_URL:
+
+    memoria://?max=2048            LRU con TTL en el propio proceso (por defecto)
+    disco:///var/cache/rrhh        archivos en disco: la comparten todos los
+                                   workers de la máquina
+    redis://:clave@host:6379/0     cualquier servidor que hable el protocolo
+                                   de Redis (RESP); cliente propio, sin dependencias
+
+Todos ofrecen lo mismo: obtener / guardar / borrar y obtener_o_calcular(),
+que protege contra estampidas: si la clave falta, solo un proceso la
+calcula (bloqueo por clave: threading.Lock, flock o SET NX según el
+backend) y el resto espera el resultado.
+
+Los valores se serializan con pickle, pero:
+- al guardar se rechazan objetos del ORM (la caché guarda datos, no filas
+  atadas a una sesión: namedtuple, dict, list, date, Decimal, ...);
+- al leer solo se reconstruyen tipos de una lista permitida, así un
+  valor manipulado en el disco o en Redis no puede ejecutar código.
+
+Si el backend falla (Redis caído, disco lleno) la caché se comporta como
+vacía: se registra el error y se calcula el valor directamente.
+
+`flask cache-probar` ejercita el backend Redis contra un servidor RESP
+en memoria (app/resp_local.py) o, con --url, contra uno real.
+"""
+
+import fcntl
+import hashlib
+import io
+import logging
+import os
+import pickle
+import secrets
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from flask import current_app
+
+
+log = logging.getLogger(__name__)
+
+FALTA = object()
+
+PREFIJO = "rrhh:"
+ESPERA_BLOQUEO = 10.0       # segundos máximos esperando a quien calcula
+REINTENTO_CONEXION = 5.0    # sin servidor, no se reintenta conectar antes de esto
+AVISO_CADA = 60.0           # un warning por minuto mientras el backend siga fallando
+
+
+class ErrorCache(Exception):
+    """Falla del backend; la caché sigue funcionando como si estuviera vacía."""
+
+
+# ==========================
+# Serialización
+# ==========================
+
+class _Serializador(pickle.Pickler):
+    def reducer_override(self, obj):
+        if hasattr(type(obj), "_sa_class_manager"):
+            raise TypeError(f"No se cachean objetos del ORM ({type(obj).__name__}); usar tuplas o dicts")
+        return NotImplemented
+
+
+_BUILTINS_PERMITIDOS = {"set", "frozenset", "complex", "bytearray", "range", "slice"}
+
+
+class _Deserializador(pickle.Unpickler):
+    def find_class(self, modulo, nombre):
+        if modulo == "builtins" and nombre in _BUILTINS_PERMITIDOS:
+            return super().find_class(modulo, nombre)
+        if modulo in ("datetime", "decimal") or (modulo == "collections" and nombre == "OrderedDict"):
+            return super().find_class(modulo, nombre)
+        if modulo == "app" or modulo.startswith("app."):
+            clase = super().find_class(modulo, nombre)
+            # Solo namedtuple propias (p. ej. las filas de app/catalogos.py)
+            if isinstance(clase, type) and issubclass(clase, tuple) and hasattr(clase, "_fields"):
+                return clase
+        raise pickle.UnpicklingError(f"Tipo no permitido en la caché: {modulo}.{nombre}")
+
+
+def serializar(valor) -> bytes:
+    salida = io.BytesIO()
+    _Serializador(salida, protocol=pickle.HIGHEST_PROTOCOL).dump(valor)
+    return salida.getvalue()
+
+
+def deserializar(datos: bytes):
+    return _Deserializador(io.BytesIO(datos)).load()
+
+
+# ==========================
+# Interfaz común
+# ==========================
+
+class Cache:
+    nombre = "base"
+
+    def __init__(self, ttl: float | None = None):
+        self.ttl = ttl              # por defecto para guardar()
+        self.aciertos = 0
+        self.fallos = 0
+        self.calculos = 0
+        self.errores = 0
+        self._avisado = 0.0
+
+    # ---------- a implementar por cada backend ----------
+
+    def _leer(self, clave: str) -> bytes | None:
+        raise NotImplementedError
+
+    def _escribir(self, clave: str, datos: bytes, ttl: float | None):
+        raise NotImplementedError
+
+    def _borrar(self, clave: str):
+        raise NotImplementedError
+
+    @contextmanager
+    def _bloqueo(self, clave: str, espera: float):
+        """True si se obtuvo el bloqueo de la clave; False si venció la espera."""
+        raise NotImplementedError
+        yield
+
+    # ---------- API ----------
+
+    def _fallo_backend(self, operacion: str, error: Exception):
+        self.errores += 1
+        ahora = time.monotonic()
+        if ahora - self._avisado >= AVISO_CADA:
+            self._avisado = ahora
+            log.warning("Caché %s: falló %s (%s)", self.nombre, operacion, error)
+
+    def obtener(self, clave: str, defecto=None):
+        try:
+            datos = self._leer(PREFIJO + clave)
+            valor = deserializar(datos) if datos is not None else FALTA
+        except (ErrorCache, OSError, pickle.UnpicklingError, EOFError) as e:
+            self._fallo_backend("al leer", e)
+            valor = FALTA
+        if valor is FALTA:
+            self.fallos += 1
+            return defecto
+        self.aciertos += 1
+        return valor
+
+    def guardar(self, clave: str, valor, ttl: float | None = None):
+        datos = serializar(valor)
+        try:
+            self._escribir(PREFIJO + clave, datos, ttl if ttl is not None else self.ttl)
+        except (ErrorCache, OSError) as e:
+            self._fallo_backend("al escribir", e)
+
+    def borrar(self, clave: str):
+        try:
+            self._borrar(PREFIJO + clave)
+        except (ErrorCache, OSError) as e:
+            self._fallo_backend("al borrar", e)
+
+    def obtener_o_calcular(self, clave: str, calcular, ttl: float | None = None):
+        """
+        Valor de la clave o, si falta, calcular() guardado con `ttl`.
+        Un solo proceso/hilo calcula cada clave a la vez.
+        """
+        valor = self.obtener(clave, FALTA)
+        if valor is not FALTA:
+            return valor
+
+        with self._bloqueo_protegido(PREFIJO + clave):
+            # Si hubo que esperar, quien tenía el bloqueo ya lo dejó calculado
+            valor = self.obtener(clave, FALTA)
+            if valor is FALTA:
+                valor = calcular()
+                self.calculos += 1
+                self.guardar(clave, valor, ttl)
+        return valor
+
+    @contextmanager
+    def _bloqueo_protegido(self, clave: str):
+        """_bloqueo() sin errores del backend: si falla, se calcula sin bloqueo."""
+        contexto = self._bloqueo(clave, ESPERA_BLOQUEO)
+        try:
+            obtenido = contexto.__enter__()
+        except (ErrorCache, OSError) as e:
+            self._fallo_backend("al bloquear", e)
+            yield False
+            return
+        try:
+            yield obtenido
+        finally:
+            try:
+                contexto.__exit__(None, None, None)
+            except (ErrorCache, OSError) as e:
+                self._fallo_backend("al liberar", e)
+
+    def estadisticas(self) -> dict:
+        return {
+            "backend": self.nombre,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "calculos": self.calculos,
+            "errores": self.errores,
+        }
+
+
+# ==========================
+# Memoria (por proceso)
+# ==========================
+
+class CacheMemoria(Cache):
+    nombre = "memoria"
+
+    def __init__(self, max_entradas: int = 2048, ttl: float | None = None):
+        super().__init__(ttl)
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()     # clave -> (expira | None, bytes)
+        self._lock = threading.Lock()
+        self._bloqueos = {}             # clave -> [Lock, usuarios]
+
+    def _leer(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expira, datos = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return datos
+
+    def _escribir(self, clave, datos, ttl):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._datos[clave] = (expira, datos)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def _borrar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    @contextmanager
+    def _bloqueo(self, clave, espera):
+        with self._lock:
+            entrada = self._bloqueos.setdefault(clave, [threading.Lock(), 0])
+            entrada[1] += 1
+        obtenido = entrada[0].acquire(timeout=espera)
+        try:
+            yield obtenido
+        finally:
+            if obtenido:
+                entrada[0].release()
+            with self._lock:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    self._bloqueos.pop(clave, None)
+
+
+# ==========================
+# Disco (compartida por los workers de una máquina)
+# ==========================
+
+_CABECERA = struct.Struct("<d")     # expira (epoch) o 0 = sin vencimiento
+
+
+class CacheDisco(Cache):
+    """
+    Un archivo por clave (directorio/ab/<sha1>.bin) escrito con rename
+    atómico; el bloqueo para calcular es flock sobre <sha1>.lock.
+    Cada PODAR_CADA escrituras se borran los vencidos.
+    """
+    nombre = "disco"
+    PODAR_CADA = 500
+
+    def __init__(self, directorio, ttl: float | None = None):
+        super().__init__(ttl)
+        self.directorio = str(directorio)
+        os.makedirs(self.directorio, exist_ok=True)
+        self._escrituras = 0
+
+    def _ruta(self, clave, extension=".bin"):
+        resumen = hashlib.sha1(clave.encode("utf-8")).hexdigest()
+        return os.path.join(self.directorio, resumen[:2], resumen + extension)
+
+    def _leer(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as archivo:
+                contenido = archivo.read()
+        except FileNotFoundError:
+            return None
+        (expira,) = _CABECERA.unpack_from(contenido)
+        if expira and expira < time.time():
+            try:
+                os.unlink(ruta)
+            except FileNotFoundError:
+                pass
+            return None
+        return contenido[_CABECERA.size:]
+
+    def _escribir(self, clave, datos, ttl):
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(_CABECERA.pack(time.time() + ttl if ttl else 0))
+            archivo.write(datos)
+        os.replace(temporal, ruta)
+
+        self._escrituras += 1
+        if self._escrituras % self.PODAR_CADA == 0:
+            self.podar()
+
+    def _borrar(self, clave):
+        try:
+            os.unlink(self._ruta(clave))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def _bloqueo(self, clave, espera):
+        ruta = self._ruta(clave, ".lock")
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, "a") as archivo:
+            limite = time.monotonic() + espera
+            while True:
+                try:
+                    fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > limite:
+                        yield False
+                        return
+                    time.sleep(0.02)
+            try:
+                yield True
+            finally:
+                fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    def podar(self) -> int:
+        """Borra las entradas vencidas; devuelve cuántas."""
+        ahora = time.time()
+        borradas = 0
+        for sub in os.scandir(self.directorio):
+            if not sub.is_dir():
+                continue
+            for entrada in os.scandir(sub.path):
+                if not entrada.name.endswith(".bin"):
+                    continue
+                try:
+                    with open(entrada.path, "rb") as archivo:
+                        (expira,) = _CABECERA.unpack(archivo.read(_CABECERA.size))
+                    if expira and expira < ahora:
+                        os.unlink(entrada.path)
+                        borradas += 1
+                except (OSError, struct.error):
+                    continue
+        return borradas
+
+
+# ==========================
+# Redis (protocolo RESP)
+# ==========================
+
+class ClienteRESP:
+    """
+    Cliente mínimo del protocolo de Redis: una conexión por proceso
+    (se reabre después del fork de gunicorn o de un error).
+    """
+
+    def __init__(self, host="localhost", puerto=6379, db=0, clave=None, timeout=1.0):
+        self.host, self.puerto, self.db, self.clave = host, puerto, db, clave
+        self.timeout = timeout
+        self._socket = None
+        self._lector = None
+        self._pid = None
+        self._caido_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def _conectar(self):
+        self.cerrar()
+        if time.monotonic() < self._caido_hasta:
+            raise ErrorCache(f"Sin conexión a {self.host}:{self.puerto}")
+        try:
+            conexion = socket.create_connection((self.host, self.puerto), timeout=self.timeout)
+        except OSError as e:
+            self._caido_hasta = time.monotonic() + REINTENTO_CONEXION
+            raise ErrorCache(f"No se pudo conectar a {self.host}:{self.puerto}: {e}") from e
+        conexion.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket, self._lector, self._pid = conexion, conexion.makefile("rb"), os.getpid()
+        if self.clave:
+            self._enviar("AUTH", self.clave)
+        if self.db:
+            self._enviar("SELECT", str(self.db))
+
+    def cerrar(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = self._lector = None
+
+    @staticmethod
+    def _codificar(args) -> bytes:
+        partes = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            partes.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(partes)
+
+    def _respuesta(self):
+        linea = self._lector.readline()
+        if not linea.endswith(b"\r\n"):
+            raise ErrorCache("Conexión cerrada por el servidor")
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b"+":
+            return resto.decode()
+        if tipo == b"-":
+            raise ErrorCache(resto.decode())
+        if tipo == b":":
+            return int(resto)
+        if tipo == b"$":
+            largo = int(resto)
+            if largo < 0:
+                return None
+            datos = self._lector.read(largo + 2)
+            return datos[:-2]
+        if tipo == b"*":
+            largo = int(resto)
+            return None if largo < 0 else [self._respuesta() for _ in range(largo)]
+        raise ErrorCache(f"Respuesta RESP inválida: {linea!r}")
+
+    def _enviar(self, *args):
+        self._socket.sendall(self._codificar(args))
+        return self._respuesta()
+
+    def comando(self, *args):
+        with self._lock:
+            try:
+                if self._socket is None or self._pid != os.getpid():
+                    self._conectar()
+                return self._enviar(*args)
+            except Exception:
+                # Conexión en estado desconocido: la próxima se abre de nuevo
+                self.cerrar()
+                raise
+
+
+# DEL solo si el valor sigue siendo la ficha de quien bloqueó
+LIBERAR_BLOQUEO = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then "
+    "return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+class CacheRedis(Cache):
+    nombre = "redis"
+
+    def __init__(self, cliente: ClienteRESP, ttl: float | None = None):
+        super().__init__(ttl)
+        self.cliente = cliente
+
+    def _comando(self, *args):
+        try:
+            return self.cliente.comando(*args)
+        except OSError as e:
+            raise ErrorCache(str(e)) from e
+
+    def _leer(self, clave):
+        return self._comando("GET", clave)
+
+    def _escribir(self, clave, datos, ttl):
+        if ttl:
+            self._comando("SET", clave, datos, "PX", int(ttl * 1000))
+        else:
+            self._comando("SET", clave, datos)
+
+    def _borrar(self, clave):
+        self._comando("DEL", clave)
+
+    @contextmanager
+    def _bloqueo(self, clave, espera):
+        bloqueo = f"{clave}:calculando"
+        ficha = secrets.token_hex(16)
+        limite = time.monotonic() + espera
+        # El bloqueo vence solo: si el proceso que calcula muere, no queda pegado
+        while self._comando("SET", bloqueo, ficha, "NX", "PX", int(espera * 1000)) is None:
+            if self._leer(clave) is not None or time.monotonic() > limite:
+                yield False
+                return
+            time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            # Si calcular() tardó más que `espera`, el bloqueo ya puede ser de
+            # otro proceso: solo se borra si todavía tiene nuestra ficha
+            self._comando("EVAL", LIBERAR_BLOQUEO, 1, bloqueo, ficha)
+
+
+# ==========================
+# Configuración
+# ==========================
+
+def crear_cache(url: str | None, directorio_defecto: str | None = None) -> Cache:
+    """Backend según CACHE_URL (ver el docstring del módulo)."""
+    partes = urlsplit(url or "memoria://")
+    opciones = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+    ttl = float(opciones["ttl"]) if "ttl" in opciones else None
+
+    if partes.scheme == "memoria":
+        return CacheMemoria(int(opciones.get("max", 2048)), ttl=ttl)
+    if partes.scheme == "disco":
+        directorio = unquote(partes.path) or directorio_defecto
+        if not directorio:
+            raise ValueError("CACHE_URL disco:// necesita una ruta (disco:///var/cache/rrhh)")
+        return CacheDisco(directorio, ttl=ttl)
+    if partes.scheme == "redis":
+        cliente = ClienteRESP(
+            host=partes.hostname or "localhost",
+            puerto=partes.port or 6379,
+            db=int(partes.path.lstrip("/") or 0),
+            clave=unquote(partes.password) if partes.password else None,
+            timeout=float(opciones.get("timeout", 1.0)),
+        )
+        return CacheRedis(cliente, ttl=ttl)
+    raise ValueError(f"CACHE_URL con esquema desconocido: {partes.scheme!r}")
+
+
+def init_app(app):
+    app.extensions["cache"] = crear_cache(
+        app.config.get("CACHE_URL"),
+        directorio_defecto=app.config.get("CACHE_DIR"),
+    )
+
+
+def obtener_cache() -> Cache:
+    return current_app.extensions["cache"]
@@ -0,0 +1,277 @@
+# web/app/catalogos.py
+
+"""
+Caché en memoria (por proceso) de las tablas maestras: AFP, Salud, Banco,
+Caja de compensación, Cargo, Obra y Empleador.
+
+Cambian unas pocas veces al año, pero cada formulario de trabajador o
+contrato las leía enteras. Aquí se guardan como tuplas de namedtuple
+(inmutables, livianas, sin sesión detrás) y los formularios se arman sin
+consultas de catálogo con el worker caliente.
+
+Invalidación:
+- Cualquier escritura a esas tablas (flush del ORM o db.session.execute
+  de un INSERT/UPDATE/DELETE, como el importador de cargos) incrementa
+  catalogo_version en la misma transacción.
+- after_commit vacía la caché del propio proceso al tiro.
+- Los demás workers leen el sello como mucho cada
+  CATALOGOS_REVISION_SEGUNDOS y recargan si cambió.
+
+Al faltar en el proceso, el catálogo se pide primero a la caché
+compartida (app/cache.py) con la versión del sello en la clave: con
+CACHE_URL en disco o Redis, los workers nuevos no releen las tablas.
+
+Escrituras por fuera de la sesión (SQL a mano, otra aplicación) se ven
+al llamar invalidar() o con `flask catalogos --invalidar`.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from operator import attrgetter
+
+from flask import current_app
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from .cache import obtener_cache
+from .extensions import db
+from .models import AFP, Banco, CajaCompensacion, Cargo, CatalogoVersion, Empleador, Obra, Salud
+
+
+REVISION_SEGUNDOS = 5
+
+TTL_COMPARTIDA = 24 * 3600  # la clave lleva la versión: no hace falta vencer antes
+
+# Tipos de fila con nombre fijo a nivel de módulo, para poder guardarlas
+# en la caché compartida (app/cache.py)
+FilaAFP = namedtuple("FilaAFP", ("id", "nombre"))
+FilaSalud = namedtuple("FilaSalud", ("id", "nombre", "tipo"))
+FilaBanco = namedtuple("FilaBanco", ("id", "nombre", "codigo_sbif"))
+FilaCaja = namedtuple("FilaCaja", ("id", "nombre"))
+FilaCargo = namedtuple("FilaCargo", ("id", "nombre", "descripcion", "categoria"))
+FilaObra = namedtuple(
+    "FilaObra", ("id", "nombre", "codigo", "centro_costo", "comuna", "empleador_id", "estado")
+)
+FilaEmpleador = namedtuple("FilaEmpleador", ("id", "razon_social", "rut"))
+
+# nombre -> (modelo, tipo de fila, orden)
+_DEFINICIONES = {
+    "afps": (AFP, FilaAFP, AFP.nombre),
+    "salud": (Salud, FilaSalud, Salud.nombre),
+    "bancos": (Banco, FilaBanco, Banco.nombre),
+    "cajas": (CajaCompensacion, FilaCaja, CajaCompensacion.nombre),
+    "cargos": (Cargo, FilaCargo, Cargo.id),
+    "obras": (Obra, FilaObra, Obra.nombre),
+    "empleadores": (Empleador, FilaEmpleador, Empleador.razon_social),
+}
+
+_MODELOS = tuple(modelo for modelo, _, _ in _DEFINICIONES.values())
+_TABLAS = frozenset(modelo.__tablename__ for modelo in _MODELOS)
+
+
+# ==========================
+# Caché por proceso
+# ==========================
+
+class _Catalogos:
+    def __init__(self):
+        self.version = None
+        self._datos = {}          # nombre (o vista) -> tupla
+        self._revisado = 0.0      # time.monotonic() de la última lectura del sello
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+
+    def _al_dia(self):
+        intervalo = current_app.config.get("CATALOGOS_REVISION_SEGUNDOS", REVISION_SEGUNDOS)
+        ahora = time.monotonic()
+        if ahora - self._revisado < intervalo:
+            return
+        version = leer_version()
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.recargas += 1
+                self._datos = {}
+                self.version = version
+            self._revisado = ahora
+
+    def obtener(self, clave, cargar):
+        self._al_dia()
+        datos = self._datos.get(clave)
+        if datos is not None:
+            self.aciertos += 1
+            return datos
+        self.fallos += 1
+        datos = cargar()
+        with self._lock:
+            self._datos[clave] = datos
+        return datos
+
+    def invalidar(self):
+        with self._lock:
+            self._datos = {}
+            self._revisado = 0.0
+
+    def estadisticas(self) -> dict:
+        return {
+            "version": self.version,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "recargas": self.recargas,
+            "en_cache": sorted(str(c) for c in self._datos),
+        }
+
+
+_cache = _Catalogos()
+
+
+def leer_version() -> int:
+    return db.session.execute(
+        select(CatalogoVersion.version).where(CatalogoVersion.id == 1)
+    ).scalar() or 0
+
+
+def _cargar(nombre: str):
+    modelo, tipo, orden = _DEFINICIONES[nombre]
+    columnas = [getattr(modelo, c) for c in tipo._fields]
+    return tuple(tipo(*fila) for fila in db.session.execute(select(*columnas).order_by(orden)))
+
+
+def _cargar_compartido(nombre: str):
+    """
+    Desde la caché compartida, si la hay: un worker recién levantado no
+    relee la tabla si otro ya la cargó con la misma versión del sello.
+    """
+    clave = f"catalogos:{_cache.version}:{nombre}"
+    return obtener_cache().obtener_o_calcular(clave, lambda: _cargar(nombre), ttl=TTL_COMPARTIDA)
+
+
+def _catalogo(nombre: str):
+    if db.session.info.get(_CAMBIADOS) or db.session.info.get(_INCREMENTADO):
+        # Cambios sin confirmar en esta sesión: no se cachean (podrían deshacerse)
+        return _cargar(nombre)
+    return _cache.obtener(nombre, lambda: _cargar_compartido(nombre))
+
+
+def _vista(nombre: str, vista: str, funcion):
+    """Derivada de un catálogo (filtro u otro orden), también memorizada."""
+    return _cache.obtener((nombre, vista), lambda: tuple(funcion(_catalogo(nombre))))
+
+
+# ==========================
+# API
+# ==========================
+
+def afps():
+    return _catalogo("afps")
+
+
+def salud():
+    return _catalogo("salud")
+
+
+def bancos():
+    return _catalogo("bancos")
+
+
+def cajas():
+    return _catalogo("cajas")
+
+
+def cargos():
+    """Por id (orden de los formularios de trabajador)."""
+    return _catalogo("cargos")
+
+
+def cargos_por_nombre():
+    return _vista("cargos", "por_nombre", lambda c: sorted(c, key=attrgetter("nombre")))
+
+
+def obras():
+    return _catalogo("obras")
+
+
+def obras_activas():
+    return _vista("obras", "activas", lambda o: [x for x in o if x.estado == "ACTIVA"])
+
+
+def empleadores():
+    return _catalogo("empleadores")
+
+
+def version() -> int:
+    """Sello vigente (revisado como mucho cada CATALOGOS_REVISION_SEGUNDOS)."""
+    _cache._al_dia()
+    return _cache.version
+
+
+def estadisticas() -> dict:
+    return _cache.estadisticas()
+
+
+def invalidar():
+    """Incrementa el sello (todos los workers recargan) y vacía esta caché."""
+    db.session.info[_CAMBIADOS] = True
+    _incrementar(db.session)
+    db.session.commit()
+
+
+# ==========================
+# Eventos de sesión
+# ==========================
+
+_CAMBIADOS = "catalogos_cambiados"
+_INCREMENTADO = "catalogos_incrementado"
+
+
+def _incrementar(session):
+    if session.info.get(_INCREMENTADO):
+        return
+    tabla = CatalogoVersion.__table__
+    conexion = session.connection()
+    if not conexion.execute(update(tabla).where(tabla.c.id == 1).values(version=tabla.c.version + 1)).rowcount:
+        conexion.execute(tabla.insert().values(id=1, version=1))
+    session.info[_INCREMENTADO] = True
+
+
+def _despues_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _MODELOS) and (obj not in session.dirty or session.is_modified(obj)):
+            session.info[_CAMBIADOS] = True
+            _incrementar(session)
+            return
+
+
+def _al_ejecutar(estado):
+    """INSERT / UPDATE / DELETE directos (importadores) sobre una tabla maestra."""
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    tabla = getattr(estado.statement, "table", None)
+    if getattr(tabla, "name", None) in _TABLAS:
+        estado.session.info[_CAMBIADOS] = True
+
+
+def _antes_commit(session):
+    if session.info.get(_CAMBIADOS):
+        _incrementar(session)
+
+
+def _despues_commit(session):
+    if session.info.pop(_CAMBIADOS, None):
+        _cache.invalidar()
+    session.info.pop(_INCREMENTADO, None)
+
+
+def _despues_rollback(session):
+    session.info.pop(_CAMBIADOS, None)
+    session.info.pop(_INCREMENTADO, None)
+
+
+event.listen(Session, "after_flush", _despues_flush)
+event.listen(Session, "do_orm_execute", _al_ejecutar)
+event.listen(Session, "before_commit", _antes_commit)
+event.listen(Session, "after_commit", _despues_commit)
+event.listen(Session, "after_rollback", _despues_rollback)
@@ -1,118 +1,134 @@
-import csv
-from datetime import datetime
-
 import click
 from flask.cli import with_appcontext
 
-from .extensions import db
-from .models import Trabajador, Banco, Cargo
+from .importacion.escritura import TAMANO_LOTE
+from .importacion.perfiles import PERFILES
+
+
+def _ejecutar_importacion(perfil, archivo, tamano_lote=TAMANO_LOTE, codificacion=None,
+                          delimitador=None, contexto=None, procesos=1, reanudar_job=None):
+    """Corre el pipeline de importación (o retoma un job) con salida por consola."""
+    from .importacion.pipeline import importar, informar, reanudar
+
+    try:
+        if reanudar_job:
+            resultado = reanudar(
+                reanudar_job, perfil=perfil, ruta=archivo, procesos=procesos, log=click.echo,
+            )
+        else:
+            click.echo(f"📥 Importando '{perfil}' desde: {archivo}")
+            resultado = importar(
+                perfil,
+                archivo,
+                tamano_lote=tamano_lote,
+                codificacion=codificacion,
+                delimitador=delimitador,
+                contexto=contexto,
+                procesos=procesos,
+                log=click.echo,
+            )
+    except (ValueError, FileNotFoundError) as e:
+        raise click.ClickException(str(e))
+    informar(resultado, log=click.echo)
+    return resultado
+
+
+@click.command("import")
+@click.argument("perfil", type=click.Choice(sorted(PERFILES)), required=False)
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option("--lote", "tamano_lote", default=TAMANO_LOTE, show_default=True,
+              help="Filas por lote (una escritura y un commit por lote).")
+@click.option("--codificacion", default=None,
+              help="Codificación del archivo (por defecto se detecta: utf-8-sig / cp1252).")
+@click.option("--delimitador", default=None,
+              help="Separador de columnas (por defecto se detecta entre ; , tab |).")
+@click.option("--obra", "obra_codigo", default=None,
+              help="Perfil 'trabajadores': código de la obra para los trabajadores NUEVOS.")
+@click.option("--procesos", default=1, show_default=True,
+              help="Procesos para parsear archivos grandes en paralelo (0 = todos los núcleos).")
+@click.option("--resume", "reanudar_job", default=None, metavar="JOB",
+              help="Retoma un job fallido desde su último lote confirmado (id o prefijo).")
+@with_appcontext
+def importar_archivo(perfil, archivo, tamano_lote, codificacion, delimitador, obra_codigo,
+                     procesos, reanudar_job):
+    """
+    Importa ARCHIVO (CSV) con el perfil PERFIL.
 
+    Cada perfil declara sus columnas, cómo se resuelven las referencias
+    (obra, cargo, RUT, ...) y cómo se escribe. Las filas rechazadas
+    quedan en la tabla import_rechazos con su motivo.
 
-def _parse_date(value: str):
-    """Convierte un string de fecha a objeto date, o None si viene vacío."""
-    if not value:
-        return None
-    value = value.strip()
-    if not value:
-        return None
+    Cada corrida es un job con id y un commit por lote; si se corta, se
+    retoma con --resume y solo se procesan las filas que faltaban
+    (PERFIL y ARCHIVO son opcionales: sirven si el archivo cambió de lugar).
 
-    for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y"):
-        try:
-            return datetime.strptime(value, fmt).date()
-        except ValueError:
-            continue
-    return None
+    \b
+    Uso:
+        flask import trabajadores /app/data/trabajadores_quintero2.csv --obra Q-001
+        flask import contratos-quintero /app/data/contratos.csv --procesos 8
+        flask import --resume 3f2a9c1e
+    """
+    if reanudar_job:
+        _ejecutar_importacion(perfil, archivo, procesos=procesos, reanudar_job=reanudar_job)
+        return
+    if not perfil or not archivo:
+        raise click.UsageError("Faltan PERFIL y ARCHIVO (o --resume JOB).")
+    _ejecutar_importacion(
+        perfil, archivo, tamano_lote, codificacion, delimitador,
+        contexto={"obra": obra_codigo}, procesos=procesos,
+    )
+
+
+@click.command("import-jobs")
+@click.option("--limite", default=20, show_default=True)
+@with_appcontext
+def listar_jobs(limite):
+    """Lista las últimas importaciones con su estado y punto de control."""
+    from .models import ImportJob
 
+    for job in ImportJob.query.order_by(ImportJob.creado_en.desc()).limit(limite):
+        click.echo(
+            f"{job.id[:8]}  {job.estado:<10} {job.perfil:<22} fila {job.ultima_fila:>8} · "
+            f"nuevos {job.nuevos} · act. {job.actualizados} · rech. {job.rechazados} · {job.archivo}"
+        )
+        if job.error:
+            click.echo(f"          └ {job.error}")
+
+
+@click.command("import-perfiles")
+def listar_perfiles():
+    """Lista los perfiles disponibles para `flask import`."""
+    for perfil in PERFILES.values():
+        columnas = ", ".join(
+            c.alias[0] + ("*" if c.requerida else "") for c in perfil.columnas
+        )
+        click.echo(f"{perfil.nombre}\n    {perfil.descripcion}\n    Columnas: {columnas}")
+
+
+# ==========================
+# Comandos anteriores (atajos a `flask import <perfil>`)
+# ==========================
 
 @click.command("import-trabajadores")
 @click.argument("csv_path")
+@click.option("--obra", "obra_codigo", default=None,
+              help="Código de la obra para los trabajadores NUEVOS (obligatoria en BD).")
+@click.option("--lote", "tamano_lote", default=TAMANO_LOTE, show_default=True,
+              help="Filas por lote (un INSERT ... ON CONFLICT y un commit por lote).")
 @with_appcontext
-def import_trabajadores(csv_path):
+def import_trabajadores(csv_path, obra_codigo, tamano_lote):
     """
     Importa o actualiza trabajadores desde un archivo CSV.
+    Equivale a `flask import trabajadores`.
+
+    Los trabajadores existentes (por RUT) solo se completan en los campos
+    que están vacíos en la BD.
 
     Uso:
-        flask import-trabajadores /app/data/trabajadores_quintero.csv
-    """
-    click.echo(f"📥 Importando trabajadores desde: {csv_path}")
-
-    count_new = 0
-    count_updated = 0
-
-    with open(csv_path, newline="", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            rut = (row.get("rut") or "").strip()
-            dv = (row.get("dv") or "").strip()
-
-            if not rut:
-                click.echo("⚠️ Fila sin RUT, se omite.")
-                continue
-
-            # Buscar trabajador existente por RUT
-            trab = Trabajador.query.filter_by(rut=rut).first()
-
-            if trab is None:
-                trab = Trabajador(rut=rut, dv=dv or None)
-                db.session.add(trab)
-                count_new += 1
-                modo = "CREADO"
-            else:
-                modo = "ACTUALIZADO"
-                count_updated += 1
-
-            def set_if_empty(attr, value):
-                v = value.strip() if isinstance(value, str) else value
-                if v == "":
-                    v = None
-                # Solo rellenamos si está vacío en BD y tenemos un valor no vacío
-                if getattr(trab, attr, None) in (None, "", " ") and v not in (None, "", " "):
-                    setattr(trab, attr, v)
-
-            # Campos que SÍ existen en Trabajador
-            set_if_empty("nombres",       row.get("nombres", ""))
-            set_if_empty("ap_paterno",    row.get("ap_paterno", ""))
-            set_if_empty("ap_materno",    row.get("ap_materno", ""))
-            set_if_empty("direccion",     row.get("direccion", ""))
-            set_if_empty("comuna",        row.get("comuna", ""))
-            set_if_empty("estado_civil",  row.get("estado_civil", ""))
-            set_if_empty("sexo",          row.get("sexo", ""))
-            set_if_empty("telefono",      row.get("telefono", ""))
-            set_if_empty("telefono_emergencia", row.get("telefono_emergencia", ""))
-            set_if_empty("correo",        row.get("correo", ""))
-            set_if_empty("nacionalidad",  row.get("nacionalidad", ""))
-
-            # Estado trabajador (si no tiene nada, usamos el del CSV o VIGENTE)
-            estado_trabajador = (row.get("estado_trabajador") or "").strip()
-            if not estado_trabajador:
-                estado_trabajador = "VIGENTE"
-            if not getattr(trab, "estado_trabajador", None):
-                trab.estado_trabajador = estado_trabajador
-
-            # Fecha de nacimiento
-            fecha_nac_str = row.get("fecha_nacimiento")
-            if fecha_nac_str and getattr(trab, "fecha_nacimiento", None) is None:
-                trab.fecha_nacimiento = _parse_date(fecha_nac_str)
-
-            # Número de cuenta bancaria (mapear desde numero_cta_bancaria → cuenta_numero)
-            num_cta = (row.get("numero_cta_bancaria") or "").strip()
-            if num_cta and not getattr(trab, "cuenta_numero", None):
-                trab.cuenta_numero = num_cta
-
-            # Banco: usamos el nombre del banco del CSV para enlazar a la tabla bancos
-            banco_nombre = (row.get("banco") or "").strip()
-            if banco_nombre and trab.banco is None:
-                banco = Banco.query.filter_by(nombre=banco_nombre).first()
-                if banco:
-                    trab.banco = banco
-                else:
-                    click.echo(f"⚠️ Banco no encontrado: '{banco_nombre}' (RUT {rut})")
-
-            click.echo(f" - {modo}: {rut} {trab.nombres or ''} {trab.ap_paterno or ''}")
-
-    db.session.commit()
-    click.echo(f"✅ Importación finalizada. Nuevos: {count_new}, Actualizados: {count_updated}")
+        flask import-trabajadores /app/data/trabajadores_quintero2.csv --obra Q-001
+    """
+    _ejecutar_importacion("trabajadores", csv_path, tamano_lote, contexto={"obra": obra_codigo})
+
 
 @click.command("import-cargos")
 @click.argument("csv_path")
@@ -121,99 +137,206 @@ def import_cargos(csv_path):
     """
     Importa o actualiza la tabla de CARGOS desde un CSV con columnas:
     id,nombre
+    Equivale a `flask import cargos`.
     """
-    click.echo(f"🧩 Importando cargos desde: {csv_path}")
-
-    count_new = 0
-    count_updated = 0
+    _ejecutar_importacion("cargos", csv_path)
 
-    with open(csv_path, newline="", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
 
-        for row in reader:
-            try:
-                cargo_id = int(row.get("id"))
-            except (TypeError, ValueError):
-                click.echo(f"⚠️ Fila con id inválido: {row.get('id')}, se omite.")
-                continue
+@click.command("import-cargos-trabajadores")
+@click.argument("csv_path")
+@with_appcontext
+def import_cargos_trabajadores(csv_path):
+    """
+    Asigna cargos a los trabajadores según columna 'cargo' del CSV.
+    Equivale a `flask import cargos-trabajadores`.
+    """
+    _ejecutar_importacion("cargos-trabajadores", csv_path)
 
-            nombre = (row.get("nombre") or "").strip()
-            if not nombre:
-                click.echo(f"⚠️ Fila con nombre vacío para id {cargo_id}, se omite.")
-                continue
 
-            cargo = Cargo.query.get(cargo_id)
+@click.command("reindexar-busqueda")
+@with_appcontext
+def reindexar_busqueda():
+    """
+    Crea (si falta) la columna/índice de búsqueda y la recalcula
+    para todos los trabajadores.
+    """
+    from .busqueda import asegurar_esquema_busqueda, recalcular_busqueda
 
-            if cargo is None:
-                cargo = Cargo(id=cargo_id, nombre=nombre)
-                db.session.add(cargo)
-                count_new += 1
-                modo = "CREADO"
-            else:
-                cargo.nombre = nombre
-                count_updated += 1
-                modo = "ACTUALIZADO"
+    click.echo("🔎 Verificando columna e índice de búsqueda...")
+    asegurar_esquema_busqueda()
 
-            click.echo(f" - {modo}: {cargo_id} → {nombre}")
+    cambiados = recalcular_busqueda()
+    click.echo(f"✅ Búsqueda recalculada. Trabajadores actualizados: {cambiados}")
 
-    db.session.commit()
-    click.echo(f"✅ Importación de cargos finalizada. Nuevos: {count_new}, Actualizados: {count_updated}")
 
-@click.command("import-cargos-trabajadores")
-@click.argument("csv_path")
+@click.command("recalcular-derivados")
 @with_appcontext
-def import_cargos_trabajadores(csv_path):
+def recalcular_derivados():
     """
-    Asigna cargos a los trabajadores según columna 'cargo' del CSV.
+    Crea (si faltan) las columnas derivadas y sus índices y las recalcula
+    para toda la base: empleador preferente, carpeta y ruta Nextcloud de
+    cada trabajador y carpeta de cada documento.
     """
-    from .models import Trabajador, Cargo
+    from .derivados import asegurar_esquema_derivados, recalcular_derivados as recalcular
 
-    click.echo(f"📥 Asignando cargos a trabajadores desde: {csv_path}")
+    click.echo("🧮 Verificando columnas e índices derivados...")
+    asegurar_esquema_derivados()
 
-    count_ok = 0
-    count_not_found = 0
-    count_trab_not_found = 0
+    for nombre, cambiados in recalcular(confirmar=True).items():
+        click.echo(f"✅ {nombre}: {cambiados} filas actualizadas")
 
-    # Cargar CSV
-    with open(csv_path, newline="", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
 
-        for row in reader:
-            rut = (row.get("rut") or "").strip()
-            cargo_nombre = (row.get("cargo") or "").strip()
+# ==========================
+# Documentos en Nextcloud
+# ==========================
 
-            if not rut:
-                continue
+@click.command("indexar-documentos")
+@click.option("--raiz", default=None, type=click.Path(file_okay=False),
+              help="Carpeta a indexar (por defecto NEXTCLOUD_ROOT).")
+@click.option("--completo", is_flag=True,
+              help="Relista todas las carpetas aunque su mtime no haya cambiado.")
+@with_appcontext
+def indexar_documentos(raiz, completo):
+    """
+    Actualiza el índice de archivos del árbol de Nextcloud.
+    Solo relee las carpetas que cambiaron desde la corrida anterior.
+    """
+    from .indice_archivos import indexar
 
-            trab = Trabajador.query.filter_by(rut=rut).first()
-            if not trab:
-                click.echo(f"⚠️ Trabajador con RUT {rut} no existe en la BD.")
-                count_trab_not_found += 1
-                continue
+    try:
+        r = indexar(raiz, completo=completo, log=click.echo)
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"✅ Carpetas: {r.directorios} (listadas {r.listadas}) · archivos nuevos {r.nuevos} · "
+        f"actualizados {r.actualizados} · eliminados {r.eliminados}"
+    )
 
-            if not cargo_nombre:
-                click.echo(f"⚠️ Trabajador {rut} no tiene cargo en CSV.")
-                continue
 
-            cargo = Cargo.query.filter_by(nombre=cargo_nombre).first()
+@click.command("conciliar-documentos")
+@click.option("--limite", default=50, show_default=True, help="Ejemplos a mostrar de cada lista.")
+@with_appcontext
+def conciliar_documentos(limite):
+    """
+    Cruza los documentos registrados con el índice de archivos (correr
+    antes `flask indexar-documentos`): faltantes en disco y huérfanos.
+    """
+    from .indice_archivos import conciliar
+
+    r = conciliar(limite)
+    click.echo(
+        f"📄 Documentos con ruta: {r.documentos} · encontrados {r.encontrados} · "
+        f"faltantes {r.faltantes} · sin ruta (contrato sin empleador) {r.sin_ruta}"
+    )
+    for documento_id, ruta in r.ejemplos_faltantes:
+        click.echo(f"   ✗ #{documento_id} {ruta}")
+    click.echo(f"🗂  Archivos huérfanos en carpetas de trabajadores: {r.huerfanos}")
+    for ruta in r.ejemplos_huerfanos:
+        click.echo(f"   ? {ruta}")
+
+
+@click.command("watch-documentos")
+@click.option("--raiz", default=None, type=click.Path(file_okay=False),
+              help="Carpeta a vigilar (por defecto NEXTCLOUD_ROOT).")
+@click.option("--espera", default=2.0, show_default=True,
+              help="Segundos sin eventos en una carpeta antes de aplicar sus cambios.")
+@click.option("--intervalo-escaneo", default=300.0, show_default=True,
+              help="Sin inotify (o sin watches disponibles): cada cuánto escanear el árbol.")
+@click.option("--estado", "archivo_estado", default=None, type=click.Path(dir_okay=False),
+              help="Archivo JSON donde publicar los contadores (retraso, cola, eventos...).")
+@click.option("--reporte", "intervalo_reporte", default=60.0, show_default=True,
+              help="Cada cuántos segundos mostrar los contadores en el log.")
+@with_appcontext
+def watch_documentos(raiz, espera, intervalo_escaneo, archivo_estado, intervalo_reporte):
+    """
+    Proceso de larga duración que mantiene el índice de archivos al día
+    con inotify: altas, bajas y movimientos en Nextcloud se reflejan en
+    segundos en archivos_indexados y DocumentoLaboral.archivo_en_disco.
+    """
+    from .vigilancia import Vigilante
+
+    vigilante = Vigilante(
+        raiz,
+        espera=espera,
+        intervalo_escaneo=intervalo_escaneo,
+        archivo_estado=archivo_estado,
+        intervalo_reporte=intervalo_reporte,
+        log=click.echo,
+    )
+    try:
+        vigilante.ejecutar()
+    except FileNotFoundError as e:
+        raise click.ClickException(str(e))
+
+
+@click.command("zip-documentos")
+@click.argument("alcance", type=click.Choice(["trabajador", "contrato", "obra"]))
+@click.argument("id_", metavar="ID", type=int)
+@click.option("-o", "--salida", type=click.File("wb"), default="-", show_default=True,
+              help="Archivo ZIP de destino ('-' = salida estándar).")
+@with_appcontext
+def zip_documentos(alcance, id_, salida):
+    """
+    Arma un ZIP con todos los documentos de un trabajador, contrato u
+    obra, con la estructura de carpetas de Nextcloud (para fiscalizaciones).
+    """
+    from .zip_documentos import generar_zip_documentos
 
-            if cargo:
-                trab.cargo = cargo
-                count_ok += 1
-            else:
-                click.echo(f"❌ Cargo NO encontrado: '{cargo_nombre}' (RUT {rut})")
-                count_not_found += 1
+    total = 0
+    for trozo in generar_zip_documentos(alcance, id_):
+        salida.write(trozo)
+        total += len(trozo)
+    salida.flush()
+    click.echo(f"✅ ZIP de {alcance} {id_}: {total / 1024 / 1024:.1f} MB", err=True)
 
-    db.session.commit()
 
-    click.echo("🎯 Resultado final:")
-    click.echo(f"   ✔️ Cargos asignados: {count_ok}")
-    click.echo(f"   ❗ Cargos no encontrados: {count_not_found}")
-    click.echo(f"   ❗ Trabajadores no encontrados en BD: {count_trab_not_found}")
+@click.command("catalogos")
+@click.option("--invalidar", is_flag=True,
+              help="Fuerza la recarga en todos los workers (tras editar tablas maestras a mano).")
+@with_appcontext
+def estado_catalogos(invalidar):
+    """Muestra (o incrementa) el sello de versión de la caché de tablas maestras."""
+    from . import catalogos
+
+    if invalidar:
+        catalogos.invalidar()
+    click.echo(f"📚 Versión de catálogos: {catalogos.leer_version()}")
+
+
+@click.command("cache-probar")
+@click.option("--url", default=None, metavar="redis://host:6379/0",
+              help="Servidor a probar (por defecto, un servidor RESP local en memoria).")
+def probar_cache(url):
+    """Prueba el backend Redis de la caché (GET/SET/PX/NX/DEL y bloqueo)."""
+    from .cache import CacheRedis, crear_cache
+    from .resp_local import probar, probar_local
+
+    if url is None:
+        click.echo("🧪 Probando contra un servidor RESP local (app/resp_local.py)...")
+        correcto = probar_local(log=click.echo)
+    else:
+        cache = crear_cache(url)
+        if not isinstance(cache, CacheRedis):
+            raise click.UsageError("--url debe ser redis://...")
+        click.echo(f"🧪 Probando contra {url}...")
+        correcto = probar(cache, log=click.echo)
+    if not correcto:
+        raise click.ClickException("El backend no se comportó como se esperaba.")
 
 
 def register_cli(app):
+    app.cli.add_command(importar_archivo)
+    app.cli.add_command(listar_perfiles)
+    app.cli.add_command(listar_jobs)
     app.cli.add_command(import_trabajadores)
     app.cli.add_command(import_cargos)
     app.cli.add_command(import_cargos_trabajadores)
-    # (si luego agregamos import-bancos, lo sumamos aquí también)
+    app.cli.add_command(reindexar_busqueda)
+    app.cli.add_command(recalcular_derivados)
+    app.cli.add_command(indexar_documentos)
+    app.cli.add_command(conciliar_documentos)
+    app.cli.add_command(watch_documentos)
+    app.cli.add_command(zip_documentos)
+    app.cli.add_command(estado_catalogos)
+    app.cli.add_command(probar_cache)
+    # Para un origen nuevo: declarar un Perfil en importacion/perfiles.py
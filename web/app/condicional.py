@@ -0,0 +1,143 @@
+# web/app/condicional.py
+
+"""
+Respuestas condicionales (ETag / Last-Modified) para las fichas de
+trabajador y de contrato.
+
+Antes de cargar el objeto y renderizar, una sola consulta (varias
+subconsultas escalares en un SELECT) trae lo que define la página:
+el sello de la entidad, el máximo actualizado_en/creado_en y la cantidad
+de sus filas dependientes (contratos, documentos) y la versión de los
+catálogos (nombres de obra, cargo, ...). Con eso se arma un ETag débil;
+si el navegador ya tiene esa versión se responde 304 sin tocar el ORM.
+
+La cantidad de filas entra al ETag porque borrar un contrato no cambia
+ningún timestamp. Last-Modified es el timestamp más reciente. (En
+SQLite CURRENT_TIMESTAMP va al segundo: dos ediciones en el mismo
+segundo dan el mismo ETag; en PostgreSQL now() no tiene ese problema.)
+
+Las páginas quedan "private, no-cache": el navegador las guarda pero
+revalida siempre, y ningún proxy compartido las almacena. Si hay
+mensajes flash pendientes se responde sin validadores y "no-store":
+esa página no se debe repetir desde la caché del navegador.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+
+from .extensions import db
+from .models import CatalogoVersion, Contrato, DocumentoLaboral, Trabajador
+
+
+def calcular_huella(raiz: str) -> str:
+    """
+    mtime más reciente de las plantillas y .py de la app: cambia con cada
+    despliegue, así un cambio de plantilla invalida los ETag. Todos los
+    workers de una misma versión calculan lo mismo. Se recorre una sola
+    vez, al crear la app (sin entrar a cache/ ni __pycache__).
+    """
+    ultimo = 0.0
+    for directorio, subdirectorios, archivos in os.walk(raiz):
+        subdirectorios[:] = [d for d in subdirectorios if d not in ("cache", "__pycache__", "static")]
+        for nombre in archivos:
+            if nombre.endswith((".py", ".html")):
+                ultimo = max(ultimo, os.stat(os.path.join(directorio, nombre)).st_mtime)
+    return f"{ultimo:.0f}"
+
+
+def init_app(app):
+    """VERSION_DESPLIEGUE si viene del entorno; si no, la huella de los archivos."""
+    app.extensions["huella_codigo"] = app.config.get("VERSION_DESPLIEGUE") or calcular_huella(app.root_path)
+
+
+def _sello(modelo):
+    """Último cambio de una fila: actualizado_en, o creado_en si nunca se editó."""
+    return func.coalesce(modelo.actualizado_en, modelo.creado_en)
+
+
+def respuesta_condicional(validador):
+    """
+    Decorador de vistas GET. `validador(**view_args)` devuelve una lista
+    de subconsultas escalares; la primera es el id de la entidad (NULL si
+    no existe: entonces la vista responde su 404 de siempre).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or session.get("_flashes"):
+                respuesta = make_response(vista(*args, **kwargs))
+                respuesta.cache_control.no_store = True
+                return respuesta
+
+            version_catalogos = (
+                select(CatalogoVersion.version).where(CatalogoVersion.id == 1).scalar_subquery()
+            )
+            fila = tuple(db.session.execute(select(*validador(**kwargs), version_catalogos)).one())
+            if fila[0] is None:
+                return vista(*args, **kwargs)
+
+            huella = current_app.extensions["huella_codigo"]
+            resumen = hashlib.sha1(repr((request.endpoint, huella, fila)).encode("utf-8"))
+            etag = resumen.hexdigest()[:24]
+            ultima = max((v for v in fila if isinstance(v, datetime)), default=None)
+
+            if is_resource_modified(request.environ, etag=f'W/"{etag}"', last_modified=ultima):
+                respuesta = make_response(vista(*args, **kwargs))
+            else:
+                respuesta = current_app.response_class(status=304)
+
+            respuesta.set_etag(etag, weak=True)
+            if ultima is not None:
+                respuesta.last_modified = ultima
+            respuesta.cache_control.private = True
+            respuesta.cache_control.no_cache = True
+            respuesta.vary.add("Cookie")
+            return respuesta
+
+        return envoltura
+
+    return decorador
+
+
+# ==========================
+# Validadores
+# ==========================
+
+def _documentos(*condiciones):
+    return (
+        select(func.max(DocumentoLaboral.fecha_creacion)).where(*condiciones).scalar_subquery(),
+        select(func.count(DocumentoLaboral.id)).where(*condiciones).scalar_subquery(),
+    )
+
+
+def validador_trabajador(trabajador_id):
+    """Ficha del trabajador: sus datos, sus contratos y los documentos de esos contratos."""
+    de_sus_contratos = DocumentoLaboral.contrato_id.in_(
+        select(Contrato.id).where(Contrato.trabajador_id == trabajador_id)
+    )
+    return [
+        select(Trabajador.id).where(Trabajador.id == trabajador_id).scalar_subquery(),
+        select(_sello(Trabajador)).where(Trabajador.id == trabajador_id).scalar_subquery(),
+        select(func.max(_sello(Contrato))).where(Contrato.trabajador_id == trabajador_id).scalar_subquery(),
+        select(func.count(Contrato.id)).where(Contrato.trabajador_id == trabajador_id).scalar_subquery(),
+        *_documentos(de_sus_contratos),
+    ]
+
+
+def validador_contrato(contrato_id):
+    """Ficha del contrato: el contrato, su trabajador (nombre, RUT) y sus documentos."""
+    return [
+        select(Contrato.id).where(Contrato.id == contrato_id).scalar_subquery(),
+        select(_sello(Contrato)).where(Contrato.id == contrato_id).scalar_subquery(),
+        select(_sello(Trabajador))
+        .join(Contrato, Contrato.trabajador_id == Trabajador.id)
+        .where(Contrato.id == contrato_id)
+        .scalar_subquery(),
+        *_documentos(DocumentoLaboral.contrato_id == contrato_id),
+    ]
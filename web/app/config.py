@@ -1,11 +1,15 @@
 # web/app/config.py
 
 import os
-import unicodedata
+import re
 from datetime import date
 from pathlib import Path
 
+from .normalizacion import normalizar_palabras, normalizar_segmento
+
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+# Carpeta instance/ de Flask (web/instance): datos locales que no son código
+INSTANCE_DIR = os.path.join(os.path.dirname(BASE_DIR), "instance")
 
 
 class BaseConfig:
@@ -19,6 +23,34 @@ class BaseConfig:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Descarga de documentos (blueprint documentos). Detrás de nginx, con
+    # DOCUMENTOS_X_ACCEL_PREFIX (p. ej. "/_documentos/") Flask solo valida
+    # y nginx sirve el archivo; con USE_X_SENDFILE=1 lo mismo para
+    # Apache/lighttpd (mod_xsendfile). Sin ninguno, lo sirve Flask.
+    DOCUMENTOS_X_ACCEL_PREFIX = os.environ.get("DOCUMENTOS_X_ACCEL_PREFIX") or None
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE") == "1"
+
+    # Tope de una subida de documento (los escaneos grandes rondan 50 MB)
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", 200 * 1024 * 1024))
+
+    # Miniaturas de documentos (app/miniaturas.py)
+    MINIATURAS_DIR = os.environ.get("MINIATURAS_DIR", os.path.join(INSTANCE_DIR, "cache", "miniaturas"))
+    MINIATURAS_MAX_BYTES = int(os.environ.get("MINIATURAS_MAX_BYTES", 512 * 1024 * 1024))
+    MINIATURAS_HILOS = int(os.environ.get("MINIATURAS_HILOS", 2))
+
+    # Cada cuánto un worker revisa si otro cambió las tablas maestras (app/catalogos.py)
+    CATALOGOS_REVISION_SEGUNDOS = float(os.environ.get("CATALOGOS_REVISION_SEGUNDOS", 5))
+
+    # Caché compartida entre workers (app/cache.py): memoria://, disco:///ruta o redis://host:6379/0
+    CACHE_URL = os.environ.get("CACHE_URL", "memoria://")
+    CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(INSTANCE_DIR, "cache", "datos"))  # para "disco://"
+
+    # Versión para los ETag de las fichas (app/condicional.py); sin ella, mtime de los archivos
+    VERSION_DESPLIEGUE = os.environ.get("VERSION_DESPLIEGUE") or None
+
+    # HTML de fragmentos {% cache %} por worker (app/fragmentos.py); 0 la desactiva
+    FRAGMENTOS_MAX_BYTES = int(os.environ.get("FRAGMENTOS_MAX_BYTES", 16 * 1024 * 1024))
+
 
 class DevConfig(BaseConfig):
     """Configuración para desarrollo."""
@@ -50,44 +82,48 @@ def normalizar_nombre_trabajador(rut: str, nombres: str, ap_paterno: str, ap_mat
     - Espacios -> guiones bajos.
     """
 
-    def _clean(texto: str) -> str:
-        if not texto:
-            return ""
-        txt = texto.strip().upper()
-        txt_norm = unicodedata.normalize("NFD", txt)
-        txt_sin_tildes = "".join(
-            ch for ch in txt_norm
-            if unicodedata.category(ch) != "Mn"
-        )
-        return txt_sin_tildes.replace(" ", "_")
-
     # RUT: sin puntos, pero respetando el guión
     rut_limpio = (rut or "").strip().replace(".", "").upper()
 
     return "_".join([
         rut_limpio,
-        _clean(ap_paterno),
-        _clean(ap_materno),
-        _clean(nombres),
+        normalizar_segmento(ap_paterno),
+        normalizar_segmento(ap_materno),
+        normalizar_segmento(nombres),
     ])
 
 
-def _normalizar_texto_simple(texto: str) -> str:
+def normalizar_texto_busqueda(texto: str) -> str:
     """
-    Normaliza texto para usar en nombres de archivo:
-    - MAYÚSCULAS
-    - sin tildes
-    - espacios -> _
+    Normaliza texto para la búsqueda libre:
+    - MAYÚSCULAS, sin tildes (mismo criterio que las carpetas)
+    - solo letras y dígitos, separados por un espacio
     """
-    if not texto:
-        return ""
-    txt = texto.strip().upper()
-    txt_norm = unicodedata.normalize("NFD", txt)
-    txt_sin_tildes = "".join(
-        ch for ch in txt_norm
-        if unicodedata.category(ch) != "Mn"
-    )
-    return txt_sin_tildes.replace(" ", "_")
+    return normalizar_palabras(texto)
+
+
+def normalizar_consulta_busqueda(texto: str) -> str:
+    """
+    Normaliza lo que escribe el usuario en el buscador.
+    Un RUT con puntos o guión (12.345.678-5) queda pegado (123456785),
+    igual que en la columna de búsqueda.
+    """
+    sin_separadores_rut = re.sub(r"(?<=[0-9kK])[.\-](?=[0-9kK])", "", texto or "")
+    return normalizar_texto_busqueda(sin_separadores_rut)
+
+
+def texto_busqueda_trabajador(rut: str, nombres: str, ap_paterno: str, ap_materno: str) -> str:
+    """
+    Texto indexado para buscar trabajadores, ej:
+    123457102 PAILLALEVE GUINEO HECTOR DAVID
+
+    - El RUT va SIN PUNTOS NI GUIÓN (para que "12345710-2" y "12.345.710-2" coincidan).
+    """
+    rut_limpio = re.sub(r"[^0-9K]", "", (rut or "").upper())
+    partes = [rut_limpio] + [
+        normalizar_texto_busqueda(t) for t in (ap_paterno, ap_materno, nombres)
+    ]
+    return " ".join(p for p in partes if p)
 
 
 def generar_nombre_documento(
@@ -101,8 +137,8 @@ def generar_nombre_documento(
 
         CONTRATO_INDEFINIDO_PAILLALEVE_2025-03-01.pdf
     """
-    tipo_norm = _normalizar_texto_simple(tipo)
-    ap_norm = _normalizar_texto_simple(ap_paterno)
+    tipo_norm = normalizar_segmento(tipo)
+    ap_norm = normalizar_segmento(ap_paterno)
     ext = (extension or "pdf").lower().lstrip(".")
 
     fecha_str = fecha_ref.strftime("%Y-%m-%d") if fecha_ref else "SIN_FECHA"
@@ -134,3 +170,18 @@ def get_nextcloud_base_path() -> Path:
     """
     root = os.environ.get("NEXTCLOUD_ROOT", "/mnt/nextcloud/DOCUMENTACION LABORAL")
     return Path(root)
+
+
+def ruta_fisica_documento(ruta_logica: str) -> Path:
+    """
+    'DOCUMENTACION LABORAL/EMPLEADORES/...' -> ruta en disco, bajo la
+    carpeta base (mismo criterio que el indexador de archivos).
+
+    Lanza ValueError si la ruta, ya resuelta (con '..' y enlaces
+    simbólicos), queda fuera de la carpeta base.
+    """
+    base = get_nextcloud_base_path().resolve()
+    ruta = base.parent.joinpath(*ruta_logica.split("/")).resolve()
+    if not ruta.is_relative_to(base):
+        raise ValueError(f"Ruta fuera de la carpeta de documentos: {ruta_logica}")
+    return ruta
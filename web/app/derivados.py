@@ -0,0 +1,426 @@
+# web/app/derivados.py
+
+"""
+Datos derivados que se guardan desnormalizados para no recalcularlos en
+cada lectura:
+
+- trabajadores.empleador_preferente_id: el empleador de su contrato
+  VIGENTE más reciente (por fecha_inicio) o, si no tiene vigentes, el de
+  su contrato más reciente con empleador.
+- trabajadores.carpeta_nombre: carpeta estándar en Nextcloud
+  (12345710-2_PAILLALEVE_GUINEO_HECTOR_DAVID).
+- trabajadores.ruta_nextcloud_preferente: ruta base de sus documentos
+  bajo el empleador preferente.
+- documentos_laborales.carpeta_destino: carpeta del documento según el
+  empleador y trabajador de su contrato y su tipo.
+
+Quién los mantiene:
+
+- Cambios por el ORM: los eventos registrados en models.py, en la misma
+  transacción (carpeta_nombre en before_insert/update; el resto tras el
+  flush, con recalcular_derivados()).
+- Escrituras masivas sin ORM (importaciones): llaman a
+  recalcular_derivados() con los trabajadores afectados.
+- `flask recalcular-derivados` los recalcula para toda la base.
+"""
+
+from sqlalchemy import case, func, inspect, text
+
+from .config import NEXTCLOUD_BASE_PATH
+from .extensions import db
+
+
+LOTE = 1000
+
+
+def _conexion(conexion):
+    return conexion if conexion is not None else db.session.connection()
+
+
+def _lotes(consulta, columna_id, ids=None, columna_filtro=None, lote: int = LOTE, conexion=None):
+    """
+    Filas de `consulta` en lotes: si hay `ids`, por trozos de `ids` sobre
+    `columna_filtro` (por defecto la misma columna_id); si no, recorriendo
+    toda la tabla por keyset sobre columna_id.
+    """
+    if ids is not None:
+        pendientes = sorted(ids)
+        columna_filtro = columna_filtro if columna_filtro is not None else columna_id
+        for i in range(0, len(pendientes), lote):
+            filas = _conexion(conexion).execute(
+                consulta.where(columna_filtro.in_(pendientes[i:i + lote])).order_by(columna_id)
+            ).all()
+            if filas:
+                yield filas
+        return
+
+    ultimo_id = 0
+    while True:
+        filas = _conexion(conexion).execute(
+            consulta.where(columna_id > ultimo_id).order_by(columna_id).limit(lote)
+        ).all()
+        if not filas:
+            return
+        yield filas
+        ultimo_id = filas[-1][0]
+
+
+def _actualizar(tabla, cambios: list[dict], conexion=None, confirmar: bool = False) -> int:
+    """UPDATE por id (executemany) de los dicts {"id": ..., columna: valor}."""
+    if not cambios:
+        return 0
+    columnas = [c for c in cambios[0] if c != "id"]
+    valores = {c: db.bindparam(f"b_{c}") for c in columnas}
+    if "actualizado_en" in tabla.c:
+        # Explícito: las fichas (ETag) y filas cacheadas dependen de este sello
+        valores["actualizado_en"] = func.now()
+    _conexion(conexion).execute(
+        tabla.update()
+        .where(tabla.c.id == db.bindparam("b_id"))
+        .values(valores),
+        [{f"b_{k}": v for k, v in cambio.items()} for cambio in cambios],
+    )
+    if confirmar:
+        db.session.commit()
+    return len(cambios)
+
+
+# ==========================
+# Empleador preferente
+# ==========================
+
+def orden_preferencia(contratos):
+    """
+    ORDER BY del contrato "preferente" de un trabajador: vigentes primero,
+    luego fecha_inicio más reciente (sin fecha al final) y, en empate, el
+    contrato más antiguo.
+    """
+    return (
+        case((contratos.c.estado_contrato == "VIGENTE", 0), else_=1),
+        case((contratos.c.fecha_inicio.is_(None), 1), else_=0),
+        contratos.c.fecha_inicio.desc(),
+        contratos.c.id,
+    )
+
+
+def consulta_empleadores_preferentes(trabajador_ids=None):
+    """
+    SELECT (trabajador_id, empleador_id) con el empleador preferente de
+    cada trabajador, calculado desde sus contratos con row_number().
+    """
+    from .models import Contrato
+
+    contratos = Contrato.__table__
+    posicion = func.row_number().over(
+        partition_by=contratos.c.trabajador_id,
+        order_by=orden_preferencia(contratos),
+    ).label("posicion")
+
+    candidatos = (
+        db.select(contratos.c.trabajador_id, contratos.c.empleador_id, posicion)
+        .where(contratos.c.empleador_id.isnot(None))
+    )
+    if trabajador_ids is not None:
+        candidatos = candidatos.where(contratos.c.trabajador_id.in_(trabajador_ids))
+    candidatos = candidatos.subquery()
+
+    return (
+        db.select(candidatos.c.trabajador_id, candidatos.c.empleador_id)
+        .where(candidatos.c.posicion == 1)
+    )
+
+
+def calcular_empleadores_preferentes(trabajador_ids, conexion=None) -> dict[int, int]:
+    """
+    trabajador_id -> empleador_id preferente para N trabajadores en una
+    consulta. Los que no tienen contratos con empleador no aparecen.
+    """
+    trabajador_ids = list(trabajador_ids)
+    if not trabajador_ids:
+        return {}
+    return dict(_conexion(conexion).execute(consulta_empleadores_preferentes(trabajador_ids)).all())
+
+
+def empleadores_preferentes(trabajador_ids) -> dict:
+    """
+    trabajador_id -> Empleador preferente (o None), calculado desde los
+    contratos para toda una página de trabajadores con dos consultas.
+    Para leer el valor ya guardado basta con
+    selectinload(Trabajador.empleador_preferente).
+    """
+    from .models import Empleador
+
+    trabajador_ids = list(trabajador_ids)
+    preferentes = calcular_empleadores_preferentes(trabajador_ids)
+    empleadores = {}
+    if preferentes:
+        empleadores = {
+            e.id: e
+            for e in Empleador.query.filter(Empleador.id.in_(set(preferentes.values())))
+        }
+    return {tid: empleadores.get(preferentes.get(tid)) for tid in trabajador_ids}
+
+
+def recalcular_empleador_preferente(ids=None, lote: int = LOTE, conexion=None,
+                                    confirmar: bool = False) -> int:
+    """
+    Recalcula `empleador_preferente_id` para todos los trabajadores (o solo
+    `ids`). Solo escribe los que cambian; devuelve cuántos cambió.
+    """
+    from .models import Trabajador
+
+    tabla = Trabajador.__table__
+    consulta = db.select(tabla.c.id, tabla.c.empleador_preferente_id)
+    cambiados = 0
+
+    for filas in _lotes(consulta, tabla.c.id, ids, lote=lote, conexion=conexion):
+        preferentes = calcular_empleadores_preferentes([f.id for f in filas], conexion)
+        cambios = [
+            {"id": f.id, "empleador_preferente_id": preferentes.get(f.id)}
+            for f in filas
+            if preferentes.get(f.id) != f.empleador_preferente_id
+        ]
+        cambiados += _actualizar(tabla, cambios, conexion, confirmar)
+
+    return cambiados
+
+
+# ==========================
+# Carpetas y rutas en Nextcloud
+# ==========================
+
+def ruta_base(razon_social: str | None, carpeta_nombre: str | None) -> str | None:
+    """Ruta lógica de los documentos de un trabajador bajo un empleador."""
+    if not razon_social or not carpeta_nombre:
+        return None
+    return NEXTCLOUD_BASE_PATH.format(empleador=razon_social, carpeta_trabajador=carpeta_nombre)
+
+
+def carpeta_documento(razon_social: str | None, carpeta_nombre: str | None, tipo: str | None) -> str | None:
+    """.../TRABAJADORES/<CARPETA_TRABAJADOR>/<TIPO>"""
+    base = ruta_base(razon_social, carpeta_nombre)
+    if not base or not tipo:
+        return None
+    return f"{base}/{tipo.upper()}"
+
+
+def rutas_documentos(documentos, contratos: dict | None = None) -> dict:
+    """
+    documento.id -> ruta lógica completa (o None) para documentos de uno o
+    muchos contratos, con un número acotado de consultas.
+
+    Usa `carpeta_destino` ya guardada; los documentos que no la tienen
+    (base sin backfill) se resuelven cargando sus contratos con trabajador
+    y empleador en una consulta por lote y calculando la carpeta base una
+    sola vez por contrato. `contratos` (id -> Contrato) evita recargar los
+    que el llamador ya tiene.
+    """
+    from sqlalchemy.orm import joinedload
+
+    from .config import normalizar_nombre_trabajador
+    from .models import Contrato
+
+    rutas = {}
+    pendientes = []
+    for documento in documentos:
+        if documento.carpeta_destino:
+            rutas[documento.id] = f"{documento.carpeta_destino}/{documento.nombre_archivo}"
+        else:
+            pendientes.append(documento)
+    if not pendientes:
+        return rutas
+
+    contratos = dict(contratos or {})
+    faltan = sorted({d.contrato_id for d in pendientes} - contratos.keys())
+    for i in range(0, len(faltan), LOTE):
+        consulta = (
+            Contrato.query
+            .options(joinedload(Contrato.trabajador), joinedload(Contrato.empleador))
+            .filter(Contrato.id.in_(faltan[i:i + LOTE]))
+        )
+        contratos.update((c.id, c) for c in consulta)
+
+    bases = {}
+    for documento in pendientes:
+        if documento.contrato_id not in bases:
+            contrato = contratos.get(documento.contrato_id)
+            trabajador = contrato.trabajador if contrato else None
+            carpeta = trabajador and (trabajador.carpeta_nombre or normalizar_nombre_trabajador(
+                trabajador.rut, trabajador.nombres, trabajador.ap_paterno, trabajador.ap_materno,
+            ))
+            razon_social = contrato.empleador.razon_social if contrato and contrato.empleador else None
+            bases[documento.contrato_id] = (razon_social, carpeta)
+        carpeta = carpeta_documento(*bases[documento.contrato_id], documento.tipo)
+        rutas[documento.id] = f"{carpeta}/{documento.nombre_archivo}" if carpeta else None
+    return rutas
+
+
+def recalcular_carpetas_trabajadores(ids=None, lote: int = LOTE, conexion=None,
+                                     confirmar: bool = False) -> int:
+    """
+    Recalcula `carpeta_nombre` y `ruta_nextcloud_preferente` (según el
+    empleador_preferente_id ya guardado). Devuelve cuántos cambió.
+    """
+    from .config import normalizar_nombre_trabajador
+    from .models import Empleador, Trabajador
+
+    tabla = Trabajador.__table__
+    empleadores = Empleador.__table__
+    consulta = (
+        db.select(
+            tabla.c.id, tabla.c.rut, tabla.c.nombres, tabla.c.ap_paterno, tabla.c.ap_materno,
+            tabla.c.carpeta_nombre, tabla.c.ruta_nextcloud_preferente, empleadores.c.razon_social,
+        )
+        .select_from(tabla.outerjoin(empleadores, empleadores.c.id == tabla.c.empleador_preferente_id))
+    )
+    cambiados = 0
+
+    for filas in _lotes(consulta, tabla.c.id, ids, lote=lote, conexion=conexion):
+        cambios = []
+        for f in filas:
+            carpeta = normalizar_nombre_trabajador(f.rut, f.nombres, f.ap_paterno, f.ap_materno)
+            ruta = ruta_base(f.razon_social, carpeta)
+            if carpeta != f.carpeta_nombre or ruta != f.ruta_nextcloud_preferente:
+                cambios.append({"id": f.id, "carpeta_nombre": carpeta, "ruta_nextcloud_preferente": ruta})
+        cambiados += _actualizar(tabla, cambios, conexion, confirmar)
+
+    return cambiados
+
+
+def recalcular_carpetas_documentos(trabajador_ids=None, documento_ids=None, lote: int = LOTE,
+                                   conexion=None, confirmar: bool = False) -> int:
+    """
+    Recalcula `carpeta_destino` de los documentos de `trabajador_ids`, de
+    los `documento_ids` indicados o (sin filtros) de todos.
+    Usa el carpeta_nombre ya guardado del trabajador.
+    """
+    from .indice_archivos import sentencia_presencia
+    from .models import Contrato, DocumentoLaboral, Empleador, Trabajador
+
+    documentos = DocumentoLaboral.__table__
+    contratos = Contrato.__table__
+    trabajadores = Trabajador.__table__
+    empleadores = Empleador.__table__
+
+    consulta = (
+        db.select(
+            documentos.c.id, documentos.c.tipo, documentos.c.carpeta_destino,
+            trabajadores.c.carpeta_nombre, empleadores.c.razon_social,
+        )
+        .select_from(
+            documentos
+            .join(contratos, contratos.c.id == documentos.c.contrato_id)
+            .join(trabajadores, trabajadores.c.id == contratos.c.trabajador_id)
+            .outerjoin(empleadores, empleadores.c.id == contratos.c.empleador_id)
+        )
+    )
+    if trabajador_ids is not None:
+        ids, columna_filtro = trabajador_ids, contratos.c.trabajador_id
+    else:
+        ids, columna_filtro = documento_ids, None
+    cambiados = 0
+
+    for filas in _lotes(consulta, documentos.c.id, ids, columna_filtro, lote=lote, conexion=conexion):
+        cambios = [
+            {"id": f.id, "carpeta_destino": carpeta}
+            for f in filas
+            if (carpeta := carpeta_documento(f.razon_social, f.carpeta_nombre, f.tipo)) != f.carpeta_destino
+        ]
+        cambiados += _actualizar(documentos, cambios, conexion)
+        if cambios:
+            # Con la carpeta nueva, ¿el archivo está en el índice de Nextcloud?
+            _conexion(conexion).execute(
+                sentencia_presencia().where(documentos.c.id.in_([c["id"] for c in cambios]))
+            )
+            if confirmar:
+                db.session.commit()
+
+    return cambiados
+
+
+# ==========================
+# Todo junto
+# ==========================
+
+def recalcular_derivados(trabajador_ids=None, conexion=None, confirmar: bool = False) -> dict:
+    """
+    Recalcula, en orden de dependencia, todos los derivados de los
+    trabajadores indicados (o de todos): empleador preferente, carpeta y
+    ruta del trabajador, y carpetas de sus documentos.
+    """
+    opciones = {"conexion": conexion, "confirmar": confirmar}
+    return {
+        "empleador_preferente": recalcular_empleador_preferente(trabajador_ids, **opciones),
+        "carpetas_trabajadores": recalcular_carpetas_trabajadores(trabajador_ids, **opciones),
+        "carpetas_documentos": recalcular_carpetas_documentos(trabajador_ids, **opciones),
+    }
+
+
+def trabajadores_de_empleadores(empleador_ids, conexion=None) -> set[int]:
+    """Trabajadores cuyas rutas dependen de la razón social de `empleador_ids`."""
+    from .models import Contrato, Trabajador
+
+    empleador_ids = list(empleador_ids)
+    if not empleador_ids:
+        return set()
+    trabajadores = Trabajador.__table__
+    contratos = Contrato.__table__
+    consulta = db.union(
+        db.select(trabajadores.c.id).where(trabajadores.c.empleador_preferente_id.in_(empleador_ids)),
+        db.select(contratos.c.trabajador_id).where(contratos.c.empleador_id.in_(empleador_ids)),
+    )
+    return set(_conexion(conexion).execute(consulta).scalars())
+
+
+# ==========================
+# Esquema
+# ==========================
+
+_COLUMNAS = (
+    ("trabajadores", "empleador_preferente_id", "INTEGER REFERENCES empleadores (id)"),
+    ("trabajadores", "carpeta_nombre", "VARCHAR(300)"),
+    ("trabajadores", "ruta_nextcloud_preferente", "VARCHAR(600)"),
+    ("documentos_laborales", "carpeta_destino", "VARCHAR(600)"),
+    ("documentos_laborales", "archivo_en_disco", "BOOLEAN"),
+    ("documentos_laborales", "sha256", "VARCHAR(64)"),
+    ("documentos_laborales", "tamano_bytes", "BIGINT"),
+)
+
+_INDICES = (
+    "CREATE INDEX IF NOT EXISTS ix_trabajadores_empleador_preferente_id "
+    "ON trabajadores (empleador_preferente_id)",
+    "CREATE INDEX IF NOT EXISTS ix_trabajadores_carpeta_nombre ON trabajadores (carpeta_nombre)",
+    "CREATE INDEX IF NOT EXISTS ix_trabajadores_ruta_nextcloud_preferente "
+    "ON trabajadores (ruta_nextcloud_preferente)",
+    "CREATE INDEX IF NOT EXISTS ix_documentos_carpeta_archivo "
+    "ON documentos_laborales (carpeta_destino, nombre_archivo)",
+    "CREATE INDEX IF NOT EXISTS ix_documentos_laborales_sha256 ON documentos_laborales (sha256)",
+    # La ventana por trabajador_id recorre sus contratos por este índice
+    "CREATE INDEX IF NOT EXISTS ix_contratos_trabajador_id ON contratos (trabajador_id)",
+)
+
+
+def asegurar_esquema_derivados() -> list[str]:
+    """
+    Agrega las columnas derivadas y sus índices en bases ya existentes
+    (db.create_all() no altera tablas creadas antes). Idempotente; la
+    llama create_app(). Devuelve las columnas agregadas ("tabla.columna"):
+    si hay alguna, falta recalcular_derivados().
+    """
+    inspector = inspect(db.engine)
+    existentes = {
+        tabla: {c["name"] for c in inspector.get_columns(tabla)}
+        for tabla in {t for t, _, _ in _COLUMNAS}
+    }
+    # IF NOT EXISTS: varios workers pueden arrancar a la vez
+    si_falta = "IF NOT EXISTS " if db.engine.dialect.name == "postgresql" else ""
+
+    agregadas = []
+    with db.engine.begin() as conn:
+        for tabla, columna, tipo in _COLUMNAS:
+            if columna not in existentes[tabla]:
+                conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {si_falta}{columna} {tipo}"))
+                agregadas.append(f"{tabla}.{columna}")
+        for indice in _INDICES:
+            conn.execute(text(indice))
+    return agregadas
@@ -0,0 +1,261 @@
+# web/app/exportar.py
+
+"""
+Exportación de listados a CSV / XLSX en streaming.
+
+Las filas se leen de la base de datos por lotes (yield_per, que en
+PostgreSQL usa un cursor del lado del servidor) y se van escribiendo a la
+respuesta a medida que llegan, así la memoria no crece con el número de
+filas.
+
+- CSV: separado por ';', UTF-8 con BOM (lo que abre bien Excel en español
+  y lo que leen los importadores quintero). El texto que empieza con
+  = + - @ va con un apóstrofo delante: Excel no lo evalúa como fórmula
+  (ni convierte "+569..." en número). Los importadores lo quitan.
+- XLSX: se arma el ZIP al vuelo con zipfile sobre un buffer que se vacía
+  después de cada lote; no hay archivo temporal.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+
+LOTE_FILAS = 1000
+
+FORMATOS_EXPORTACION = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def iterar_filas(query, lote: int = LOTE_FILAS):
+    """Recorre una query por lotes, sin cargar todas las filas en memoria."""
+    return query.yield_per(lote)
+
+
+class BufferSalida(io.RawIOBase):
+    """
+    Archivo "de solo escritura" que acumula bytes hasta que alguien los
+    retire con vaciar(). Sirve para que zipfile/csv escriban y el
+    generador de la respuesta vaya entregando los trozos.
+    No es seekable: zipfile usa entonces descriptores de datos.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+# ==========================
+# CSV
+# ==========================
+
+# Inicio de celda que Excel interpreta como fórmula
+INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime("%d-%m-%Y %H:%M")
+    if isinstance(valor, date):
+        return valor.strftime("%d-%m-%Y")
+    if isinstance(valor, Decimal):
+        # Sin separador de miles y con coma decimal (como escribe Excel en es-CL)
+        return format(valor, "f").replace(".", ",")
+    if isinstance(valor, bool):
+        return "SI" if valor else "NO"
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def generar_csv(encabezados, filas, lote: int = LOTE_FILAS):
+    texto = io.StringIO()
+    escritor = csv.writer(texto, delimiter=";", lineterminator="\r\n")
+
+    texto.write("\ufeff")
+    escritor.writerow(encabezados)
+
+    for n, fila in enumerate(filas, start=1):
+        escritor.writerow([_valor_csv(v) for v in fila])
+        if n % lote == 0:
+            yield texto.getvalue().encode("utf-8")
+            texto.seek(0)
+            texto.truncate()
+
+    yield texto.getvalue().encode("utf-8")
+
+
+# ==========================
+# XLSX
+# ==========================
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Estilo 0 = normal, 1 = fecha (dd-mm-yyyy), 2 = fecha y hora
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="dd\\-mm\\-yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd\\-mm\\-yyyy\\ hh:mm"/>'
+    '</numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf/>'
+    '<xf numFmtId="164" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+# Caracteres de control que no se permiten en XML 1.0
+_XML_INVALIDOS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_EPOCH_EXCEL = datetime(1899, 12, 30)
+
+
+def _xlsx_workbook(hoja: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(hoja[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celda_xlsx(valor) -> str:
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, datetime):
+        serial = (valor.replace(tzinfo=None) - _EPOCH_EXCEL).total_seconds() / 86400
+        return f'<c s="2"><v>{serial}</v></c>'
+    if isinstance(valor, date):
+        serial = (datetime(valor.year, valor.month, valor.day) - _EPOCH_EXCEL).days
+        return f'<c s="1"><v>{serial}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f"<c><v>{valor}</v></c>"
+    texto = escape(_XML_INVALIDOS.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xlsx(valores) -> str:
+    return "<row>" + "".join(_celda_xlsx(v) for v in valores) + "</row>"
+
+
+def generar_xlsx(encabezados, filas, hoja: str = "Datos", lote: int = LOTE_FILAS):
+    salida = BufferSalida()
+
+    with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _XLSX_RELS)
+        zf.writestr("xl/workbook.xml", _xlsx_workbook(hoja))
+        zf.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", _XLSX_STYLES)
+        yield salida.vaciar()
+
+        with zf.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as hoja_xml:
+            hoja_xml.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b"<sheetData>"
+            )
+            hoja_xml.write(_fila_xlsx(encabezados).encode("utf-8"))
+
+            partes = []
+            for n, fila in enumerate(filas, start=1):
+                partes.append(_fila_xlsx(fila))
+                if n % lote == 0:
+                    hoja_xml.write("".join(partes).encode("utf-8"))
+                    partes.clear()
+                    yield salida.vaciar()
+
+            hoja_xml.write("".join(partes).encode("utf-8"))
+            hoja_xml.write(b"</sheetData></worksheet>")
+
+    yield salida.vaciar()
+
+
+# ==========================
+# Respuesta HTTP
+# ==========================
+
+def respuesta_exportacion(formato: str, nombre_base: str, encabezados, filas) -> Response:
+    """
+    Arma la respuesta de descarga. `filas` puede ser un iterador perezoso
+    (p. ej. iterar_filas(query)); se consume mientras se envía.
+    """
+    if formato == "xlsx":
+        generador = generar_xlsx(encabezados, filas, hoja=nombre_base.capitalize())
+    else:
+        generador = generar_csv(encabezados, filas)
+
+    nombre = f"{nombre_base}_{date.today():%Y-%m-%d}.{formato}"
+    respuesta = Response(
+        stream_with_context(generador),
+        mimetype=FORMATOS_EXPORTACION[formato],
+    )
+    respuesta.headers["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    respuesta.headers["Cache-Control"] = "no-store"
+    return respuesta
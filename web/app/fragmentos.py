@@ -0,0 +1,137 @@
+# web/app/fragmentos.py
+
+"""
+Caché de fragmentos de plantilla: {% cache nombre, dep1, dep2, ... %}.
+
+    {% for t in trabajadores %}
+        {% cache "fila_trabajador", t.id, t.actualizado_en or t.creado_en, version_catalogos() %}
+            <tr>...</tr>
+        {% endcache %}
+    {% endfor %}
+
+El HTML ya renderizado se guarda bajo (plantilla, línea, nombre, deps):
+si ninguna dependencia cambió, la fila sale tal cual sin volver a
+evaluar el bloque. Las dependencias deben cubrir todo lo que el bloque
+muestra: id + timestamp de la entidad y, si aparecen nombres de obra,
+cargo, etc., version_catalogos() (sello de app/catalogos.py).
+
+- LRU en memoria del proceso, acotado por FRAGMENTOS_MAX_BYTES
+  (0 = desactivada). La comparten las peticiones del worker.
+- Aciertos / fallos por nombre de fragmento: /api/fragmentos/estado.
+- La clave lleva el mtime de la plantilla: al editarla (auto_reload en
+  desarrollo) los fragmentos viejos simplemente dejan de usarse.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from . import catalogos
+
+
+class CacheFragmentos:
+    """LRU de HTML por clave, con tope en caracteres (≈ bytes en UTF-8 latino)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()     # clave -> html
+        self._tamano = 0
+        self._lock = threading.Lock()
+        self._contadores = {}           # nombre -> [aciertos, fallos]
+        self.desalojos = 0
+
+    def obtener(self, nombre: str, clave: str) -> str | None:
+        with self._lock:
+            contador = self._contadores.setdefault(nombre, [0, 0])
+            html = self._datos.get(clave)
+            if html is None:
+                contador[1] += 1
+                return None
+            contador[0] += 1
+            self._datos.move_to_end(clave)
+            return html
+
+    def guardar(self, clave: str, html: str):
+        if len(html) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._tamano -= len(anterior)
+            self._datos[clave] = html
+            self._tamano += len(html)
+            while self._tamano > self.max_bytes:
+                _, viejo = self._datos.popitem(last=False)
+                self._tamano -= len(viejo)
+                self.desalojos += 1
+
+    def vaciar(self):
+        with self._lock:
+            self._datos.clear()
+            self._tamano = 0
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            fragmentos = {
+                nombre: {
+                    "aciertos": aciertos,
+                    "fallos": fallos,
+                    "tasa_aciertos": round(aciertos / (aciertos + fallos), 3) if aciertos + fallos else None,
+                }
+                for nombre, (aciertos, fallos) in sorted(self._contadores.items())
+            }
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._tamano,
+                "max_bytes": self.max_bytes,
+                "desalojos": self.desalojos,
+                "fragmentos": fragmentos,
+            }
+
+
+class FragmentosExtension(Extension):
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragmentos=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        nombre = parser.parse_expression()
+        dependencias = []
+        while parser.stream.skip_if("comma"):
+            dependencias.append(parser.parse_expression())
+        cuerpo = parser.parse_statements(("name:endcache",), drop_needle=True)
+
+        try:
+            version = int(os.path.getmtime(parser.filename)) if parser.filename else 0
+        except OSError:
+            version = 0
+        ubicacion = f"{parser.name}:{lineno}:{version}"
+
+        llamada = self.call_method(
+            "_fragmento", [nodes.Const(ubicacion), nombre, nodes.List(dependencias)]
+        )
+        return nodes.CallBlock(llamada, [], [], cuerpo).set_lineno(lineno)
+
+    def _fragmento(self, ubicacion, nombre, dependencias, caller):
+        cache = self.environment.fragmentos
+        if cache is None or not cache.max_bytes:
+            return caller()
+        clave = f"{ubicacion}:{nombre}:{dependencias!r}"
+        html = cache.obtener(nombre, clave)
+        if html is None:
+            html = str(caller())
+            cache.guardar(clave, html)
+        return Markup(html)
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentosExtension)
+    app.jinja_env.fragmentos = CacheFragmentos(app.config.get("FRAGMENTOS_MAX_BYTES", 0))
+    app.jinja_env.globals["version_catalogos"] = catalogos.version
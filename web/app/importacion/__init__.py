@@ -0,0 +1,13 @@
+# web/app/importacion/__init__.py
+
+"""
+Importación masiva (CSV -> BD).
+
+- lectura:    detección de codificación/separador y lectura en streaming
+- parseo:     conversión de celdas (fechas con formato detectado por columna)
+- resolucion: catálogos de referencia (obra, cargo, RUT, ...) en memoria
+- perfiles:   columnas, referencias y escritor de cada tipo de archivo
+- escritura:  escritores por lote (INSERT / ON CONFLICT / UPDATE)
+- pipeline:   une todo: `flask import <perfil> <archivo>`
+- staging:    carga de contratos vía COPY (solo PostgreSQL)
+"""
@@ -0,0 +1,314 @@
+# web/app/importacion/escritura.py
+
+"""
+Escritura por lotes: en vez de un SELECT + INSERT/UPDATE por fila,
+cada lote se escribe con un único
+
+    INSERT ... VALUES (...), (...), ...
+    ON CONFLICT (clave) DO UPDATE SET col = COALESCE(NULLIF(actual, ''), nuevo)
+
+que implementa la regla "solo rellenar campos vacíos" en la propia BD.
+Funciona igual en PostgreSQL y en SQLite (ambos soportan ON CONFLICT).
+"""
+
+from dataclasses import dataclass, field
+from itertools import islice
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..extensions import db
+
+
+TAMANO_LOTE = 500
+
+
+def en_lotes(iterable, tamano: int = TAMANO_LOTE):
+    """Agrupa un iterable en listas de a `tamano` elementos."""
+    iterador = iter(iterable)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _insert_para_dialecto(tabla):
+    if db.engine.dialect.name == "postgresql":
+        return pg_insert(tabla)
+    if db.engine.dialect.name == "sqlite":
+        return sqlite_insert(tabla)
+    raise RuntimeError(
+        f"El upsert masivo no está soportado para '{db.engine.dialect.name}'."
+    )
+
+
+def _con_sello(tabla, valores: dict) -> dict:
+    """
+    Agrega actualizado_en = now() si la tabla lo tiene: ON CONFLICT DO
+    UPDATE no aplica el onupdate de la columna, y las cachés de fichas
+    y filas (ETag, {% cache %}) dependen de ese sello.
+    """
+    if "actualizado_en" in tabla.c and "actualizado_en" not in valores:
+        valores = {**valores, "actualizado_en": func.now()}
+    return valores
+
+
+def _rellenar_si_vacio(tabla, excluido, columna: str):
+    actual = tabla.c[columna]
+    nuevo = excluido[columna]
+    if isinstance(actual.type, db.String):
+        return func.coalesce(func.nullif(func.trim(actual), ""), nuevo)
+    return func.coalesce(actual, nuevo)
+
+
+def _falta_y_viene(tabla, excluido, columna: str):
+    """La columna está vacía en la BD y la fila entrante trae un valor."""
+    actual = tabla.c[columna]
+    nuevo = excluido[columna]
+    if isinstance(actual.type, db.String):
+        return and_(
+            func.nullif(func.trim(actual), "").is_(None),
+            func.nullif(func.trim(nuevo), "").isnot(None),
+        )
+    return and_(actual.is_(None), nuevo.isnot(None))
+
+
+def upsert_rellenando(tabla, filas: list[dict], clave: str, rellenables: list[str], extra_set=None) -> set:
+    """
+    Inserta `filas` en `tabla`; si la `clave` ya existe, solo completa las
+    columnas `rellenables` que estén NULL o vacías en la BD.
+
+    El DO UPDATE lleva WHERE: una fila existente a la que no hay nada que
+    rellenar no se toca (ni su actualizado_en de `extra_set`). Devuelve
+    las claves efectivamente insertadas o actualizadas (RETURNING).
+
+    Las filas deben venir sin claves repetidas dentro del mismo lote
+    (PostgreSQL no permite actualizar dos veces la misma fila en una sentencia).
+    """
+    if not filas:
+        return set()
+
+    stmt = _insert_para_dialecto(tabla).values(filas)
+    valores = {
+        columna: _rellenar_si_vacio(tabla, stmt.excluded, columna)
+        for columna in rellenables
+    }
+    if extra_set:
+        valores.update(extra_set)
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[clave],
+        set_=valores,
+        where=or_(*[_falta_y_viene(tabla, stmt.excluded, c) for c in rellenables]),
+    ).returning(tabla.c[clave])
+    return set(db.session.execute(stmt).scalars())
+
+
+# ==========================
+# Escritores para el pipeline
+# ==========================
+
+@dataclass
+class ResultadoLote:
+    nuevos: int = 0
+    actualizados: int = 0
+    rechazos: list = field(default_factory=list)   # (numero_fila, motivo, detalle)
+
+
+class Escritor:
+    """
+    Base de los escritores: reciben un lote de (numero_fila, valores) ya
+    parseados y resueltos, y lo escriben con sentencias por lote.
+    Las claves que no son columnas de la tabla se ignoran.
+    """
+
+    def __init__(self, modelo):
+        self.tabla = modelo.__table__
+        self._columnas = set(self.tabla.c.keys())
+
+    def _limpiar(self, valores: dict) -> dict:
+        return {k: v for k, v in valores.items() if k in self._columnas}
+
+    def _existentes(self, clave: str, claves, *columnas) -> dict:
+        """clave -> fila (columnas pedidas) de las claves del lote que ya están en la tabla."""
+        if not claves:
+            return {}
+        col = self.tabla.c[clave]
+        consulta = db.select(col, *[self.tabla.c[c] for c in columnas]).where(col.in_(claves))
+        return {fila[0]: fila[1:] for fila in db.session.execute(consulta)}
+
+    def escribir(self, filas) -> ResultadoLote:
+        raise NotImplementedError
+
+
+class Insertar(Escritor):
+    """
+    INSERT de todas las filas (executemany en lote).
+    despues_lote(valores): hook para recalcular datos derivados de lo insertado.
+    """
+
+    def __init__(self, modelo, despues_lote=None):
+        super().__init__(modelo)
+        self.despues_lote = despues_lote
+
+    def escribir(self, filas):
+        valores = [self._limpiar(v) for _, v in filas]
+        if valores:
+            db.session.execute(self.tabla.insert(), valores)
+            if self.despues_lote:
+                self.despues_lote(valores)
+        return ResultadoLote(nuevos=len(valores))
+
+
+class InsertarNuevos(Escritor):
+    """Inserta solo las claves que no existen; las existentes se rechazan como YA_EXISTE."""
+
+    def __init__(self, modelo, clave: str):
+        super().__init__(modelo)
+        self.clave = clave
+
+    def escribir(self, filas):
+        resultado = ResultadoLote()
+        existentes = self._existentes(self.clave, {v[self.clave] for _, v in filas})
+        vistos = set()
+        valores = []
+        for numero, v in filas:
+            clave = v[self.clave]
+            if clave in existentes or clave in vistos:
+                resultado.rechazos.append((numero, "YA_EXISTE", f"{self.clave} {clave}"))
+                continue
+            vistos.add(clave)
+            valores.append(self._limpiar(v))
+        if valores:
+            db.session.execute(self.tabla.insert(), valores)
+        resultado.nuevos = len(valores)
+        return resultado
+
+
+class Sobrescribir(Escritor):
+    """INSERT ... ON CONFLICT (clave) DO UPDATE que pisa las `columnas` indicadas."""
+
+    def __init__(self, modelo, clave: str, columnas: list[str]):
+        super().__init__(modelo)
+        self.clave = clave
+        self.columnas = columnas
+
+    def escribir(self, filas):
+        # Clave repetida en el lote: gana la última (como al recorrer fila a fila)
+        por_clave = {v[self.clave]: self._limpiar(v) for _, v in filas}
+        existentes = self._existentes(self.clave, list(por_clave))
+        if por_clave:
+            stmt = _insert_para_dialecto(self.tabla).values(list(por_clave.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[self.clave],
+                set_=_con_sello(self.tabla, {c: stmt.excluded[c] for c in self.columnas}),
+            )
+            db.session.execute(stmt)
+        return ResultadoLote(
+            nuevos=len(por_clave) - len(existentes),
+            actualizados=len(existentes),
+        )
+
+
+class Actualizar(Escritor):
+    """UPDATE ... WHERE clave = :clave en lote, solo de las `columnas` indicadas."""
+
+    def __init__(self, modelo, clave: str, columnas: list[str]):
+        super().__init__(modelo)
+        self.clave = clave
+        self.columnas = columnas
+
+    def escribir(self, filas):
+        parametros = [
+            {"b_clave": v[self.clave], **{f"b_{c}": v[c] for c in self.columnas}}
+            for _, v in filas
+        ]
+        if parametros:
+            db.session.execute(
+                self.tabla.update()
+                .where(self.tabla.c[self.clave] == db.bindparam("b_clave"))
+                .values(_con_sello(self.tabla, {c: db.bindparam(f"b_{c}") for c in self.columnas})),
+                parametros,
+            )
+        return ResultadoLote(actualizados=len(parametros))
+
+
+@dataclass(frozen=True)
+class ColumnaExistente:
+    """Para Rellenar.neutros: tomar el valor que ya tiene la fila en BD."""
+    columna: str
+
+
+class Rellenar(Escritor):
+    """
+    upsert_rellenando() para el pipeline: las filas nuevas se insertan y
+    las existentes solo completan las columnas `rellenables` vacías.
+
+    - requeridas_nuevos: columnas sin las que no se puede crear la fila
+      (se rechaza con FALTAN_DATOS).
+    - neutros: valores para columnas NOT NULL de filas existentes
+      (PostgreSQL valida NOT NULL antes de detectar el conflicto). Cada
+      valor es un literal o un nombre de columna de la fila en BD.
+    - despues_lote(ids_actualizados): hook para recalcular datos derivados
+      de las filas existentes que sí cambiaron.
+    """
+
+    def __init__(self, modelo, clave: str, rellenables: list[str], requeridas_nuevos=(),
+                 neutros=None, extra_set=None, despues_lote=None):
+        super().__init__(modelo)
+        self.clave = clave
+        self.rellenables = rellenables
+        self.requeridas_nuevos = requeridas_nuevos
+        self.neutros = neutros or {}
+        self.extra_set = extra_set
+        self.despues_lote = despues_lote
+        self._columnas_bd = ["id"] + [
+            v.columna for v in self.neutros.values() if isinstance(v, ColumnaExistente)
+        ]
+
+    def escribir(self, filas):
+        resultado = ResultadoLote()
+
+        # Clave repetida en el lote: la primera fila manda, las siguientes solo rellenan
+        por_clave = {}
+        for numero, v in filas:
+            previa = por_clave.get(v[self.clave])
+            if previa is None:
+                por_clave[v[self.clave]] = (numero, dict(v))
+            else:
+                for k, valor in v.items():
+                    if previa[1].get(k) is None:
+                        previa[1][k] = valor
+
+        existentes = self._existentes(self.clave, list(por_clave), *self._columnas_bd)
+
+        valores = []
+        ids_existentes = {}     # clave -> id
+        for clave, (numero, v) in por_clave.items():
+            fila_bd = existentes.get(clave)
+            if fila_bd is not None:
+                bd = dict(zip(self._columnas_bd, fila_bd))
+                for columna, neutro in self.neutros.items():
+                    if v.get(columna) is None:
+                        v[columna] = bd[neutro.columna] if isinstance(neutro, ColumnaExistente) else neutro
+                ids_existentes[clave] = bd["id"]
+            else:
+                faltan = [c for c in self.requeridas_nuevos if v.get(c) is None]
+                if faltan:
+                    resultado.rechazos.append(
+                        (numero, "FALTAN_DATOS", f"{self.clave} {clave}: faltan {', '.join(faltan)}")
+                    )
+                    continue
+            valores.append(self._limpiar(v))
+
+        escritas = upsert_rellenando(self.tabla, valores, self.clave, self.rellenables, self.extra_set)
+        ids_actualizados = [i for clave, i in ids_existentes.items() if clave in escritas]
+
+        if self.despues_lote:
+            self.despues_lote(ids_actualizados)
+
+        resultado.actualizados = len(ids_actualizados)
+        resultado.nuevos = len(escritas) - len(ids_actualizados)
+        return resultado
@@ -0,0 +1,92 @@
+# web/app/importacion/lectura.py
+
+"""
+Lectura de archivos de origen (CSV) en streaming.
+
+Los archivos que nos llegan vienen de Excel en español (';' y a veces
+Latin-1) o de exportaciones de otros sistemas (',' y UTF-8). En vez de
+fijarlo en cada script, se detecta mirando solo el comienzo del archivo.
+"""
+
+import codecs
+import csv
+import io
+from dataclasses import dataclass
+
+
+# Bytes que se leen para adivinar codificación y separador
+MUESTRA_BYTES = 64 * 1024
+
+DELIMITADORES = ";,\t|"
+
+
+@dataclass
+class ArchivoOrigen:
+    ruta: str
+    codificacion: str
+    delimitador: str
+    encabezados: list[str]
+
+
+def detectar_codificacion(muestra: bytes) -> str:
+    """
+    UTF-8 (con o sin BOM) si la muestra decodifica; si no, cp1252, que es
+    lo que guarda Excel en Windows ("CSV delimitado por comas").
+    """
+    try:
+        # final=False: un carácter multibyte cortado al final de la muestra no cuenta
+        codecs.getincrementaldecoder("utf-8-sig")().decode(muestra, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def detectar_delimitador(texto: str) -> str:
+    """
+    Gana el candidato que más aparece en el encabezado (los nombres de
+    columna casi nunca traen separadores). Si el encabezado no decide,
+    se le pregunta a csv.Sniffer con las primeras líneas.
+    """
+    lineas = texto.splitlines()[:20]
+    if not lineas:
+        return ";"
+    conteos = {d: lineas[0].count(d) for d in DELIMITADORES}
+    mejor = max(conteos, key=conteos.get)
+    if conteos[mejor] and list(conteos.values()).count(conteos[mejor]) == 1:
+        return mejor
+    try:
+        return csv.Sniffer().sniff("\n".join(lineas), delimiters=DELIMITADORES).delimiter
+    except csv.Error:
+        return ";"
+
+
+def inspeccionar(ruta: str, codificacion: str | None = None, delimitador: str | None = None) -> ArchivoOrigen:
+    """Detecta (lo que no venga dado) y lee el encabezado, sin recorrer el archivo."""
+    with open(ruta, "rb") as f:
+        muestra = f.read(MUESTRA_BYTES)
+
+    codificacion = codificacion or detectar_codificacion(muestra)
+    texto = muestra.decode(codificacion, errors="ignore")
+    delimitador = delimitador or detectar_delimitador(texto)
+
+    encabezados = next(csv.reader(io.StringIO(texto), delimiter=delimitador), [])
+    return ArchivoOrigen(
+        ruta=ruta,
+        codificacion=codificacion,
+        delimitador=delimitador,
+        encabezados=[e.strip() for e in encabezados],
+    )
+
+
+def leer_filas(origen: ArchivoOrigen):
+    """
+    Itera (numero_fila, valores) sin el encabezado. numero_fila parte en 1
+    con la primera fila de datos. Las filas totalmente vacías se saltan.
+    """
+    with open(origen.ruta, newline="", encoding=origen.codificacion) as f:
+        reader = csv.reader(f, delimiter=origen.delimitador)
+        next(reader, None)
+        for numero, valores in enumerate(reader, start=1):
+            if not any(v.strip() for v in valores):
+                continue
+            yield numero, valores
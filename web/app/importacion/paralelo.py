@@ -0,0 +1,156 @@
+# web/app/importacion/paralelo.py
+
+"""
+Parseo en paralelo de archivos grandes.
+
+El archivo se corta en trozos por rango de bytes (alineados a inicio de
+línea) y cada trozo se parsea/valida en un proceso aparte con el mismo
+Parseador del pipeline secuencial. El proceso principal recibe los trozos
+EN ORDEN y es el único que resuelve referencias y escribe en la BD, así
+la numeración de filas y los rechazos son los mismos que sin paralelo.
+
+Supone que ninguna celda trae saltos de línea entre comillas (lo normal
+en las planillas que importamos); si un archivo los tiene, usar el modo
+secuencial (--procesos 1).
+"""
+
+import csv
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .lectura import leer_filas
+from .parseo import Parseador
+
+
+# Tamaño objetivo de cada trozo (~15-30 mil filas en nuestros CSV)
+BYTES_TROZO = 2 * 1024 * 1024
+
+
+def procesos_disponibles(procesos: int | None) -> int:
+    """0 o None = todos los núcleos."""
+    return procesos if procesos and procesos > 0 else (os.cpu_count() or 1)
+
+
+def calcular_trozos(ruta: str, bytes_trozo: int = BYTES_TROZO) -> list[tuple[int, int]]:
+    """Rangos [inicio, fin) de bytes, sin el encabezado y terminando en fin de línea."""
+    trozos = []
+    with open(ruta, "rb") as f:
+        f.readline()                      # encabezado
+        inicio = f.tell()
+        tamano = os.fstat(f.fileno()).st_size
+        while inicio < tamano:
+            f.seek(min(inicio + bytes_trozo, tamano))
+            f.readline()
+            fin = min(f.tell(), tamano)
+            trozos.append((inicio, fin))
+            inicio = fin
+    return trozos
+
+
+def _parsear_trozo(tarea):
+    """
+    Se ejecuta en el proceso hijo. Devuelve (filas, líneas leídas,
+    formatos de fecha detectados), con filas numeradas desde 1 dentro del trozo.
+    """
+    from .perfiles import obtener_perfil
+
+    nombre_perfil, ruta, codificacion, delimitador, mapa, contexto, inicio, fin = tarea
+    parseador = Parseador(obtener_perfil(nombre_perfil), mapa, contexto)
+
+    with open(ruta, "rb") as f:
+        f.seek(inicio)
+        texto = f.read(fin - inicio).decode(codificacion)
+
+    filas = []
+    lineas = 0
+    for lineas, celdas in enumerate(csv.reader(io.StringIO(texto, newline=""), delimiter=delimitador), start=1):
+        if not any(v.strip() for v in celdas):
+            continue
+        filas.append(parseador.parsear(lineas, celdas))
+    return filas, lineas, parseador.formatos_fecha()
+
+
+class ParseoParalelo:
+    """
+    Iterable de FilaParseada, igual que ParseoSecuencial, pero con los trozos
+    parseados por un pool de procesos. Solo mantiene en vuelo `2 × procesos`
+    trozos: si la BD es el cuello de botella, los workers esperan en vez de
+    acumular el archivo entero en memoria.
+    """
+
+    def __init__(self, perfil, origen, mapa, contexto, procesos: int, bytes_trozo: int = BYTES_TROZO,
+                 desde_fila: int = 0):
+        self.perfil = perfil
+        self.desde_fila = desde_fila
+        self.origen = origen
+        self.mapa = mapa
+        self.contexto = contexto
+        self.procesos = procesos
+        self.trozos = calcular_trozos(origen.ruta, bytes_trozo)
+        self._formatos = {}
+
+    def formatos_fecha(self) -> dict:
+        return self._formatos
+
+    def _tarea(self, trozo):
+        return (
+            self.perfil.nombre, self.origen.ruta, self.origen.codificacion,
+            self.origen.delimitador, self.mapa, self.contexto, *trozo,
+        )
+
+    def __iter__(self):
+        # spawn: los hijos no heredan las conexiones abiertas a la BD
+        contexto_mp = multiprocessing.get_context("spawn")
+        pendientes_trozos = iter(self.trozos)
+        desplazamiento = 0
+
+        with ProcessPoolExecutor(max_workers=self.procesos, mp_context=contexto_mp) as pool:
+            en_vuelo = deque()
+            for trozo in pendientes_trozos:
+                en_vuelo.append(pool.submit(_parsear_trozo, self._tarea(trozo)))
+                if len(en_vuelo) >= 2 * self.procesos:
+                    break
+
+            while en_vuelo:
+                filas, lineas, formatos = en_vuelo.popleft().result()
+                siguiente = next(pendientes_trozos, None)
+                if siguiente is not None:
+                    en_vuelo.append(pool.submit(_parsear_trozo, self._tarea(siguiente)))
+
+                self._formatos.update(formatos)
+                for fila in filas:
+                    if fila.numero + desplazamiento > self.desde_fila:
+                        yield fila._replace(numero=fila.numero + desplazamiento)
+                desplazamiento += lineas
+
+
+class ParseoSecuencial:
+    """Parseo en el mismo proceso, fila a fila (archivos chicos o --procesos 1)."""
+
+    def __init__(self, perfil, origen, mapa, contexto, desde_fila: int = 0):
+        self._filas = leer_filas(origen)
+        self._desde_fila = desde_fila
+        self._parseador = Parseador(perfil, mapa, contexto)
+
+    def formatos_fecha(self) -> dict:
+        return self._parseador.formatos_fecha()
+
+    def __iter__(self):
+        for numero, celdas in self._filas:
+            if numero > self._desde_fila:
+                yield self._parseador.parsear(numero, celdas)
+
+
+def crear_parseo(perfil, origen, mapa, contexto, procesos: int = 1, bytes_trozo: int = BYTES_TROZO,
+                 desde_fila: int = 0):
+    """
+    Paralelo solo si se pidió más de un proceso y el archivo da para más de
+    un trozo. Las filas hasta `desde_fila` (ya confirmadas) no se entregan.
+    """
+    procesos = procesos_disponibles(procesos)
+    if procesos > 1 and os.path.getsize(origen.ruta) > bytes_trozo:
+        return ParseoParalelo(perfil, origen, mapa, contexto, procesos, bytes_trozo, desde_fila)
+    return ParseoSecuencial(perfil, origen, mapa, contexto, desde_fila)
@@ -0,0 +1,195 @@
+# web/app/importacion/parseo.py
+
+"""
+Conversión de celdas de texto a valores de BD.
+
+Cada columna de un perfil declara su `tipo` ("texto", "entero",
+"decimal", "fecha", ...) y el pipeline pide aquí un parser por columna
+al comienzo de cada importación. Los parsers devuelven None para celdas
+vacías y lanzan ValorInvalido si el contenido no se puede convertir.
+"""
+
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+
+
+class ValorInvalido(ValueError):
+    pass
+
+
+def _sin_apostrofo(valor: str) -> str:
+    """Quita el apóstrofo que exportar.py antepone a '=...', '+569...', etc."""
+    if valor[:1] == "'" and valor[1:2] in ("=", "+", "-", "@"):
+        return valor[1:]
+    return valor
+
+
+def texto(valor: str):
+    valor = _sin_apostrofo(valor.strip())
+    return valor or None
+
+
+def mayusculas(valor: str):
+    valor = _sin_apostrofo(valor.strip()).upper()
+    return valor or None
+
+
+def entero(valor: str):
+    """'1.234' y '1,234' se leen como 1234 (separador de miles de Excel)."""
+    valor = valor.replace(".", "").replace(",", "").strip()
+    if not valor:
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        raise ValorInvalido(f"entero inválido '{valor}'")
+
+
+def decimal(valor: str):
+    """Formato chileno: '.' de miles y ',' decimal ('650.000,50')."""
+    valor = valor.replace(".", "").replace(",", ".").strip()
+    if not valor:
+        return None
+    try:
+        return Decimal(valor)
+    except (InvalidOperation, ValueError):
+        raise ValorInvalido(f"decimal inválido '{valor}'")
+
+
+def sexo(valor: str):
+    """'Masculino' / 'M' -> 'M', 'Femenino' / 'F' -> 'F'."""
+    inicial = valor.strip()[:1].upper()
+    return inicial if inicial in ("M", "F") else None
+
+
+# ==========================
+# Fechas
+# ==========================
+
+# (nombre, patrón, posición de año/mes/día en los grupos)
+FORMATOS_FECHA = (
+    ("DD-MM-YYYY", re.compile(r"(\d{1,2})-(\d{1,2})-(\d{4})$"), (2, 1, 0)),
+    ("YYYY-MM-DD", re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})$"), (0, 1, 2)),
+    ("DD/MM/YYYY", re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})$"), (2, 1, 0)),
+)
+
+
+class DetectorFecha:
+    """
+    Parser de fechas con detección de formato por columna.
+
+    En una columna todas las celdas suelen venir con el mismo formato: se
+    recuerda el último que funcionó y se prueba primero, así cada celda
+    cuesta un match de regex en vez de varios strptime fallidos.
+    """
+
+    def __init__(self, formatos=FORMATOS_FECHA):
+        self.formatos = list(formatos)
+        self.formato = None   # nombre del formato detectado (para informes)
+
+    def _probar(self, formato, valor):
+        nombre, patron, (a, m, d) = formato
+        coincidencia = patron.match(valor)
+        if coincidencia is None:
+            return None
+        partes = coincidencia.groups()
+        try:
+            return date(int(partes[a]), int(partes[m]), int(partes[d]))
+        except ValueError:
+            raise ValorInvalido(f"fecha inválida '{valor}'")
+
+    def __call__(self, valor: str):
+        valor = valor.strip()
+        if not valor:
+            return None
+        # Excel a veces agrega la hora: "2024-03-01 00:00:00"
+        valor = valor.split(" ", 1)[0]
+
+        for i, formato in enumerate(self.formatos):
+            fecha = self._probar(formato, valor)
+            if fecha is not None:
+                if i:
+                    # El que acertó pasa adelante para las próximas celdas
+                    self.formatos.insert(0, self.formatos.pop(i))
+                self.formato = formato[0]
+                return fecha
+        raise ValorInvalido(f"fecha con formato desconocido '{valor}'")
+
+
+# Tipos simples: la misma función sirve para todas las columnas.
+# Tipos con estado (fecha): se crea una instancia nueva por columna y corrida.
+TIPOS = {
+    "texto": texto,
+    "mayusculas": mayusculas,
+    "entero": entero,
+    "decimal": decimal,
+    "sexo": sexo,
+    "fecha": DetectorFecha,
+}
+
+
+def crear_parser(tipo):
+    """Devuelve el parser para `tipo` (nombre registrado o callable propio)."""
+    if callable(tipo) and not isinstance(tipo, type):
+        return tipo
+    fabrica = TIPOS[tipo] if isinstance(tipo, str) else tipo
+    return fabrica() if isinstance(fabrica, type) else fabrica
+
+
+# ==========================
+# Parseo de filas completas
+# ==========================
+
+class FilaParseada(NamedTuple):
+    numero: int                 # nº de fila de datos (1 = primera tras el encabezado)
+    celdas: list                # valores crudos, para guardar el rechazo tal cual venía
+    valores: dict | None
+    rechazo: tuple | None       # (motivo, detalle)
+    avisos: list                # valores opcionales inválidos que quedaron en None
+
+
+class Parseador:
+    """
+    Convierte filas crudas en dicts según las columnas del perfil y aplica
+    su `transformar`. No toca la BD, así que puede correr en otro proceso
+    (ver importacion/paralelo.py); las referencias se resuelven después.
+    """
+
+    def __init__(self, perfil, mapa: dict, contexto: dict):
+        self.perfil = perfil
+        self.contexto = contexto
+        self.columnas = [
+            (c, mapa.get(c.destino), crear_parser(c.tipo)) for c in perfil.columnas
+        ]
+
+    def formatos_fecha(self) -> dict:
+        return {
+            c.destino: parser.formato
+            for c, _, parser in self.columnas
+            if getattr(parser, "formato", None)
+        }
+
+    def parsear(self, numero: int, celdas: list) -> FilaParseada:
+        valores = {}
+        avisos = []
+        for columna, posicion, parser in self.columnas:
+            crudo = celdas[posicion] if posicion is not None and posicion < len(celdas) else ""
+            try:
+                valor = parser(crudo)
+            except ValorInvalido as e:
+                if columna.requerida:
+                    return FilaParseada(numero, celdas, None, (columna.motivo_rechazo, str(e)), avisos)
+                avisos.append(f"{columna.destino}: {e} -> se deja vacío")
+                valor = None
+            if valor is None and columna.requerida:
+                return FilaParseada(numero, celdas, None, (columna.motivo_rechazo, ""), avisos)
+            valores[columna.destino] = valor
+
+        if self.perfil.transformar:
+            motivo = self.perfil.transformar(valores, self.contexto)
+            if motivo:
+                return FilaParseada(numero, celdas, None, (motivo, ""), avisos)
+
+        return FilaParseada(numero, celdas, valores, None, avisos)
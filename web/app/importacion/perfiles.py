@@ -0,0 +1,307 @@
+# web/app/importacion/perfiles.py
+
+"""
+Perfiles de importación: qué columnas trae cada tipo de archivo, cómo se
+convierten, qué referencias hay que resolver y cómo se escribe.
+
+Para sumar un origen nuevo basta con declarar un Perfil y registrarlo:
+
+    registrar(Perfil(
+        nombre="bancos",
+        descripcion="Bancos (id;nombre)",
+        columnas=[Columna("id", ("id",), "entero", requerida=True),
+                  Columna("nombre", ("nombre",), requerida=True)],
+        escritor=Sobrescribir(Banco, "id", ["nombre"]),
+    ))
+
+y queda disponible como `flask import bancos archivo.csv`.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy import func
+
+from ..busqueda import recalcular_busqueda
+from ..config import normalizar_nombre_trabajador, texto_busqueda_trabajador
+from ..derivados import recalcular_derivados
+from ..models import Cargo, Contrato, Trabajador
+from .escritura import (
+    Actualizar,
+    ColumnaExistente,
+    Insertar,
+    InsertarNuevos,
+    Rellenar,
+    Sobrescribir,
+)
+from .staging import ALIAS_CONTRATOS
+
+
+@dataclass(frozen=True)
+class Columna:
+    """
+    Campo de la fila. `alias` son los encabezados aceptados (se comparan sin
+    tildes, mayúsculas ni puntuación: "Ap. Paterno" == "ap_paterno").
+    Una columna `requerida` vacía o inválida rechaza la fila con `motivo`.
+    """
+    destino: str
+    alias: tuple
+    tipo: object = "texto"
+    requerida: bool = False
+    motivo: str | None = None
+
+    @property
+    def motivo_rechazo(self) -> str:
+        return self.motivo or f"SIN_{self.destino.upper()}"
+
+
+@dataclass(frozen=True)
+class Referencia:
+    """Convierte el campo `origen` en `destino` (un id) usando un catálogo del Resolutor."""
+    destino: str
+    origen: str
+    catalogo: str
+    requerida: bool = True
+    motivo: str | None = None
+
+    @property
+    def motivo_rechazo(self) -> str:
+        return self.motivo or f"{self.catalogo.upper()}_NO_ENCONTRADO"
+
+
+@dataclass
+class Perfil:
+    nombre: str
+    descripcion: str
+    columnas: list
+    escritor: object
+    referencias: list = field(default_factory=list)
+    # transformar(valores, contexto) -> None, o un motivo de rechazo.
+    # Corre antes de resolver referencias y sin BD (puede ir en otro proceso).
+    transformar: Callable | None = None
+    # preparar(contexto, resolutor): valida opciones antes de leer el archivo
+    preparar: Callable | None = None
+
+
+PERFILES: dict[str, Perfil] = {}
+
+
+def registrar(perfil: Perfil) -> Perfil:
+    PERFILES[perfil.nombre] = perfil
+    return perfil
+
+
+def obtener_perfil(nombre: str) -> Perfil:
+    try:
+        return PERFILES[nombre]
+    except KeyError:
+        raise ValueError(
+            f"Perfil de importación desconocido: '{nombre}'. "
+            f"Disponibles: {', '.join(sorted(PERFILES))}"
+        )
+
+
+def _texto(destino: str, *alias) -> Columna:
+    return Columna(destino, alias or (destino,))
+
+
+def _busqueda(valores: dict):
+    """Columnas que el ORM calcula al guardar (aquí se inserta sin ORM)."""
+    nombre = (valores["rut"], valores.get("nombres"), valores.get("ap_paterno"), valores.get("ap_materno"))
+    valores["busqueda"] = texto_busqueda_trabajador(*nombre)
+    valores["carpeta_nombre"] = normalizar_nombre_trabajador(*nombre)
+
+
+# ==========================
+# Trabajadores (exportación de la BD anterior, separada por comas)
+# ==========================
+
+_RELLENABLES_TRABAJADOR = [
+    "nombres",
+    "ap_paterno",
+    "ap_materno",
+    "direccion",
+    "comuna",
+    "estado_civil",
+    "sexo",
+    "telefono",
+    "telefono_emergencia",
+    "correo",
+    "nacionalidad",
+]
+
+
+def _preparar_trabajadores(contexto, resolutor):
+    codigo = contexto.get("obra")
+    if codigo:
+        obra_id = resolutor.id("obras_codigo", codigo)
+        if obra_id is None:
+            raise ValueError(f"No existe obra con código '{codigo}'.")
+        contexto["obra_id"] = obra_id
+
+
+def _transformar_trabajadores(valores, contexto):
+    valores["estado_trabajador"] = valores["estado_trabajador"] or "VIGENTE"
+    valores["obra_id"] = contexto.get("obra_id")
+    _busqueda(valores)
+
+
+def _despues_lote_trabajadores(ids):
+    # Los existentes pudieron completar nombres: recalcular búsqueda y carpetas
+    recalcular_busqueda(ids=ids, confirmar=False)
+    recalcular_derivados(ids)
+
+
+registrar(Perfil(
+    nombre="trabajadores",
+    descripcion="Trabajadores (rut, nombres, ap_paterno, ...). Existentes: solo se rellenan campos vacíos.",
+    columnas=[
+        Columna("rut", ("rut",), requerida=True),
+        *[_texto(c) for c in _RELLENABLES_TRABAJADOR],
+        _texto("dv"),
+        _texto("estado_trabajador"),
+        Columna("fecha_nacimiento", ("fecha_nacimiento",), "fecha"),
+        # numero_cta_bancaria (CSV) → cuenta_numero (BD)
+        _texto("cuenta_numero", "numero_cta_bancaria"),
+        _texto("banco"),
+    ],
+    referencias=[
+        Referencia("banco_id", "banco", "bancos", requerida=False),
+    ],
+    preparar=_preparar_trabajadores,
+    transformar=_transformar_trabajadores,
+    escritor=Rellenar(
+        Trabajador,
+        clave="rut",
+        rellenables=_RELLENABLES_TRABAJADOR + [
+            "dv", "estado_trabajador", "fecha_nacimiento", "cuenta_numero", "banco_id",
+        ],
+        # Un trabajador nuevo necesita nombre completo y obra (--obra)
+        requeridas_nuevos=("nombres", "ap_paterno", "ap_materno", "obra_id"),
+        neutros={
+            "nombres": "",
+            "ap_paterno": "",
+            "ap_materno": "",
+            "obra_id": ColumnaExistente("obra_id"),
+        },
+        extra_set={"actualizado_en": func.now()},
+        despues_lote=_despues_lote_trabajadores,
+    ),
+))
+
+
+# ==========================
+# Trabajadores Quintero (planilla Excel, separada por ';')
+# ==========================
+
+def _transformar_trabajadores_quintero(valores, contexto):
+    for c in ("nombres", "ap_paterno", "ap_materno"):
+        valores[c] = valores[c] or ""
+    valores["estado_trabajador"] = "VIGENTE" if valores.pop("vigencia") == "SI" else "DESVINCULADO"
+    _busqueda(valores)
+
+
+registrar(Perfil(
+    nombre="trabajadores-quintero",
+    descripcion="Planilla de trabajadores de Quintero (RUT;Obra;Nombres;...). Solo crea los que no existen.",
+    columnas=[
+        Columna("rut", ("RUT",), requerida=True),
+        Columna("obra", ("Obra",), requerida=True),
+        _texto("nombres", "Nombres"),
+        _texto("ap_paterno", "Ap. Paterno"),
+        _texto("ap_materno", "Ap. Materno"),
+        Columna("fecha_nacimiento", ("Fecha Nacimiento",), "fecha"),
+        _texto("nacionalidad", "Nacionalidad"),
+        Columna("sexo", ("Sexo",), "sexo"),
+        _texto("estado_civil", "Estado Civil"),
+        _texto("direccion", "Dirección Trabajador"),
+        _texto("comuna", "Comuna Trabajador"),
+        _texto("telefono", "Fono"),
+        _texto("telefono_emergencia", "Fono Emergencia"),
+        _texto("correo", "Correo electrónico"),
+        Columna("vigencia", ("Vigencia mes",), "mayusculas"),
+    ],
+    referencias=[
+        Referencia("obra_id", "obra", "obras", motivo="OBRA_NO_ENCONTRADA"),
+    ],
+    transformar=_transformar_trabajadores_quintero,
+    escritor=InsertarNuevos(Trabajador, clave="rut"),
+))
+
+
+# ==========================
+# Contratos Quintero
+# ==========================
+
+def _alias(canonica: str) -> tuple:
+    return tuple(ALIAS_CONTRATOS[canonica])
+
+
+def _transformar_contratos(valores, contexto):
+    valores["estado_contrato"] = valores["estado_contrato"] or "VIGENTE"
+
+
+registrar(Perfil(
+    nombre="contratos-quintero",
+    descripcion="Contratos (RUT;OBRA;EMPLEADOR;CARGO;TIPO_CONTRATO;...). Se resuelven por RUT y por nombre.",
+    columnas=[
+        Columna("rut", _alias("RUT"), requerida=True),
+        _texto("obra", *_alias("OBRA")),
+        _texto("empleador", *_alias("EMPLEADOR")),
+        _texto("cargo", *_alias("CARGO")),
+        Columna("tipo_contrato", _alias("TIPO_CONTRATO"), requerida=True),
+        Columna("fecha_inicio", _alias("FECHA_INICIO"), "fecha"),
+        Columna("fecha_termino", _alias("FECHA_TERMINO"), "fecha"),
+        _texto("jornada", *_alias("JORNADA")),
+        Columna("horas_semanales", _alias("HORAS_SEMANALES"), "entero"),
+        Columna("sueldo_base", _alias("SUELDO_BASE"), "decimal"),
+        Columna("asignacion_movilizacion", _alias("ASIG_MOVILIZACION"), "decimal"),
+        Columna("asignacion_colacion", _alias("ASIG_COLACION"), "decimal"),
+        Columna("asignacion_herramientas", _alias("ASIG_HERRAMIENTAS"), "decimal"),
+        Columna("estado_contrato", _alias("ESTADO_CONTRATO"), "mayusculas"),
+        _texto("causal_termino", *_alias("CAUSAL_TERMINO")),
+        Columna("fecha_finiquito", _alias("FECHA_FINIQUITO"), "fecha"),
+    ],
+    referencias=[
+        Referencia("trabajador_id", "rut", "trabajadores", motivo="TRABAJADOR_NO_ENCONTRADO"),
+        Referencia("obra_id", "obra", "obras", motivo="OBRA_NO_ENCONTRADA"),
+        Referencia("empleador_id", "empleador", "empleadores", motivo="EMPLEADOR_NO_ENCONTRADO"),
+        Referencia("cargo_id", "cargo", "cargos", motivo="CARGO_NO_ENCONTRADO"),
+    ],
+    transformar=_transformar_contratos,
+    escritor=Insertar(
+        Contrato,
+        # INSERT sin ORM: no corren los eventos de Contrato
+        despues_lote=lambda valores: recalcular_derivados({v["trabajador_id"] for v in valores}),
+    ),
+))
+
+
+# ==========================
+# Cargos
+# ==========================
+
+registrar(Perfil(
+    nombre="cargos",
+    descripcion="Tabla de cargos (id,nombre). Crea o actualiza por id.",
+    columnas=[
+        Columna("id", ("id",), "entero", requerida=True),
+        Columna("nombre", ("nombre",), requerida=True),
+    ],
+    escritor=Sobrescribir(Cargo, clave="id", columnas=["nombre"]),
+))
+
+
+registrar(Perfil(
+    nombre="cargos-trabajadores",
+    descripcion="Asigna el cargo actual a trabajadores existentes (rut,cargo).",
+    columnas=[
+        Columna("rut", ("rut",), requerida=True),
+        Columna("cargo", ("cargo", "cargo_nombre"), requerida=True),
+    ],
+    referencias=[
+        Referencia("id", "rut", "trabajadores", motivo="TRABAJADOR_NO_ENCONTRADO"),
+        Referencia("cargo_id", "cargo", "cargos", motivo="CARGO_NO_ENCONTRADO"),
+    ],
+    escritor=Actualizar(Trabajador, clave="id", columnas=["cargo_id"]),
+))
@@ -0,0 +1,341 @@
+# web/app/importacion/pipeline.py
+
+"""
+Pipeline único de importación:
+
+    lectura -> mapeo de columnas -> parseo/validación -> resolución -> escritura por lotes
+
+Todo en streaming: se lee el archivo fila a fila y se escribe de a
+`tamano_lote` filas, con un commit por lote. Los rechazos quedan en la
+tabla import_rechazos con su motivo (igual que la carga vía COPY).
+
+Cada corrida es un ImportJob: junto con cada lote se confirma la última
+fila escrita, y reanudar() sigue desde ahí si la carga se cortó.
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+
+from ..config import normalizar_texto_busqueda
+from ..extensions import db
+from ..models import ImportJob, ImportRechazo
+from .escritura import TAMANO_LOTE, en_lotes
+from .lectura import inspeccionar
+from .paralelo import ParseoParalelo, crear_parseo
+from .perfiles import obtener_perfil
+from .resolucion import Resolutor
+
+
+# Avisos por fila que se muestran como máximo (el resto solo se cuenta)
+MAX_AVISOS = 50
+
+
+@dataclass
+class ResultadoImportacion:
+    perfil: str
+    lote: str
+    archivo: object = None
+    filas: int = 0
+    nuevos: int = 0
+    actualizados: int = 0
+    rechazados: int = 0
+    motivos: Counter = field(default_factory=Counter)
+    no_encontrados: Counter = field(default_factory=Counter)
+    formatos_fecha: dict = field(default_factory=dict)
+    segundos: float = 0.0
+
+
+def _clave_encabezado(texto: str) -> str:
+    return normalizar_texto_busqueda(texto)
+
+
+def mapear_columnas(perfil, encabezados: list[str]) -> dict:
+    """
+    destino -> posición en la fila. Falla si falta una columna requerida;
+    las opcionales ausentes simplemente no se leen.
+    """
+    posiciones = {}
+    for i, encabezado in enumerate(encabezados):
+        posiciones.setdefault(_clave_encabezado(encabezado), i)
+
+    mapa = {}
+    faltantes = []
+    for columna in perfil.columnas:
+        posicion = next(
+            (posiciones[k] for k in map(_clave_encabezado, columna.alias) if k in posiciones),
+            None,
+        )
+        if posicion is not None:
+            mapa[columna.destino] = posicion
+        elif columna.requerida:
+            faltantes.append(columna.alias[0])
+
+    if faltantes:
+        raise ValueError(
+            f"El archivo no trae columnas requeridas por el perfil '{perfil.nombre}': "
+            f"{', '.join(faltantes)}"
+        )
+    return mapa
+
+
+def resolver_referencias(perfil, resolutor, valores: dict):
+    """Completa los *_id del perfil. Devuelve (motivo, detalle) si falta una requerida."""
+    for ref in perfil.referencias:
+        origen = valores.get(ref.origen)
+        id_ = resolutor.id(ref.catalogo, origen) if origen else None
+        if id_ is None and ref.requerida:
+            return ref.motivo_rechazo, f"'{origen or ''}'"
+        valores[ref.destino] = id_
+    return None
+
+
+def hash_archivo(ruta: str) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def buscar_job(id_o_prefijo: str) -> ImportJob:
+    """Acepta el id completo o un prefijo que lo identifique sin ambigüedad."""
+    job = db.session.get(ImportJob, id_o_prefijo)
+    if job is not None:
+        return job
+    candidatos = ImportJob.query.filter(ImportJob.id.startswith(id_o_prefijo)).limit(2).all()
+    if len(candidatos) != 1:
+        raise ValueError(f"No encontré un único job de importación '{id_o_prefijo}'.")
+    return candidatos[0]
+
+
+def importar(
+    nombre_perfil: str,
+    ruta: str,
+    tamano_lote: int = TAMANO_LOTE,
+    codificacion: str | None = None,
+    delimitador: str | None = None,
+    contexto: dict | None = None,
+    guardar_rechazos: bool = True,
+    procesos: int = 1,
+    log=print,
+) -> ResultadoImportacion:
+    """
+    Importa `ruta` con el perfil `nombre_perfil`. `contexto` lleva las
+    opciones propias del perfil (p. ej. {"obra": "Q-001"}).
+    Con `procesos` > 1 (0 = todos los núcleos) el parseo de archivos
+    grandes se reparte en un pool de procesos; la escritura sigue
+    siendo de un solo hilo.
+
+    La corrida queda registrada como ImportJob; si falla, se retoma con
+    reanudar(job_id) desde el último lote confirmado.
+    """
+    obtener_perfil(nombre_perfil)
+    origen = inspeccionar(ruta, codificacion=codificacion, delimitador=delimitador)
+
+    job = ImportJob(
+        id=str(uuid.uuid4()),
+        perfil=nombre_perfil,
+        archivo=ruta,
+        archivo_sha256=hash_archivo(ruta),
+        opciones=json.dumps({
+            "tamano_lote": tamano_lote,
+            "codificacion": origen.codificacion,
+            "delimitador": origen.delimitador,
+            "contexto": contexto or {},
+            "guardar_rechazos": guardar_rechazos,
+        }),
+        estado="EN_CURSO",
+    )
+    db.session.add(job)
+    db.session.commit()
+    log(f"🆔 Job de importación: {job.id}")
+
+    return _ejecutar(job, procesos, log)
+
+
+def reanudar(id_job: str, perfil: str | None = None, ruta: str | None = None,
+             procesos: int = 1, log=print) -> ResultadoImportacion:
+    """
+    Retoma un job FALLIDO o interrumpido después de su última fila
+    confirmada. `ruta` permite apuntar al archivo si cambió de lugar;
+    en cualquier caso el contenido debe ser el mismo (SHA-256).
+    """
+    job = buscar_job(id_job)
+    if job.estado == "COMPLETADO":
+        raise ValueError(f"El job {job.id} ya está completado.")
+    if perfil and perfil != job.perfil:
+        raise ValueError(f"El job {job.id} es del perfil '{job.perfil}', no '{perfil}'.")
+
+    ruta = ruta or job.archivo
+    if hash_archivo(ruta) != job.archivo_sha256:
+        raise ValueError(
+            f"El archivo {ruta} no es el mismo que se usó en el job {job.id} "
+            f"(el SHA-256 no coincide). Inicia una importación nueva."
+        )
+
+    job.archivo = ruta
+    job.estado = "EN_CURSO"
+    job.error = None
+    db.session.commit()
+    log(f"↻ Reanudando job {job.id} después de la fila {job.ultima_fila}")
+
+    return _ejecutar(job, procesos, log)
+
+
+def _ejecutar(job: ImportJob, procesos: int, log) -> ResultadoImportacion:
+    opciones = json.loads(job.opciones or "{}")
+    tamano_lote = opciones.get("tamano_lote", TAMANO_LOTE)
+    guardar_rechazos = opciones.get("guardar_rechazos", True)
+    id_job, ruta, desde_fila = job.id, job.archivo, job.ultima_fila
+
+    perfil = obtener_perfil(job.perfil)
+    contexto = dict(opciones.get("contexto") or {})
+    inicio = time.perf_counter()
+
+    resolutor = Resolutor()
+    if perfil.preparar:
+        perfil.preparar(contexto, resolutor)
+
+    origen = inspeccionar(
+        ruta, codificacion=opciones.get("codificacion"), delimitador=opciones.get("delimitador"),
+    )
+    mapa = mapear_columnas(perfil, origen.encabezados)
+    log(
+        f"📄 {ruta} · codificación {origen.codificacion} · separador '{origen.delimitador}' · "
+        f"{len(mapa)}/{len(perfil.columnas)} columnas reconocidas"
+    )
+
+    # Los contadores siguen desde donde quedó el job
+    resultado = ResultadoImportacion(
+        perfil=perfil.nombre,
+        lote=id_job,
+        archivo=origen,
+        filas=job.filas,
+        nuevos=job.nuevos,
+        actualizados=job.actualizados,
+        rechazados=job.rechazados,
+    )
+    avisos = 0
+
+    def avisar(numero, mensaje):
+        nonlocal avisos
+        avisos += 1
+        if avisos <= MAX_AVISOS:
+            log(f"⚠ Fila {numero}: {mensaje}")
+
+    tabla_jobs = ImportJob.__table__
+    parseo = crear_parseo(perfil, origen, mapa, contexto, procesos, desde_fila=desde_fila)
+    if isinstance(parseo, ParseoParalelo):
+        log(f"⚙ Parseo en {parseo.procesos} procesos · {len(parseo.trozos)} trozos")
+
+    try:
+        for n_lote, lote in enumerate(en_lotes(parseo, tamano_lote), start=1):
+            t_lote = time.perf_counter()
+            validas = []
+            rechazos = []
+
+            for fila in lote:
+                for aviso in fila.avisos:
+                    avisar(fila.numero, aviso)
+                rechazo = fila.rechazo or resolver_referencias(perfil, resolutor, fila.valores)
+                if rechazo:
+                    rechazos.append((fila.numero, *rechazo))
+                else:
+                    validas.append((fila.numero, fila.valores))
+
+            escrito = perfil.escritor.escribir(validas)
+            rechazos.extend(escrito.rechazos)
+
+            if rechazos:
+                celdas_por_fila = {fila.numero: fila.celdas for fila in lote}
+                for numero, motivo, detalle in rechazos:
+                    avisar(numero, f"{motivo} {detalle}".rstrip())
+                if guardar_rechazos:
+                    db.session.execute(
+                        ImportRechazo.__table__.insert(),
+                        [
+                            {
+                                "lote": id_job,
+                                "archivo": ruta,
+                                "fila": numero,
+                                "motivo": motivo,
+                                "datos": json.dumps(
+                                    dict(zip(origen.encabezados, celdas_por_fila[numero])),
+                                    ensure_ascii=False,
+                                ),
+                            }
+                            for numero, motivo, _ in rechazos
+                        ],
+                    )
+
+            # Punto de control en la MISMA transacción que los datos del lote
+            db.session.execute(
+                tabla_jobs.update()
+                .where(tabla_jobs.c.id == id_job)
+                .values(
+                    ultima_fila=lote[-1].numero,
+                    filas=tabla_jobs.c.filas + len(lote),
+                    nuevos=tabla_jobs.c.nuevos + escrito.nuevos,
+                    actualizados=tabla_jobs.c.actualizados + escrito.actualizados,
+                    rechazados=tabla_jobs.c.rechazados + len(rechazos),
+                )
+            )
+            db.session.commit()
+
+            resultado.filas += len(lote)
+            resultado.nuevos += escrito.nuevos
+            resultado.actualizados += escrito.actualizados
+            resultado.rechazados += len(rechazos)
+            resultado.motivos.update(motivo for _, motivo, _ in rechazos)
+
+            log(
+                f" - Lote {n_lote}: filas {lote[0].numero}-{lote[-1].numero} · nuevos {escrito.nuevos} · "
+                f"actualizados {escrito.actualizados} · rechazados {len(rechazos)} · "
+                f"{time.perf_counter() - t_lote:.2f}s"
+            )
+    except BaseException as e:
+        db.session.rollback()
+        db.session.execute(
+            tabla_jobs.update()
+            .where(tabla_jobs.c.id == id_job)
+            .values(estado="FALLIDO", error=f"{type(e).__name__}: {e}"[:2000])
+        )
+        db.session.commit()
+        log(f"❌ Job {id_job} detenido. Para continuar: flask import --resume {id_job[:8]}")
+        raise
+
+    db.session.execute(
+        tabla_jobs.update().where(tabla_jobs.c.id == id_job).values(estado="COMPLETADO")
+    )
+    db.session.commit()
+
+    if avisos > MAX_AVISOS:
+        log(f"… {avisos - MAX_AVISOS} aviso(s) más sin mostrar.")
+
+    resultado.no_encontrados = resolutor.no_encontrados
+    resultado.formatos_fecha = parseo.formatos_fecha()
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def informar(resultado: ResultadoImportacion, log=print):
+    """Resumen final, en el mismo formato para todos los perfiles."""
+    for (catalogo, valor), veces in resultado.no_encontrados.most_common(20):
+        log(f"⚠ No encontrado en {catalogo}: '{valor}' ({veces} fila(s))")
+    for columna, formato in resultado.formatos_fecha.items():
+        log(f"📅 {columna}: formato {formato}")
+
+    log("========================================")
+    log(f"✔ Nuevos                 : {resultado.nuevos}")
+    log(f"✔ Actualizados           : {resultado.actualizados}")
+    log(f"⚠ Rechazados             : {resultado.rechazados}")
+    for motivo, veces in resultado.motivos.most_common():
+        log(f"   - {motivo:<26}: {veces}")
+    log(f"📄 Filas procesadas      : {resultado.filas}")
+    log(f"🆔 Job / lote de rechazos : {resultado.lote}")
+    log(f"⏱  Tiempo                : {resultado.segundos:.2f}s")
+    log("========================================")
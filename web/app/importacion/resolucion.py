@@ -0,0 +1,96 @@
+# web/app/importacion/resolucion.py
+
+"""
+Resolución de datos de referencia (nombre de obra -> obra_id, RUT ->
+trabajador_id, ...) compartida por todos los perfiles de importación.
+
+Cada catálogo se carga completo con UNA consulta la primera vez que se
+usa y después se resuelve en memoria. Los valores que no se encontraron
+se cuentan para el resumen final en vez de repetir el aviso por fila.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+
+from ..extensions import db
+from ..models import Banco, Cargo, Empleador, Obra, Trabajador
+
+
+def normalizar_clave(valor) -> str:
+    """Mismo criterio que usaban los importadores: minúsculas y espacios colapsados."""
+    if not valor:
+        return ""
+    return " ".join(str(valor).strip().lower().split())
+
+
+def clave_exacta(valor) -> str:
+    return (valor or "").strip()
+
+
+@dataclass(frozen=True)
+class Catalogo:
+    columna_clave: object          # columna por la que se busca
+    columnas: tuple                # columnas que se devuelven (la primera es el id)
+    normalizar: object = normalizar_clave
+
+
+CATALOGOS = {
+    "obras": Catalogo(Obra.nombre, (Obra.id,)),
+    "obras_codigo": Catalogo(Obra.codigo, (Obra.id,), clave_exacta),
+    "empleadores": Catalogo(Empleador.razon_social, (Empleador.id,)),
+    "cargos": Catalogo(Cargo.nombre, (Cargo.id,)),
+    "bancos": Catalogo(Banco.nombre, (Banco.id,)),
+    "trabajadores": Catalogo(Trabajador.rut, (Trabajador.id, Trabajador.obra_id), clave_exacta),
+}
+
+
+class Resolutor:
+    """
+    Caché de catálogos para una corrida de importación.
+
+        resolutor = Resolutor()
+        resolutor.id("obras", "Obra Quintero")      -> 3 / None
+        resolutor.fila("trabajadores", "12345678-9") -> (id, obra_id) / None
+    """
+
+    def __init__(self, catalogos=None):
+        self.catalogos = catalogos or CATALOGOS
+        self._datos = {}
+        self.no_encontrados = Counter()   # (catálogo, valor) -> veces
+
+    def _cargar(self, nombre: str) -> dict:
+        datos = self._datos.get(nombre)
+        if datos is None:
+            catalogo = self.catalogos[nombre]
+            datos = {}
+            filas = db.session.query(catalogo.columna_clave, *catalogo.columnas)
+            # Con claves repetidas gana el id más alto (el registro más nuevo)
+            for clave, *valores in filas.order_by(catalogo.columnas[0]):
+                datos[catalogo.normalizar(clave)] = tuple(valores)
+            self._datos[nombre] = datos
+        return datos
+
+    def fila(self, nombre: str, valor):
+        clave = self.catalogos[nombre].normalizar(valor)
+        if not clave:
+            return None
+        encontrado = self._cargar(nombre).get(clave)
+        if encontrado is None:
+            self.no_encontrados[(nombre, clave_exacta(valor))] += 1
+        return encontrado
+
+    def id(self, nombre: str, valor):
+        encontrado = self.fila(nombre, valor)
+        return encontrado[0] if encontrado else None
+
+    def contiene(self, nombre: str, valor) -> bool:
+        """Como fila(), pero sin contar el valor como no encontrado."""
+        clave = self.catalogos[nombre].normalizar(valor)
+        return bool(clave) and clave in self._cargar(nombre)
+
+    def agregar(self, nombre: str, valor, *valores):
+        """Registra un valor recién insertado (p. ej. trabajadores creados en un lote anterior)."""
+        self._cargar(nombre)[self.catalogos[nombre].normalizar(valor)] = tuple(valores)
+
+    def tamano(self, nombre: str) -> int:
+        return len(self._cargar(nombre))
@@ -0,0 +1,339 @@
+# web/app/importacion/staging.py
+
+"""
+Importación de contratos vía tabla de staging (solo PostgreSQL).
+
+En vez de validar e insertar fila por fila desde Python:
+
+1) COPY del CSV crudo a una tabla temporal (todo texto).
+2) Resolución de trabajador / obra / empleador / cargo con JOINs sobre
+   nombres normalizados (mismo criterio que _norm del importador).
+3) Las filas con problemas se guardan en `import_rechazos` con un código
+   de motivo (y opcionalmente en un CSV).
+4) Los contratos válidos se insertan con un único INSERT ... SELECT.
+
+Codificación y separador se detectan como en el pipeline (inspeccionar).
+Una fecha, entero o monto opcional que no se puede leer queda NULL, como
+en el pipeline ("se deja vacío"), pero la fila se anota en
+`import_rechazos` con motivo AVISO_VALOR_INVALIDO y las columnas afectadas.
+"""
+
+import uuid
+
+from sqlalchemy import text
+
+from ..derivados import recalcular_derivados
+from ..extensions import db
+from .lectura import inspeccionar
+
+
+# Columna canónica -> nombres aceptados en el encabezado del CSV
+ALIAS_CONTRATOS = {
+    "RUT": ["RUT"],
+    "OBRA": ["OBRA", "Obra"],
+    "EMPLEADOR": ["EMPLEADOR", "Empleador"],
+    "CARGO": ["CARGO", "Cargo"],
+    "TIPO_CONTRATO": ["TIPO_CONTRATO", "Tipo Contrato"],
+    "FECHA_INICIO": ["FECHA_INICIO", "Fecha Inicio"],
+    "FECHA_TERMINO": ["FECHA_TERMINO", "Fecha Término"],
+    "JORNADA": ["JORNADA", "Jornada"],
+    "HORAS_SEMANALES": ["HORAS_SEMANALES", "Horas Semanales"],
+    "SUELDO_BASE": ["SUELDO_BASE", "Sueldo Base"],
+    "ASIG_MOVILIZACION": ["ASIG_MOVILIZACION", "Asignación Movilización"],
+    "ASIG_COLACION": ["ASIG_COLACION", "Asignación Colación"],
+    "ASIG_HERRAMIENTAS": ["ASIG_HERRAMIENTAS", "Asignación Herramientas"],
+    "ESTADO_CONTRATO": ["ESTADO_CONTRATO", "Estado Contrato"],
+    "CAUSAL_TERMINO": ["CAUSAL_TERMINO", "Causal Término"],
+    "FECHA_FINIQUITO": ["FECHA_FINIQUITO", "Fecha Finiquito"],
+}
+
+# Columnas que se parsean: canónica -> función (NULL si el valor no es válido)
+PARSEADAS = {
+    "FECHA_INICIO": "imp_fecha",
+    "FECHA_TERMINO": "imp_fecha",
+    "HORAS_SEMANALES": "imp_entero",
+    "SUELDO_BASE": "imp_decimal",
+    "ASIG_MOVILIZACION": "imp_decimal",
+    "ASIG_COLACION": "imp_decimal",
+    "ASIG_HERRAMIENTAS": "imp_decimal",
+    "FECHA_FINIQUITO": "imp_fecha",
+}
+
+AVISO_VALOR_INVALIDO = "AVISO_VALOR_INVALIDO"
+
+# Funciones de parseo equivalentes a _parse_date/_parse_int/_parse_decimal:
+# devuelven NULL en vez de fallar si el valor no es válido.
+_FUNCIONES_PARSEO = [
+    r"""
+    CREATE OR REPLACE FUNCTION pg_temp.imp_fecha(valor text) RETURNS date
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE v text := trim(coalesce(valor, ''));
+    BEGIN
+        IF v ~ '^\d{1,2}-\d{1,2}-\d{4}$' THEN
+            RETURN to_date(v, 'DD-MM-YYYY');
+        ELSIF v ~ '^\d{4}-\d{1,2}-\d{1,2}$' THEN
+            RETURN to_date(v, 'YYYY-MM-DD');
+        END IF;
+        RETURN NULL;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END $$
+    """,
+    r"""
+    CREATE OR REPLACE FUNCTION pg_temp.imp_entero(valor text) RETURNS integer
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE v text := regexp_replace(trim(coalesce(valor, '')), '[.,]', '', 'g');
+    BEGIN
+        IF v ~ '^-?\d+$' THEN
+            RETURN v::integer;
+        END IF;
+        RETURN NULL;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END $$
+    """,
+    r"""
+    CREATE OR REPLACE FUNCTION pg_temp.imp_decimal(valor text) RETURNS numeric
+    LANGUAGE plpgsql IMMUTABLE AS $$
+    DECLARE v text := replace(replace(trim(coalesce(valor, '')), '.', ''), ',', '.');
+    BEGIN
+        IF v = '' THEN
+            RETURN NULL;
+        END IF;
+        RETURN v::numeric;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END $$
+    """,
+    r"""
+    CREATE OR REPLACE FUNCTION pg_temp.imp_norm(valor text) RETURNS text
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT lower(regexp_replace(trim(coalesce(valor, '')), '\s+', ' ', 'g'))
+    $$
+    """,
+]
+
+
+def _literal(texto: str) -> str:
+    return "'" + texto.replace("'", "''") + "'"
+
+
+def _etiquetas(encabezado: list[str]) -> list[str]:
+    """Nombre de cada columna en los rechazos: las vacías o repetidas se numeran."""
+    etiquetas, vistas = [], set()
+    for i, nombre in enumerate(encabezado, start=1):
+        etiqueta = nombre or f"COLUMNA_{i}"
+        if etiqueta in vistas:
+            etiqueta = f"{etiqueta}_{i}"
+        vistas.add(etiqueta)
+        etiquetas.append(etiqueta)
+    return etiquetas
+
+
+def importar_contratos_copy(
+    csv_path: str,
+    rechazos_csv: str | None = None,
+    delimitador: str | None = None,
+    codificacion: str | None = None,
+    log=print,
+) -> dict:
+    """
+    Importa contratos desde `csv_path` usando COPY + SQL set-based.
+    Todo ocurre en una transacción: o entran todos los válidos, o nada.
+
+    Devuelve un resumen {"lote", "filas", "creados", "rechazados", "avisos", "motivos"}.
+    """
+    if db.engine.dialect.name != "postgresql":
+        raise RuntimeError("El modo COPY requiere PostgreSQL.")
+
+    origen = inspeccionar(csv_path, codificacion=codificacion, delimitador=delimitador)
+    encabezado = origen.encabezados
+    if not encabezado:
+        raise ValueError(f"El archivo {csv_path} está vacío.")
+
+    # Columna física en staging: c0, c1, ... por posición en el archivo (los
+    # encabezados pueden repetirse o venir vacíos); cada alias toma la primera
+    fisicas = [f"c{i}" for i in range(len(encabezado))]
+    posicion = {}
+    for i, nombre in enumerate(encabezado):
+        posicion.setdefault(nombre, i)
+    columnas = {}
+    for canonica, alias in ALIAS_CONTRATOS.items():
+        columnas[canonica] = next(
+            (f"s.{fisicas[posicion[a]]}" for a in alias if a in posicion),
+            "NULL::text",
+        )
+    etiquetas = list(zip(_etiquetas(encabezado), fisicas))
+
+    lote = str(uuid.uuid4())
+    conexion = db.session.connection()
+    cursor = conexion.connection.dbapi_connection.cursor()
+
+    for funcion in _FUNCIONES_PARSEO:
+        conexion.execute(text(funcion))
+
+    # ---------- 1) COPY a staging ----------
+    columnas_stg = ", ".join(f"{fisica} text" for fisica in fisicas)
+    conexion.execute(text(
+        f"CREATE TEMP TABLE stg_contratos (fila bigserial, {columnas_stg}) ON COMMIT DROP"
+    ))
+    with open(csv_path, newline="", encoding=origen.codificacion) as f:
+        cursor.copy_expert(
+            f"COPY stg_contratos ({', '.join(fisicas)}) FROM STDIN "
+            f"WITH (FORMAT csv, DELIMITER {_literal(origen.delimitador)}, HEADER true)",
+            f,
+        )
+
+    filas = conexion.execute(text("SELECT count(*) FROM stg_contratos")).scalar()
+    log(f"📥 {filas} filas copiadas a staging.")
+
+    # ---------- 2) Resolución set-based ----------
+    c = columnas
+    # Columnas con valor que no se pudo leer (quedan NULL): 'FECHA_INICIO, SUELDO_BASE'
+    invalidos = ", ".join(
+        f"CASE WHEN nullif(trim({c[canonica]}), '') IS NOT NULL "
+        f"AND pg_temp.{funcion}({c[canonica]}) IS NULL THEN {_literal(canonica)} END"
+        for canonica, funcion in PARSEADAS.items()
+    )
+    conexion.execute(text(f"""
+        CREATE TEMP TABLE stg_resuelto ON COMMIT DROP AS
+        WITH obras_n AS (
+            SELECT DISTINCT ON (pg_temp.imp_norm(nombre)) pg_temp.imp_norm(nombre) AS k, id
+            FROM obras ORDER BY pg_temp.imp_norm(nombre), id DESC
+        ),
+        empleadores_n AS (
+            SELECT DISTINCT ON (pg_temp.imp_norm(razon_social)) pg_temp.imp_norm(razon_social) AS k, id
+            FROM empleadores ORDER BY pg_temp.imp_norm(razon_social), id DESC
+        ),
+        cargos_n AS (
+            SELECT DISTINCT ON (pg_temp.imp_norm(nombre)) pg_temp.imp_norm(nombre) AS k, id
+            FROM cargos ORDER BY pg_temp.imp_norm(nombre), id DESC
+        ),
+        base AS (
+            SELECT
+                s.fila,
+                trim(coalesce({c["RUT"]}, '')) AS rut,
+                pg_temp.imp_norm({c["OBRA"]}) AS obra_k,
+                pg_temp.imp_norm({c["EMPLEADOR"]}) AS empleador_k,
+                pg_temp.imp_norm({c["CARGO"]}) AS cargo_k,
+                trim(coalesce({c["TIPO_CONTRATO"]}, '')) AS tipo_contrato,
+                pg_temp.imp_fecha({c["FECHA_INICIO"]}) AS fecha_inicio,
+                pg_temp.imp_fecha({c["FECHA_TERMINO"]}) AS fecha_termino,
+                trim(coalesce({c["JORNADA"]}, '')) AS jornada,
+                pg_temp.imp_entero({c["HORAS_SEMANALES"]}) AS horas_semanales,
+                pg_temp.imp_decimal({c["SUELDO_BASE"]}) AS sueldo_base,
+                pg_temp.imp_decimal({c["ASIG_MOVILIZACION"]}) AS asignacion_movilizacion,
+                pg_temp.imp_decimal({c["ASIG_COLACION"]}) AS asignacion_colacion,
+                pg_temp.imp_decimal({c["ASIG_HERRAMIENTAS"]}) AS asignacion_herramientas,
+                coalesce(nullif(upper(trim(coalesce({c["ESTADO_CONTRATO"]}, ''))), ''), 'VIGENTE') AS estado_contrato,
+                nullif(trim(coalesce({c["CAUSAL_TERMINO"]}, '')), '') AS causal_termino,
+                pg_temp.imp_fecha({c["FECHA_FINIQUITO"]}) AS fecha_finiquito,
+                nullif(concat_ws(', ', {invalidos}), '') AS invalidos
+            FROM stg_contratos s
+        )
+        SELECT
+            b.*,
+            t.id AS trabajador_id,
+            o.id AS obra_id,
+            e.id AS empleador_id,
+            g.id AS cargo_id,
+            CASE
+                WHEN b.rut = '' THEN 'SIN_RUT'
+                WHEN t.id IS NULL THEN 'TRABAJADOR_NO_ENCONTRADO'
+                WHEN o.id IS NULL THEN 'OBRA_NO_ENCONTRADA'
+                WHEN e.id IS NULL THEN 'EMPLEADOR_NO_ENCONTRADO'
+                WHEN g.id IS NULL THEN 'CARGO_NO_ENCONTRADO'
+                WHEN b.tipo_contrato = '' THEN 'SIN_TIPO_CONTRATO'
+            END AS motivo
+        FROM base b
+        LEFT JOIN trabajadores t ON t.rut = b.rut
+        LEFT JOIN obras_n o ON o.k = b.obra_k
+        LEFT JOIN empleadores_n e ON e.k = b.empleador_k
+        LEFT JOIN cargos_n g ON g.k = b.cargo_k
+    """))
+
+    # ---------- 3) Rechazos ----------
+    datos_json = ", ".join(
+        f"{_literal(etiqueta)}, s.{fisica}" for etiqueta, fisica in etiquetas
+    )
+    rechazados = conexion.execute(
+        text(f"""
+            INSERT INTO import_rechazos (lote, archivo, fila, motivo, datos, creado_en)
+            SELECT :lote, :archivo, r.fila, r.motivo, json_build_object({datos_json})::text, now()
+            FROM stg_resuelto r
+            JOIN stg_contratos s ON s.fila = r.fila
+            WHERE r.motivo IS NOT NULL
+        """),
+        {"lote": lote, "archivo": csv_path},
+    ).rowcount
+
+    # Importadas con algún valor ilegible: consultables junto a los rechazos
+    avisos = conexion.execute(
+        text(f"""
+            INSERT INTO import_rechazos (lote, archivo, fila, motivo, datos, creado_en)
+            SELECT :lote, :archivo, r.fila, :motivo,
+                   json_build_object('_invalidos', r.invalidos, {datos_json})::text, now()
+            FROM stg_resuelto r
+            JOIN stg_contratos s ON s.fila = r.fila
+            WHERE r.motivo IS NULL AND r.invalidos IS NOT NULL
+        """),
+        {"lote": lote, "archivo": csv_path, "motivo": AVISO_VALOR_INVALIDO},
+    ).rowcount
+    if avisos:
+        log(f"⚠ {avisos} fila(s) con fechas o montos ilegibles que quedaron vacíos "
+            f"(import_rechazos, motivo {AVISO_VALOR_INVALIDO}).")
+
+    motivos = dict(conexion.execute(text(
+        "SELECT motivo, count(*) FROM stg_resuelto WHERE motivo IS NOT NULL "
+        "GROUP BY motivo ORDER BY count(*) DESC"
+    )).all())
+
+    if rechazos_csv and rechazados:
+        columnas_orig = ", ".join(
+            f"s.{fisica} AS \"{etiqueta.replace(chr(34), '')}\"" for etiqueta, fisica in etiquetas
+        )
+        with open(rechazos_csv, "w", newline="", encoding="utf-8-sig") as f:
+            cursor.copy_expert(
+                f"COPY (SELECT r.fila AS \"FILA\", r.motivo AS \"MOTIVO\", {columnas_orig} "
+                f"FROM stg_resuelto r JOIN stg_contratos s ON s.fila = r.fila "
+                f"WHERE r.motivo IS NOT NULL ORDER BY r.fila) "
+                f"TO STDOUT WITH (FORMAT csv, DELIMITER {_literal(origen.delimitador)}, HEADER true)",
+                f,
+            )
+
+    # ---------- 4) Inserción de válidos ----------
+    creados = conexion.execute(text("""
+        INSERT INTO contratos (
+            trabajador_id, empleador_id, obra_id, cargo_id,
+            tipo_contrato, fecha_inicio, fecha_termino,
+            jornada, horas_semanales,
+            sueldo_base, asignacion_movilizacion, asignacion_colacion, asignacion_herramientas,
+            estado_contrato, causal_termino, fecha_finiquito, creado_en
+        )
+        SELECT
+            trabajador_id, empleador_id, obra_id, cargo_id,
+            tipo_contrato, fecha_inicio, fecha_termino,
+            jornada, horas_semanales,
+            sueldo_base, asignacion_movilizacion, asignacion_colacion, asignacion_herramientas,
+            estado_contrato, causal_termino, fecha_finiquito, now()
+        FROM stg_resuelto
+        WHERE motivo IS NULL
+        ORDER BY fila
+    """)).rowcount
+
+    trabajadores = conexion.execute(text(
+        "SELECT DISTINCT trabajador_id FROM stg_resuelto WHERE motivo IS NULL"
+    )).scalars().all()
+    recalcular_derivados(trabajadores, conexion=conexion)
+
+    cursor.close()
+    db.session.commit()
+
+    return {
+        "lote": lote,
+        "filas": filas,
+        "creados": creados,
+        "rechazados": rechazados,
+        "avisos": avisos,
+        "motivos": motivos,
+    }
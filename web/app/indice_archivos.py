@@ -0,0 +1,363 @@
+# web/app/indice_archivos.py
+
+"""
+Índice del árbol de documentos sincronizado con Nextcloud (NEXTCLOUD_ROOT)
+y conciliación contra DocumentoLaboral.
+
+- `archivos_indexados` guarda (ruta, tamaño, mtime, inodo) de cada archivo.
+- `directorios_indexados` guarda el mtime de cada carpeta.
+
+Crear, borrar o renombrar un archivo cambia el mtime de SU carpeta, así
+que en cada corrida solo se vuelven a listar las carpetas cuyo mtime
+cambió; para las demás basta un stat() de la carpeta. Un archivo
+sobrescrito en el mismo lugar no cambia el mtime de la carpeta: para
+refrescar tamaños y fechas de todo, usar `--completo`.
+
+Las rutas se guardan en el formato lógico de DocumentoLaboral
+("DOCUMENTACION LABORAL/EMPLEADORES/.../CONTRATOS/archivo.pdf"), así la
+conciliación es un JOIN por índices en vez de recalcular rutas.
+
+    flask indexar-documentos            # incremental
+    flask conciliar-documentos          # faltantes / huérfanos
+"""
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import and_, func, or_
+
+from .busqueda import escapar_like
+from .config import get_nextcloud_base_path
+from .extensions import db
+from .models import ArchivoIndexado, DirectorioIndexado, DocumentoLaboral
+
+
+# Carpetas listadas por commit
+LOTE_DIRECTORIOS = 200
+
+
+def ignorar(nombre: str) -> bool:
+    """Temporales y metadatos del cliente de sincronización (.sync_*.db, ~$x.docx, ...)."""
+    return nombre.startswith((".", "~$")) or nombre.endswith((".part", ".tmp"))
+
+
+@dataclass
+class ResultadoIndexado:
+    directorios: int = 0      # carpetas recorridas
+    listadas: int = 0         # ... que se volvieron a listar (nuevas o con mtime distinto)
+    nuevos: int = 0
+    actualizados: int = 0
+    eliminados: int = 0
+
+
+class Indexador:
+    """
+    Recorre `raiz` (por defecto NEXTCLOUD_ROOT) y deja el índice al día.
+    Cada carpeta listada se confirma junto con sus archivos, así una
+    corrida cortada a mitad se retoma donde quedó.
+
+    Un mismo Indexador se puede reutilizar (lo hace `flask watch-documentos`):
+    mantiene en memoria el estado de las carpetas que va escribiendo.
+    """
+
+    def __init__(self, raiz=None, completo: bool = False, log=print):
+        self.raiz = Path(raiz) if raiz else get_nextcloud_base_path()
+        self.completo = completo
+        self.log = log
+        self.resultado = ResultadoIndexado()
+        self._archivos = ArchivoIndexado.__table__
+        self._directorios = DirectorioIndexado.__table__
+        self._conocidos = None      # ruta lógica -> mtime_ns
+        self._hijos = {}            # ruta lógica -> [subcarpetas]
+
+    def fisica(self, logica: str) -> str:
+        """'DOCUMENTACION LABORAL/EMPLEADORES/X' -> ruta en disco."""
+        return os.path.join(self.raiz.parent, *logica.split("/"))
+
+    def logica(self, fisica: str) -> str:
+        return Path(os.path.relpath(fisica, self.raiz.parent)).as_posix()
+
+    def _cargar_estado(self):
+        """Estado anterior de las carpetas: ruta -> mtime y padre -> hijas."""
+        self._conocidos = {}
+        self._hijos = {}
+        for ruta, padre, mtime_ns in db.session.execute(
+            db.select(self._directorios.c.ruta, self._directorios.c.padre, self._directorios.c.mtime_ns)
+        ):
+            self._conocidos[ruta] = mtime_ns
+            self._hijos.setdefault(padre, []).append(ruta)
+
+    def ejecutar(self) -> ResultadoIndexado:
+        if not self.raiz.is_dir():
+            raise FileNotFoundError(f"No existe la carpeta de documentos: {self.raiz}")
+        self.resultado = ResultadoIndexado()
+        self._cargar_estado()
+        self._recorrer([(str(self.raiz), self.raiz.name, None)])
+        return self.resultado
+
+    def refrescar(self, carpetas) -> ResultadoIndexado:
+        """
+        Relista ya las `carpetas` (rutas lógicas) aunque su mtime no haya
+        cambiado (un archivo sobrescrito no lo cambia) y baja a sus
+        subcarpetas nuevas o modificadas.
+        """
+        self.resultado = ResultadoIndexado()
+        if self._conocidos is None:
+            self._cargar_estado()
+        carpetas = set(carpetas)
+        self._recorrer(
+            [(self.fisica(c), c, c.rsplit("/", 1)[0] if "/" in c else None) for c in sorted(carpetas)],
+            forzar=carpetas,
+        )
+        return self.resultado
+
+    def _recorrer(self, pendientes: list, forzar=frozenset()):
+        self._tocadas, self._eliminadas = set(), set()
+        sin_confirmar = 0
+        while pendientes:
+            fisica, logica, padre = pendientes.pop()
+            self.resultado.directorios += 1
+            try:
+                mtime_ns = os.stat(fisica).st_mtime_ns
+            except (FileNotFoundError, NotADirectoryError):
+                self._eliminar_arbol(logica)
+                continue
+
+            sin_cambios = self._conocidos.get(logica) == mtime_ns
+            if sin_cambios and not self.completo and logica not in forzar:
+                # Sin cambios en la carpeta: solo hay que bajar a sus subcarpetas
+                for hija in self._hijos.get(logica, ()):
+                    pendientes.append((os.path.join(fisica, hija.rsplit("/", 1)[1]), hija, logica))
+                continue
+
+            subcarpetas = self._listar(fisica, logica, padre, mtime_ns)
+            pendientes.extend(
+                (os.path.join(fisica, nombre), f"{logica}/{nombre}", logica) for nombre in subcarpetas
+            )
+            sin_confirmar += 1
+            if sin_confirmar >= LOTE_DIRECTORIOS:
+                db.session.commit()
+                sin_confirmar = 0
+                self.log(f"   … {self.resultado.directorios} carpetas, {self.resultado.nuevos} archivos nuevos")
+
+        actualizar_presencia(self._tocadas, self._eliminadas)
+        db.session.commit()
+
+    # ---------- una carpeta ----------
+
+    def _listar(self, fisica: str, logica: str, padre: str | None, mtime_ns: int) -> list[str]:
+        """Relee una carpeta: sincroniza sus archivos y devuelve sus subcarpetas."""
+        self.resultado.listadas += 1
+        self._tocadas.add(logica)
+        archivos = {}
+        subcarpetas = []
+        with os.scandir(fisica) as entradas:
+            for entrada in entradas:
+                if ignorar(entrada.name):
+                    continue
+                if entrada.is_dir(follow_symlinks=False):
+                    subcarpetas.append(entrada.name)
+                elif entrada.is_file(follow_symlinks=False):
+                    st = entrada.stat(follow_symlinks=False)
+                    archivos[entrada.name] = (st.st_size, st.st_mtime_ns, entrada.inode())
+
+        self._sincronizar_archivos(logica, archivos)
+
+        # Subcarpetas que ya no están
+        actuales = {f"{logica}/{nombre}" for nombre in subcarpetas}
+        for hija in list(self._hijos.get(logica, ())):
+            if hija not in actuales:
+                self._eliminar_arbol(hija)
+
+        tabla = self._directorios
+        if logica in self._conocidos:
+            db.session.execute(
+                tabla.update().where(tabla.c.ruta == logica).values(mtime_ns=mtime_ns)
+            )
+        else:
+            db.session.execute(tabla.insert().values(ruta=logica, padre=padre, mtime_ns=mtime_ns))
+            if padre is not None and logica not in self._hijos.get(padre, ()):
+                self._hijos.setdefault(padre, []).append(logica)
+        self._conocidos[logica] = mtime_ns
+        self._hijos[logica] = sorted(actuales)
+        return subcarpetas
+
+    def _sincronizar_archivos(self, carpeta: str, archivos: dict):
+        tabla = self._archivos
+        existentes = {
+            f.nombre: f
+            for f in db.session.execute(
+                db.select(tabla.c.id, tabla.c.nombre, tabla.c.tamano, tabla.c.mtime_ns, tabla.c.inodo)
+                .where(tabla.c.carpeta == carpeta)
+            )
+        }
+
+        nuevos, cambios = [], []
+        for nombre, (tamano, mtime_ns, inodo) in archivos.items():
+            previo = existentes.get(nombre)
+            if previo is None:
+                nuevos.append({
+                    "ruta": f"{carpeta}/{nombre}", "carpeta": carpeta, "nombre": nombre,
+                    "tamano": tamano, "mtime_ns": mtime_ns, "inodo": inodo,
+                })
+            elif (previo.tamano, previo.mtime_ns, previo.inodo) != (tamano, mtime_ns, inodo):
+                cambios.append({"b_id": previo.id, "b_tamano": tamano, "b_mtime_ns": mtime_ns, "b_inodo": inodo})
+        borrados = [f.id for nombre, f in existentes.items() if nombre not in archivos]
+
+        if nuevos:
+            db.session.execute(tabla.insert(), nuevos)
+        if cambios:
+            db.session.execute(
+                tabla.update()
+                .where(tabla.c.id == db.bindparam("b_id"))
+                .values(
+                    tamano=db.bindparam("b_tamano"),
+                    mtime_ns=db.bindparam("b_mtime_ns"),
+                    inodo=db.bindparam("b_inodo"),
+                ),
+                cambios,
+            )
+        if borrados:
+            db.session.execute(tabla.delete().where(tabla.c.id.in_(borrados)))
+
+        self.resultado.nuevos += len(nuevos)
+        self.resultado.actualizados += len(cambios)
+        self.resultado.eliminados += len(borrados)
+
+    def _eliminar_arbol(self, logica: str):
+        """Quita del índice una carpeta que desapareció, con todo lo que tenía dentro."""
+        self._eliminadas.add(logica)
+        self.resultado.eliminados += db.session.execute(
+            self._archivos.delete().where(_bajo(self._archivos.c.carpeta, logica))
+        ).rowcount
+        db.session.execute(self._directorios.delete().where(_bajo(self._directorios.c.ruta, logica)))
+
+        prefijo = f"{logica}/"
+        for ruta in [r for r in self._conocidos if r == logica or r.startswith(prefijo)]:
+            del self._conocidos[ruta]
+            self._hijos.pop(ruta, None)
+        padre = logica.rsplit("/", 1)[0] if "/" in logica else None
+        if logica in self._hijos.get(padre, ()):
+            self._hijos[padre].remove(logica)
+
+
+def registrar_archivo(ruta_logica: str, fisica) -> None:
+    """
+    Anota en el índice un archivo que escribió la propia app (subidas),
+    sin esperar al próximo escaneo. No confirma: va en la transacción
+    del llamador.
+    """
+    tabla = ArchivoIndexado.__table__
+    carpeta, nombre = ruta_logica.rsplit("/", 1)
+    st = os.stat(fisica)
+    db.session.execute(tabla.delete().where(tabla.c.ruta == ruta_logica))
+    db.session.execute(tabla.insert().values(
+        ruta=ruta_logica, carpeta=carpeta, nombre=nombre,
+        tamano=st.st_size, mtime_ns=st.st_mtime_ns, inodo=st.st_ino,
+    ))
+
+
+def indexar(raiz=None, completo: bool = False, log=print) -> ResultadoIndexado:
+    return Indexador(raiz, completo, log).ejecutar()
+
+
+# ==========================
+# Conciliación
+# ==========================
+
+def _bajo(columna, carpeta: str):
+    return or_(columna == carpeta, columna.like(f"{escapar_like(carpeta)}/%", escape="\\"))
+
+
+def sentencia_presencia():
+    """UPDATE documentos_laborales SET archivo_en_disco = EXISTS(archivo indexado), sin WHERE."""
+    documentos = DocumentoLaboral.__table__
+    archivos = ArchivoIndexado.__table__
+    existe = (
+        db.select(archivos.c.id)
+        .where(
+            archivos.c.carpeta == documentos.c.carpeta_destino,
+            archivos.c.nombre == documentos.c.nombre_archivo,
+        )
+        .exists()
+    )
+    return documentos.update().values(archivo_en_disco=existe)
+
+
+def actualizar_presencia(carpetas=None, arboles=(), lote: int = 500):
+    """
+    Recalcula DocumentoLaboral.archivo_en_disco para los documentos de
+    `carpetas` y de todo lo que cuelga de `arboles` (rutas lógicas). Sin
+    argumentos, para todos los documentos con ruta.
+    """
+    documentos = DocumentoLaboral.__table__
+    actualizar = sentencia_presencia()
+
+    if carpetas is None:
+        db.session.execute(actualizar.where(documentos.c.carpeta_destino.isnot(None)))
+        return
+    carpetas = sorted(carpetas)
+    for i in range(0, len(carpetas), lote):
+        db.session.execute(actualizar.where(documentos.c.carpeta_destino.in_(carpetas[i:i + lote])))
+    for arbol in arboles:
+        db.session.execute(actualizar.where(_bajo(documentos.c.carpeta_destino, arbol)))
+
+@dataclass
+class ResultadoConciliacion:
+    documentos: int = 0          # documentos con ruta lógica
+    sin_ruta: int = 0            # documentos cuyo contrato no tiene empleador
+    encontrados: int = 0
+    faltantes: int = 0           # en la BD pero no en disco
+    huerfanos: int = 0           # en carpetas de trabajadores pero sin documento en la BD
+    ejemplos_faltantes: list = field(default_factory=list)
+    ejemplos_huerfanos: list = field(default_factory=list)
+
+
+def conciliar(limite: int = 50) -> ResultadoConciliacion:
+    """
+    Cruza documentos y archivos indexados por (carpeta, nombre). Huérfanos
+    son los archivos dentro de carpetas de trabajadores (…/TRABAJADORES/…)
+    que ningún DocumentoLaboral espera.
+    """
+    documentos = DocumentoLaboral.__table__
+    archivos = ArchivoIndexado.__table__
+    cruce = and_(
+        archivos.c.carpeta == documentos.c.carpeta_destino,
+        archivos.c.nombre == documentos.c.nombre_archivo,
+    )
+
+    def _contar(consulta):
+        return db.session.execute(db.select(func.count()).select_from(consulta.subquery())).scalar()
+
+    con_ruta = documentos.c.carpeta_destino.isnot(None)
+    faltantes = (
+        db.select(documentos.c.id, documentos.c.carpeta_destino, documentos.c.nombre_archivo)
+        .select_from(documentos.outerjoin(archivos, cruce))
+        .where(con_ruta, archivos.c.id.is_(None))
+    )
+    huerfanos = (
+        db.select(archivos.c.ruta)
+        .select_from(archivos.outerjoin(documentos, cruce))
+        .where(documentos.c.id.is_(None), archivos.c.carpeta.like("%/TRABAJADORES/%"))
+    )
+
+    # De paso deja al día DocumentoLaboral.archivo_en_disco
+    actualizar_presencia()
+    db.session.commit()
+
+    resultado = ResultadoConciliacion(
+        documentos=_contar(db.select(documentos.c.id).where(con_ruta)),
+        sin_ruta=_contar(db.select(documentos.c.id).where(documentos.c.carpeta_destino.is_(None))),
+        faltantes=_contar(faltantes),
+        huerfanos=_contar(huerfanos),
+    )
+    resultado.encontrados = resultado.documentos - resultado.faltantes
+    resultado.ejemplos_faltantes = [
+        (f.id, f"{f.carpeta_destino}/{f.nombre_archivo}")
+        for f in db.session.execute(faltantes.order_by(documentos.c.id).limit(limite))
+    ]
+    resultado.ejemplos_huerfanos = db.session.execute(
+        huerfanos.order_by(archivos.c.ruta).limit(limite)
+    ).scalars().all()
+    return resultado
@@ -0,0 +1,276 @@
+# web/app/miniaturas.py
+
+"""
+Miniaturas (primera página) de los documentos laborales, generadas en
+segundo plano.
+
+- Caché en disco direccionada por el SHA-256 del archivo
+  (MINIATURAS_DIR/ab/abcdef....jpg): dos documentos con el mismo escaneo
+  comparten miniatura y un archivo reemplazado cambia de clave solo.
+  DocumentoLaboral.sha256 / tamano_bytes vienen de la subida; para los
+  archivos que llegaron por Nextcloud se calculan (y se guardan) al
+  generar la primera miniatura.
+- Tamaño acotado (MINIATURAS_MAX_BYTES) con desalojo LRU: cada acierto
+  actualiza el mtime del archivo y, al pasarse del tope, se borran los
+  más antiguos.
+- Un pool de hilos por proceso genera las que faltan. La petición nunca
+  espera: responde "pendiente" y la página vuelve a pedirla. Después de
+  una subida se encola de inmediato.
+
+PDF con pdftoppm (poppler-utils); imágenes con Pillow si está instalado.
+Sin esas herramientas simplemente no hay miniatura.
+"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import ruta_fisica_documento
+from .derivados import rutas_documentos
+from .extensions import db
+from .models import DocumentoLaboral
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow es opcional
+    Image = None
+
+
+ANCHO = 320
+TIEMPO_MAXIMO = 60          # segundos por render
+BLOQUE = 1024 * 1024
+REFRESCO_LRU = 600          # no tocar el mtime en cada acierto
+
+LISTA, PENDIENTE, NO_DISPONIBLE = "lista", "pendiente", "no_disponible"
+
+
+# ==========================
+# Render
+# ==========================
+
+def _render_pdf(origen, destino) -> bool:
+    prefijo = destino[:-len(".jpg")]
+    subprocess.run(
+        ["pdftoppm", "-f", "1", "-l", "1", "-singlefile", "-jpeg", "-jpegopt", "quality=80",
+         "-scale-to", str(ANCHO), str(origen), prefijo],
+        check=True, timeout=TIEMPO_MAXIMO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return True
+
+
+def _render_imagen(origen, destino) -> bool:
+    with Image.open(origen) as imagen:
+        imagen.thumbnail((ANCHO, ANCHO * 2))
+        imagen.convert("RGB").save(destino, "JPEG", quality=80)
+    return True
+
+
+# Solo los formatos cuya herramienta está instalada
+RENDERS = {}
+if shutil.which("pdftoppm"):
+    RENDERS[".pdf"] = _render_pdf
+if Image is not None:
+    RENDERS.update({".jpg": _render_imagen, ".jpeg": _render_imagen, ".png": _render_imagen})
+
+
+def soportado(nombre_archivo: str) -> bool:
+    return os.path.splitext(nombre_archivo)[1].lower() in RENDERS
+
+
+def sha256_archivo(ruta) -> str:
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        while datos := archivo.read(BLOQUE):
+            resumen.update(datos)
+    return resumen.hexdigest()
+
+
+# ==========================
+# Caché en disco
+# ==========================
+
+class CacheMiniaturas:
+    """Archivos <clave>.jpg repartidos en 256 subcarpetas, con tope de tamaño."""
+
+    def __init__(self, directorio, max_bytes: int):
+        self.directorio = str(directorio)
+        self.max_bytes = max_bytes
+        self._tamano = None     # estimado; _podar() lo recalcula exacto
+        self._lock = threading.Lock()
+
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, clave[:2], f"{clave}.jpg")
+
+    def obtener(self, clave: str) -> str | None:
+        ruta = self.ruta(clave)
+        try:
+            mtime = os.stat(ruta).st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - mtime > REFRESCO_LRU:
+            try:
+                os.utime(ruta)
+            except FileNotFoundError:
+                return None     # la acaba de desalojar otro proceso
+        return ruta
+
+    def guardar(self, clave: str, generar) -> bool:
+        """generar(ruta_temporal) -> bool. Escribe atómicamente en la caché."""
+        ruta = self.ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), prefix=".", suffix=".jpg")
+        os.close(fd)
+        try:
+            if not generar(temporal) or not os.path.getsize(temporal):
+                return False
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+
+        with self._lock:
+            if self._tamano is None:
+                self._tamano = self._medir()
+            else:
+                self._tamano += os.path.getsize(ruta)
+            if self._tamano > self.max_bytes:
+                self._podar()
+        return True
+
+    def _archivos(self):
+        for sub in os.scandir(self.directorio):
+            if sub.is_dir():
+                for entrada in os.scandir(sub.path):
+                    if entrada.name.endswith(".jpg") and not entrada.name.startswith("."):
+                        st = entrada.stat()
+                        yield st.st_mtime, st.st_size, entrada.path
+
+    def _medir(self) -> int:
+        return sum(tamano for _, tamano, _ in self._archivos())
+
+    def _podar(self):
+        """Borra las menos usadas hasta quedar bajo el 90 % del tope."""
+        archivos = sorted(self._archivos())
+        total = sum(tamano for _, tamano, _ in archivos)
+        objetivo = self.max_bytes * 0.9
+        for _, tamano, ruta in archivos:
+            if total <= objetivo:
+                break
+            try:
+                os.unlink(ruta)
+            except FileNotFoundError:
+                pass
+            total -= tamano
+        self._tamano = total
+
+
+# ==========================
+# Pool de generación
+# ==========================
+
+class GeneradorMiniaturas:
+    def __init__(self, app):
+        self.app = app
+        self.cache = CacheMiniaturas(app.config["MINIATURAS_DIR"], app.config["MINIATURAS_MAX_BYTES"])
+        self._pool = ThreadPoolExecutor(
+            max_workers=app.config["MINIATURAS_HILOS"], thread_name_prefix="miniaturas"
+        )
+        self._en_curso = {}     # documento_id -> Future
+        self._fallidos = {}     # documento_id -> tamaño del archivo que no se pudo procesar
+        # Reentrante: add_done_callback corre al tiro si el futuro ya terminó
+        self._lock = threading.RLock()
+
+    def fallo(self, documento_id: int, tamano: int) -> bool:
+        """¿Ya se intentó con este mismo archivo y no resultó?"""
+        return self._fallidos.get(documento_id) == tamano
+
+    def encolar(self, documento_id: int):
+        with self._lock:
+            futuro = self._en_curso.get(documento_id)
+            if futuro is None:
+                futuro = self._pool.submit(self._generar, documento_id)
+                self._en_curso[documento_id] = futuro
+                futuro.add_done_callback(lambda _: self._terminar(documento_id))
+            return futuro
+
+    def _terminar(self, documento_id: int):
+        with self._lock:
+            self._en_curso.pop(documento_id, None)
+
+    def _generar(self, documento_id: int):
+        with self.app.app_context():
+            tamano = None
+            try:
+                documento = db.session.get(DocumentoLaboral, documento_id)
+                if documento is None:
+                    return
+                ruta_logica = rutas_documentos([documento])[documento.id]
+                ruta = ruta_fisica_documento(ruta_logica)
+                tamano = os.path.getsize(ruta)
+
+                clave = _clave_conocida(documento, tamano)
+                if clave is None:
+                    clave = sha256_archivo(ruta)
+                    # Queda para la deduplicación de subidas y la próxima vez
+                    documento.sha256, documento.tamano_bytes = clave, tamano
+                    db.session.commit()
+
+                if self.cache.obtener(clave) is None:
+                    render = RENDERS[os.path.splitext(ruta.name)[1].lower()]
+                    if not self.cache.guardar(clave, lambda destino: render(ruta, destino)):
+                        self._fallidos[documento_id] = tamano
+            except Exception:
+                db.session.rollback()
+                self._fallidos[documento_id] = tamano
+                self.app.logger.exception("No se pudo generar la miniatura del documento %s", documento_id)
+
+
+def _clave_conocida(documento: DocumentoLaboral, tamano: int) -> str | None:
+    if documento.sha256 and documento.tamano_bytes == tamano:
+        return documento.sha256
+    return None
+
+
+_generador = None
+_generador_lock = threading.Lock()
+
+
+def generador(app) -> GeneradorMiniaturas:
+    """Uno por proceso (se crea después del fork de gunicorn, al primer uso)."""
+    global _generador
+    with _generador_lock:
+        if _generador is None:
+            _generador = GeneradorMiniaturas(app)
+        return _generador
+
+
+def miniatura(app, documento: DocumentoLaboral):
+    """
+    (estado, ruta, clave): LISTA con la ruta en caché; PENDIENTE si se
+    encoló; NO_DISPONIBLE si no hay archivo o el formato no se soporta.
+    """
+    if not soportado(documento.nombre_archivo) or documento.archivo_en_disco is False:
+        return NO_DISPONIBLE, None, None
+    ruta_logica = rutas_documentos([documento])[documento.id]
+    if not ruta_logica:
+        return NO_DISPONIBLE, None, None
+    try:
+        tamano = os.path.getsize(ruta_fisica_documento(ruta_logica))
+    except (ValueError, OSError):
+        return NO_DISPONIBLE, None, None
+
+    gen = generador(app)
+    clave = _clave_conocida(documento, tamano)
+    if clave is not None:
+        ruta = gen.cache.obtener(clave)
+        if ruta is not None:
+            return LISTA, ruta, clave
+    if gen.fallo(documento.id, tamano):
+        return NO_DISPONIBLE, None, None
+    gen.encolar(documento.id)
+    return PENDIENTE, None, None
@@ -1,7 +1,10 @@
+from sqlalchemy import DDL
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from .extensions import db
 from .config import (
     normalizar_nombre_trabajador,
+    texto_busqueda_trabajador,
     NEXTCLOUD_BASE_PATH,
     generar_nombre_documento,
 )
@@ -137,6 +140,25 @@ class Cargo(db.Model):
         return f"<Cargo {self.nombre}>"
 
 
+class CatalogoVersion(db.Model):
+    """
+    Sello compartido de las tablas maestras (ver app/catalogos.py): se
+    incrementa en la misma transacción que las modifica y cada worker lo
+    compara con el de su caché. Una sola fila (id = 1).
+    """
+    __tablename__ = "catalogo_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+db.event.listen(
+    CatalogoVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO catalogo_version (id, version) VALUES (1, 0)"),
+)
+
+
 # ==========================
 # Obras
 # ==========================
@@ -173,6 +195,22 @@ class Obra(db.Model):
 
 class Trabajador(db.Model):
     __tablename__ = "trabajadores"
+    __table_args__ = (
+        # Búsqueda libre: índice de trigramas (pg_trgm) sobre el texto normalizado.
+        # En SQLite queda como índice normal.
+        db.Index(
+            "ix_trabajadores_busqueda_trgm",
+            "busqueda",
+            postgresql_using="gin",
+            postgresql_ops={"busqueda": "gin_trgm_ops"},
+        ),
+        # Búsqueda por prefijo (RUT tecleado de a poco): LIKE 'xxx%'
+        db.Index(
+            "ix_trabajadores_busqueda_prefijo",
+            "busqueda",
+            postgresql_ops={"busqueda": "varchar_pattern_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -183,6 +221,10 @@ class Trabajador(db.Model):
     ap_paterno = db.Column(db.String(100), nullable=False)
     ap_materno = db.Column(db.String(100), nullable=False)
 
+    # Texto normalizado para la búsqueda libre (RUT sin puntos/guión + apellidos + nombres,
+    # en mayúsculas y sin tildes). Se mantiene solo con los eventos de más abajo.
+    busqueda = db.Column(db.String(400), nullable=True)
+
     # Datos personales
     fecha_nacimiento = db.Column(db.Date, nullable=True)
     nacionalidad = db.Column(db.String(60), nullable=True)
@@ -283,68 +325,28 @@ class Trabajador(db.Model):
     contratos = db.relationship("Contrato", back_populates="trabajador", lazy=True)
 
     # ==========================
-    # Helpers de documentación / Nextcloud
+    # Derivados (ver app/derivados.py)
     # ==========================
 
-    @property
-    def carpeta_nombre(self) -> str:
-        """
-        Nombre estándar de carpeta del trabajador en Nextcloud.
-        Ej: 12345710-2_PAILLALEVE_GUINEO_HECTOR_DAVID
-        """
-        return normalizar_nombre_trabajador(
-            self.rut,
-            self.nombres,
-            self.ap_paterno,
-            self.ap_materno,
-        )
-
-    @property
-    def empleador_preferente(self):
-        """
-        Determina el empleador "principal" del trabajador
-        EXCLUSIVAMENTE en función de sus contratos:
+    # Empleador "principal" según sus contratos: el del contrato VIGENTE más
+    # reciente (por fecha_inicio) o, si no hay vigentes, el del contrato más
+    # reciente con empleador.
+    empleador_preferente_id = db.Column(
+        db.Integer, db.ForeignKey("empleadores.id"), nullable=True, index=True
+    )
+    empleador_preferente = db.relationship("Empleador", foreign_keys=[empleador_preferente_id])
 
-        1) Primero, busca contratos VIGENTES con empleador.
-           - Toma el más reciente según fecha_inicio.
-        2) Si no hay vigentes, busca cualquier contrato con empleador.
-           - También toma el más reciente.
+    # Nombre estándar de carpeta en Nextcloud (se calcula al guardar).
+    # Ej: 12345710-2_PAILLALEVE_GUINEO_HECTOR_DAVID
+    carpeta_nombre = db.Column(db.String(300), nullable=True, index=True)
 
-        Si no hay contratos con empleador asociado, devuelve None.
-        """
-        if not self.contratos:
-            return None
+    # Ruta lógica de sus documentos bajo el empleador preferente
+    # (None si no tiene contratos con empleador).
+    ruta_nextcloud_preferente = db.Column(db.String(600), nullable=True, index=True)
 
-        # 1) Contratos vigentes con empleador
-        contratos_vigentes = [
-            c for c in self.contratos
-            if c.estado_contrato == "VIGENTE" and c.empleador is not None
-        ]
-
-        if contratos_vigentes:
-            contratos_ordenados = sorted(
-                contratos_vigentes,
-                key=lambda c: (c.fecha_inicio or date.min),
-                reverse=True,
-            )
-            return contratos_ordenados[0].empleador
-
-        # 2) Si no hay vigentes, tomar cualquier contrato con empleador
-        contratos_con_empleador = [
-            c for c in self.contratos
-            if c.empleador is not None
-        ]
-
-        if contratos_con_empleador:
-            contratos_ordenados = sorted(
-                contratos_con_empleador,
-                key=lambda c: (c.fecha_inicio or date.min),
-                reverse=True,
-            )
-            return contratos_ordenados[0].empleador
-
-        # Ningún contrato tiene empleador
-        return None
+    # ==========================
+    # Helpers de documentación / Nextcloud
+    # ==========================
 
     def ruta_nextcloud(self, empleador_nombre: str) -> str:
         """
@@ -356,24 +358,41 @@ class Trabajador(db.Model):
             carpeta_trabajador=self.carpeta_nombre,
         )
 
-    @property
-    def ruta_nextcloud_preferente(self) -> str | None:
-        """
-        Usa el empleador_preferente (derivado de los contratos) para
-        construir la ruta lógica en Nextcloud.
-
-        Si el trabajador no tiene contratos con empleador asociado,
-        devuelve None.
-        """
-        emp = self.empleador_preferente
-        if not emp:
-            return None
-        return self.ruta_nextcloud(emp.razon_social)
-
     def __repr__(self):
         return f"<Trabajador {self.rut} - {self.nombres} {self.ap_paterno}>"
 
 
+def _actualizar_busqueda(mapper, connection, target):
+    target.busqueda = texto_busqueda_trabajador(
+        target.rut,
+        target.nombres,
+        target.ap_paterno,
+        target.ap_materno,
+    )
+
+
+def _actualizar_carpeta(mapper, connection, target):
+    target.carpeta_nombre = normalizar_nombre_trabajador(
+        target.rut,
+        target.nombres,
+        target.ap_paterno,
+        target.ap_materno,
+    )
+
+
+db.event.listen(Trabajador, "before_insert", _actualizar_busqueda)
+db.event.listen(Trabajador, "before_update", _actualizar_busqueda)
+db.event.listen(Trabajador, "before_insert", _actualizar_carpeta)
+db.event.listen(Trabajador, "before_update", _actualizar_carpeta)
+
+# El índice GIN de trigramas necesita la extensión pg_trgm
+db.event.listen(
+    Trabajador.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
 # ==========================
 # Contratos
 # ==========================
@@ -383,7 +402,7 @@ class Contrato(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
 
-    trabajador_id = db.Column(db.Integer, db.ForeignKey("trabajadores.id"), nullable=False)
+    trabajador_id = db.Column(db.Integer, db.ForeignKey("trabajadores.id"), nullable=False, index=True)
     trabajador = db.relationship("Trabajador", back_populates="contratos")
 
     empleador_id = db.Column(db.Integer, db.ForeignKey("empleadores.id"), nullable=True)
@@ -427,7 +446,7 @@ class Contrato(db.Model):
 
     def __repr__(self):
         return f"<Contrato {self.id} Trabajador={self.trabajador_id}>"
-    
+
 
 # ==========================
 # Documentos laborales
@@ -435,6 +454,10 @@ class Contrato(db.Model):
 
 class DocumentoLaboral(db.Model):
     __tablename__ = "documentos_laborales"
+    __table_args__ = (
+        # Conciliar archivos en disco con la BD: búsqueda por (carpeta, nombre)
+        db.Index("ix_documentos_carpeta_archivo", "carpeta_destino", "nombre_archivo"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -450,6 +473,19 @@ class DocumentoLaboral(db.Model):
     estado = db.Column(db.String(20), nullable=False, default="VIGENTE")
     fecha_creacion = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    # Carpeta lógica en Nextcloud (derivada del contrato, ver app/derivados.py), ej:
+    # .../TRABAJADORES/<CARPETA_TRABAJADOR>/CONTRATOS
+    carpeta_destino = db.Column(db.String(600), nullable=True)
+
+    # ¿Está el archivo en carpeta_destino? Lo mantiene el índice de archivos
+    # (flask indexar-documentos / watch-documentos). None = aún no se sabe.
+    archivo_en_disco = db.Column(db.Boolean, nullable=True)
+
+    # Contenido del archivo subido por la app (app/subidas.py). El índice
+    # por hash detecta el mismo escaneo subido en otro contrato.
+    sha256 = db.Column(db.String(64), nullable=True, index=True)
+    tamano_bytes = db.Column(db.BigInteger, nullable=True)
+
     # ==========================
     # Fábricas / helpers de creación
     # ==========================
@@ -492,20 +528,6 @@ class DocumentoLaboral(db.Model):
     # Helpers de ruta
     # ==========================
 
-    @property
-    def carpeta_destino(self) -> str | None:
-        """
-        Carpeta lógica en Nextcloud, ej:
-        .../TRABAJADORES/<CARPETA_TRABAJADOR>/CONTRATOS
-        """
-        if not self.contrato or not self.contrato.trabajador or not self.contrato.empleador:
-            return None
-
-        base = self.contrato.trabajador.ruta_nextcloud(
-            self.contrato.empleador.razon_social
-        )
-        return f"{base}/{self.tipo.upper()}"
-
     @property
     def ruta_completa(self) -> str | None:
         """
@@ -518,3 +540,193 @@ class DocumentoLaboral(db.Model):
 
     def __repr__(self):
         return f"<DocumentoLaboral {self.id} Contrato={self.contrato_id} Tipo={self.tipo}>"
+
+
+# ==========================
+# Datos derivados (ver app/derivados.py)
+# ==========================
+
+_DERIVADOS_PENDIENTES = "derivados_pendientes"
+
+# Campos de los que dependen las columnas derivadas
+_CAMPOS_DERIVADOS = (
+    (Contrato, ("trabajador_id", "empleador_id", "estado_contrato", "fecha_inicio")),
+    (Trabajador, ("rut", "nombres", "ap_paterno", "ap_materno")),
+    (DocumentoLaboral, ("contrato_id", "tipo")),
+    (Empleador, ("razon_social",)),
+)
+
+
+def _campos_derivados(obj):
+    for clase, campos in _CAMPOS_DERIVADOS:
+        if isinstance(obj, clase):
+            return campos
+    return None
+
+
+def _marcar_derivados(session, flush_context):
+    """Anota qué trabajadores / documentos / empleadores cambiaron en este flush."""
+    pendientes = session.info.setdefault(
+        _DERIVADOS_PENDIENTES, {"trabajadores": set(), "documentos": set(), "empleadores": set()}
+    )
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        campos = _campos_derivados(obj)
+        if campos is None:
+            continue
+        estado = db.inspect(obj)
+        nuevo, borrado = obj in session.new, obj in session.deleted
+        if not (nuevo or borrado) and not any(estado.attrs[c].history.has_changes() for c in campos):
+            continue
+
+        if isinstance(obj, Contrato):
+            pendientes["trabajadores"].add(estado.dict.get("trabajador_id"))
+            # Contrato movido a otro trabajador: el anterior también cambia
+            pendientes["trabajadores"].update(estado.attrs.trabajador_id.history.deleted)
+        elif borrado:
+            continue
+        elif isinstance(obj, DocumentoLaboral):
+            pendientes["documentos"].add(obj.id)
+        elif not nuevo:
+            # Un trabajador o empleador nuevo todavía no tiene contratos
+            clave = "trabajadores" if isinstance(obj, Trabajador) else "empleadores"
+            pendientes[clave].add(obj.id)
+
+
+def _recalcular_derivados(session, flush_context):
+    pendientes = session.info.pop(_DERIVADOS_PENDIENTES, None)
+    if not pendientes or not any(pendientes.values()):
+        return
+    from .derivados import (
+        recalcular_carpetas_documentos,
+        recalcular_derivados,
+        trabajadores_de_empleadores,
+    )
+
+    conexion = session.connection()
+    trabajadores = pendientes["trabajadores"] | trabajadores_de_empleadores(pendientes["empleadores"], conexion)
+    trabajadores.discard(None)
+    if trabajadores:
+        recalcular_derivados(trabajadores, conexion=conexion)
+    if pendientes["documentos"]:
+        recalcular_carpetas_documentos(documento_ids=pendientes["documentos"], conexion=conexion)
+
+    # Los objetos ya cargados releen los valores recalculados (solo los afectados)
+    cargados = list(session.identity_map.values())
+    contratos_afectados = set()
+    if trabajadores and any(isinstance(obj, DocumentoLaboral) for obj in cargados):
+        contratos_afectados = set(conexion.execute(
+            db.select(Contrato.id).where(Contrato.trabajador_id.in_(trabajadores))
+        ).scalars())
+    for obj in cargados:
+        if isinstance(obj, Trabajador) and obj.id in trabajadores:
+            session.expire(obj, ["empleador_preferente_id", "empleador_preferente", "ruta_nextcloud_preferente"])
+        elif isinstance(obj, DocumentoLaboral) and (
+            obj.id in pendientes["documentos"] or obj.contrato_id in contratos_afectados
+        ):
+            session.expire(obj, ["carpeta_destino", "archivo_en_disco"])
+
+
+db.event.listen(Session, "after_flush", _marcar_derivados)
+db.event.listen(Session, "after_flush_postexec", _recalcular_derivados)
+
+
+# ==========================
+# Importaciones masivas
+# ==========================
+
+class ImportRechazo(db.Model):
+    """
+    Fila de un CSV que no se pudo importar, con su código de motivo
+    (TRABAJADOR_NO_ENCONTRADO, OBRA_NO_ENCONTRADA, ...). Así los rechazos
+    de una carga quedan consultables con SQL en vez de perderse en la consola.
+    """
+    __tablename__ = "import_rechazos"
+
+    id = db.Column(db.Integer, primary_key=True)
+    lote = db.Column(db.String(36), nullable=False, index=True)   # identificador de la corrida
+    archivo = db.Column(db.String(500), nullable=True)
+    fila = db.Column(db.Integer, nullable=True)                   # nº de fila de datos (1 = primera tras el encabezado)
+    motivo = db.Column(db.String(50), nullable=False, index=True)
+    datos = db.Column(db.Text, nullable=True)                     # fila original en JSON
+    creado_en = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ImportRechazo {self.lote} fila={self.fila} {self.motivo}>"
+
+
+class ImportJob(db.Model):
+    """
+    Corrida de `flask import` con su punto de control: cada lote se
+    confirma junto con `ultima_fila`, así una carga que falla a mitad se
+    puede retomar (--resume <id>) sin repetir lo ya escrito.
+    El id es también el `lote` de sus filas en import_rechazos.
+    """
+    __tablename__ = "import_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+    perfil = db.Column(db.String(50), nullable=False)
+    archivo = db.Column(db.String(500), nullable=False)
+    archivo_sha256 = db.Column(db.String(64), nullable=False)
+    opciones = db.Column(db.Text, nullable=True)                  # JSON: lote, separador, contexto...
+
+    estado = db.Column(db.String(20), nullable=False, default="EN_CURSO", index=True)  # EN_CURSO / COMPLETADO / FALLIDO
+    ultima_fila = db.Column(db.Integer, nullable=False, default=0)  # última fila confirmada
+
+    filas = db.Column(db.Integer, nullable=False, default=0)
+    nuevos = db.Column(db.Integer, nullable=False, default=0)
+    actualizados = db.Column(db.Integer, nullable=False, default=0)
+    rechazados = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    creado_en = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    actualizado_en = db.Column(db.DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ImportJob {self.id} {self.perfil} {self.estado} fila={self.ultima_fila}>"
+
+
+# ==========================
+# Índice de archivos de Nextcloud (ver app/indice_archivos.py)
+# ==========================
+
+class DirectorioIndexado(db.Model):
+    """
+    Carpeta del árbol NEXTCLOUD_ROOT con el mtime que tenía la última vez
+    que se listó: si no cambió, sus archivos no se vuelven a leer.
+    """
+    __tablename__ = "directorios_indexados"
+
+    id = db.Column(db.Integer, primary_key=True)
+    ruta = db.Column(db.String(1000), nullable=False, unique=True)   # ruta lógica ("DOCUMENTACION LABORAL/...")
+    padre = db.Column(db.String(1000), nullable=True, index=True)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    listado_en = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<DirectorioIndexado {self.ruta}>"
+
+
+class ArchivoIndexado(db.Model):
+    """
+    Archivo encontrado bajo NEXTCLOUD_ROOT. `carpeta` y `nombre` tienen el
+    mismo formato que DocumentoLaboral.carpeta_destino / nombre_archivo,
+    así la conciliación es un JOIN por índices.
+    """
+    __tablename__ = "archivos_indexados"
+    __table_args__ = (
+        db.Index("ix_archivos_indexados_carpeta_nombre", "carpeta", "nombre"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    ruta = db.Column(db.String(1300), nullable=False, unique=True)   # carpeta + "/" + nombre
+    carpeta = db.Column(db.String(1000), nullable=False)
+    nombre = db.Column(db.String(255), nullable=False)
+
+    tamano = db.Column(db.BigInteger, nullable=False)
+    mtime_ns = db.Column(db.BigInteger, nullable=False)
+    inodo = db.Column(db.BigInteger, nullable=True)
+
+    indexado_en = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ArchivoIndexado {self.ruta}>"
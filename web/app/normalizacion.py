@@ -0,0 +1,75 @@
+# web/app/normalizacion.py
+
+"""
+Normalización de texto común a carpetas, nombres de archivo y búsqueda:
+MAYÚSCULAS y sin tildes ni diéresis ("Núñez" -> "NUNEZ").
+
+El criterio es NFD + descartar las marcas combinantes (categoría Mn), que
+obliga a recorrer carácter por carácter con unicodedata. Casi todos los
+nombres chilenos caben en Latin-1, así que para ellos se usa una tabla
+de str.translate precalculada con ese mismo criterio (igual resultado,
+una sola pasada en C); el camino Unicode completo queda para lo raro.
+Además los resultados se memorizan: en una nómina los nombres y
+apellidos se repiten muchísimo.
+
+Todo lo que compara nombres (carpetas en Nextcloud, nombres de archivo,
+columna de búsqueda, encabezados de importación) debe pasar por aquí
+para que las claves coincidan.
+
+Benchmark: python -m app.bench_normalizacion
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+
+TAMANO_CACHE = 65536
+
+
+def sin_tildes_unicode(texto: str) -> str:
+    """Camino general: vale para cualquier carácter Unicode."""
+    return "".join(
+        ch for ch in unicodedata.normalize("NFD", texto)
+        if unicodedata.category(ch) != "Mn"
+    )
+
+
+# Latin-1 -> sin diacríticos, calculada con el camino general ("Ñ" -> "N").
+# Como NFD descompone carácter por carácter, aplicarla a un texto Latin-1
+# da lo mismo que sin_tildes_unicode().
+_TABLA_LATIN1 = {
+    i: sin_tildes_unicode(chr(i))
+    for i in range(256)
+    if sin_tildes_unicode(chr(i)) != chr(i)
+}
+
+
+def sin_tildes(texto: str) -> str:
+    if texto.isascii():
+        return texto
+    if max(texto) <= "\xff":
+        return texto.translate(_TABLA_LATIN1)
+    return sin_tildes_unicode(texto)
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def normalizar_texto(texto: str | None) -> str:
+    """'  Núñez ' -> 'NUNEZ': sin espacios en los bordes, MAYÚSCULAS, sin tildes."""
+    if not texto:
+        return ""
+    return sin_tildes(texto.strip().upper())
+
+
+def normalizar_segmento(texto: str | None) -> str:
+    """Para carpetas y nombres de archivo: además, espacios -> '_'."""
+    return normalizar_texto(texto).replace(" ", "_")
+
+
+_NO_ALFANUMERICO = re.compile(r"[^0-9A-Z]+")
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def normalizar_palabras(texto: str | None) -> str:
+    """Para búsqueda: solo letras y dígitos, separados por un espacio."""
+    return " ".join(_NO_ALFANUMERICO.sub(" ", normalizar_texto(texto)).split())
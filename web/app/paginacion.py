@@ -0,0 +1,343 @@
+# web/app/paginacion.py
+
+"""
+Paginación por cursor (keyset) para listados grandes.
+
+En vez de traer todas las filas y cortarlas en Python (o usar OFFSET,
+que igual recorre las filas saltadas), cada página se pide con un
+WHERE sobre la clave de orden de la última fila vista:
+
+    (obra, ap_paterno, ap_materno, id) > (:obra, :paterno, :materno, :id)
+
+Así la base de datos solo lee las filas de la página que se muestra.
+El cursor viaja en la URL como texto opaco (base64 de un JSON).
+
+Los listados se responden con stream_template (responder_en_stream):
+la cabecera y los filtros salen antes de recorrer las filas. Con
+?imprimir=1 el listado va completo, sin paginar, leído con un cursor
+del servidor (yield_per) a medida que la plantilla pide filas.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app, get_flashed_messages, stream_template
+from sqlalchemy import and_, or_, func, text
+
+from .cache import obtener_cache
+from .extensions import db
+
+
+@dataclass(frozen=True)
+class Clave:
+    """
+    Una columna de la clave de orden.
+
+    La expresión NO debe poder ser NULL (usar func.coalesce si hace falta),
+    porque las comparaciones con NULL rompen el cursor.
+    """
+    expr: object
+    desc: bool = False
+
+
+@dataclass
+class Pagina:
+    items: list = field(default_factory=list)
+    cursor_siguiente: str | None = None
+    cursor_anterior: str | None = None
+    tiene_siguiente: bool = False
+    tiene_anterior: bool = False
+
+
+# ==========================
+# Codificación del cursor
+# ==========================
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return {"dt": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"d": valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {"n": str(valor)}
+    return valor
+
+
+def _desde_json(valor):
+    if isinstance(valor, dict):
+        if "dt" in valor:
+            return datetime.fromisoformat(valor["dt"])
+        if "d" in valor:
+            return date.fromisoformat(valor["d"])
+        if "n" in valor:
+            return Decimal(valor["n"])
+    return valor
+
+
+def codificar_cursor(valores) -> str:
+    crudo = json.dumps([_a_json(v) for v in valores], separators=(",", ":"))
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str | None, largo: int):
+    """
+    Devuelve la lista de valores del cursor, o None si viene vacío
+    o no es válido (en ese caso se parte desde la primera página).
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        crudo = base64.urlsafe_b64decode(cursor + relleno).decode("utf-8")
+        valores = [_desde_json(v) for v in json.loads(crudo)]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ArithmeticError):
+        return None
+    if not isinstance(valores, list) or len(valores) != largo:
+        return None
+    return valores
+
+
+# ==========================
+# Consulta de una página
+# ==========================
+
+def _condicion_despues(claves, valores, invertir=False):
+    """
+    Construye la condición "fila posterior al cursor" expandida
+    (a > x) OR (a = x AND b > y) OR ..., respetando ASC/DESC por columna.
+    Se expande en vez de usar comparación de tuplas porque las claves
+    pueden mezclar direcciones y SQLite antiguo no compara tuplas.
+    """
+    condiciones = []
+    for i, clave in enumerate(claves):
+        iguales = [c.expr == v for c, v in zip(claves[:i], valores[:i])]
+        descendente = clave.desc != invertir
+        if descendente:
+            comparacion = clave.expr < valores[i]
+        else:
+            comparacion = clave.expr > valores[i]
+        condiciones.append(and_(*iguales, comparacion))
+    return or_(*condiciones)
+
+
+def _orden(claves, invertir=False):
+    return [
+        c.expr.asc() if c.desc == invertir else c.expr.desc()
+        for c in claves
+    ]
+
+
+def paginar_keyset(
+    query,
+    claves: list[Clave],
+    per_page: int,
+    despues: str | None = None,
+    antes: str | None = None,
+    ultima: bool = False,
+    limite_ultima: int | None = None,
+) -> Pagina:
+    """
+    Trae UNA página de `query` ordenada por `claves`.
+
+    - despues: cursor de la última fila de la página anterior (avanzar).
+    - antes:   cursor de la primera fila de la página siguiente (retroceder).
+    - ultima:  ir directo a la última página (se recorre el orden invertido).
+
+    `query` es una query ORM de una sola entidad; los valores de la clave
+    se agregan como columnas extra para poder armar los cursores.
+    """
+    valores_despues = decodificar_cursor(despues, len(claves))
+    valores_antes = decodificar_cursor(antes, len(claves))
+
+    hacia_atras = ultima or (valores_antes is not None and valores_despues is None)
+
+    q = query.add_columns(*[c.expr for c in claves])
+
+    if ultima:
+        limite = limite_ultima or per_page
+    elif hacia_atras:
+        q = q.filter(_condicion_despues(claves, valores_antes, invertir=True))
+        limite = per_page
+    else:
+        if valores_despues is not None:
+            q = q.filter(_condicion_despues(claves, valores_despues))
+        limite = per_page
+
+    filas = q.order_by(None).order_by(*_orden(claves, invertir=hacia_atras)).limit(limite + 1).all()
+
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    if hacia_atras:
+        filas.reverse()
+
+    n = len(claves)
+    pagina = Pagina(items=[fila[0] for fila in filas])
+    if not filas:
+        return pagina
+
+    pagina.cursor_anterior = codificar_cursor(list(filas[0][-n:]))
+    pagina.cursor_siguiente = codificar_cursor(list(filas[-1][-n:]))
+
+    if hacia_atras:
+        pagina.tiene_anterior = hay_mas
+        pagina.tiene_siguiente = not ultima
+    else:
+        pagina.tiene_siguiente = hay_mas
+        pagina.tiene_anterior = valores_despues is not None
+
+    return pagina
+
+
+def paginar_listado(query, claves, args, total: int, per_page: int, total_estimado: bool = False):
+    """
+    Atajo para las vistas de listado: lee de `args` (request.args) los
+    parámetros del paginador (page, despues, antes, ultima), trae la página
+    y ajusta el número de página a mostrar.
+
+    Devuelve (pagina, page, total_pages).
+    """
+    page = args.get("page", 1, type=int)
+    despues = args.get("despues", type=str)
+    antes = args.get("antes", type=str)
+    ultima = args.get("ultima", type=int) == 1
+
+    total_pages = max(1, (total + per_page - 1) // per_page)
+
+    if ultima:
+        page = total_pages
+    page = min(max(page, 1), total_pages)
+
+    # En la última página solo van las filas que "sobran" del total
+    limite_ultima = None
+    if ultima and not total_estimado and total:
+        limite_ultima = total - (total_pages - 1) * per_page
+
+    pagina = paginar_keyset(
+        query,
+        claves,
+        per_page,
+        despues=despues,
+        antes=antes,
+        ultima=ultima,
+        limite_ultima=limite_ultima,
+    )
+    if not pagina.tiene_anterior:
+        page = 1
+
+    return pagina, page, total_pages
+
+
+# ==========================
+# Conteos
+# ==========================
+
+CONTEO_TTL_SEGUNDOS = 60
+
+# Bajo este número de filas se cuenta exacto aunque haya estimación disponible.
+UMBRAL_ESTIMACION = 50_000
+
+
+def contar_exacto(query, columna) -> int:
+    """COUNT(columna) sobre la query filtrada, sin ORDER BY ni carga de objetos."""
+    return query.order_by(None).with_entities(func.count(columna)).scalar() or 0
+
+
+def _estimacion_postgres(tabla: str) -> int | None:
+    fila = db.session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:tabla)"),
+        {"tabla": tabla},
+    ).first()
+    if not fila or fila[0] is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+
+def contar_tabla(modelo, ttl: int = CONTEO_TTL_SEGUNDOS) -> tuple[int, bool]:
+    """
+    Conteo barato para vistas SIN filtros.
+
+    En PostgreSQL usa la estimación del planner (pg_class.reltuples) cuando
+    la tabla es grande; en tablas chicas o en SQLite cuenta exacto.
+    El resultado se guarda `ttl` segundos en la caché compartida
+    (app/cache.py), así que un solo worker cuenta por período.
+
+    Devuelve (total, es_estimado).
+    """
+    tabla = modelo.__tablename__
+
+    def contar():
+        if db.engine.dialect.name == "postgresql":
+            aprox = _estimacion_postgres(tabla)
+            if aprox is not None and aprox >= UMBRAL_ESTIMACION:
+                return aprox, True
+        return db.session.query(func.count(modelo.id)).scalar() or 0, False
+
+    return obtener_cache().obtener_o_calcular(f"conteos:{tabla}", contar, ttl=ttl)
+
+
+# ==========================
+# Listados en stream
+# ==========================
+
+LOTE_STREAM = 500              # filas por viaje del cursor del servidor
+TROZO_RESPUESTA = 4 * 1024     # caracteres mínimos por write() al socket
+
+
+class FilasEnStream:
+    """
+    Filas que se leen mientras la plantilla las recorre. `{% if filas %}`
+    solo adelanta la primera fila; el resto sigue en el cursor.
+    """
+
+    def __init__(self, filas):
+        self._filas = iter(filas)
+        self._primera = []
+
+    def __bool__(self):
+        if not self._primera:
+            fila = next(self._filas, None)
+            if fila is not None:
+                self._primera.append(fila)
+        return bool(self._primera)
+
+    def __iter__(self):
+        yield from self._primera
+        self._primera = []
+        yield from self._filas
+
+
+def listado_completo(query, claves: list[Clave], lote: int = LOTE_STREAM) -> FilasEnStream:
+    """Todas las filas en el orden de `claves`, por lotes (cursor del servidor en PostgreSQL)."""
+    return FilasEnStream(query.order_by(None).order_by(*_orden(claves)).yield_per(lote))
+
+
+def _agrupar(trozos, minimo: int):
+    """Junta las piezas chicas que entrega Jinja en writes de al menos `minimo`."""
+    pendientes, largo = [], 0
+    for trozo in trozos:
+        pendientes.append(trozo)
+        largo += len(trozo)
+        if largo >= minimo:
+            yield "".join(pendientes)
+            pendientes, largo = [], 0
+    if pendientes:
+        yield "".join(pendientes)
+
+
+def responder_en_stream(plantilla: str, **contexto):
+    """
+    stream_template con las piezas agrupadas. Los mensajes flash se leen
+    antes: la sesión se guarda al armar la respuesta, no al terminar de
+    enviar el cuerpo.
+    """
+    get_flashed_messages()
+    respuesta = current_app.response_class(
+        _agrupar(stream_template(plantilla, **contexto), TROZO_RESPUESTA),
+        mimetype="text/html",
+    )
+    respuesta.headers["X-Accel-Buffering"] = "no"
+    return respuesta
@@ -0,0 +1,177 @@
+# web/app/resp_local.py
+
+"""
+Servidor mínimo del protocolo de Redis (RESP), en memoria, para probar
+CacheRedis sin un Redis instalado:
+
+    flask cache-probar                        # levanta este servidor y prueba contra él
+    flask cache-probar --url redis://host:6379/0
+
+Entiende solo lo que usa app/cache.py: PING, AUTH, SELECT, GET,
+SET (NX, PX, EX), DEL y EVAL del script LIBERAR_BLOQUEO (no ejecuta Lua:
+reconoce ese script y hace la comparación en Python). No es para
+producción: un solo diccionario, sin persistencia.
+"""
+
+import socketserver
+import threading
+import time
+
+from .cache import LIBERAR_BLOQUEO, CacheRedis, ClienteRESP
+
+
+class _Manejador(socketserver.StreamRequestHandler):
+    def _leer_comando(self):
+        linea = self.rfile.readline()
+        if not linea:
+            return None
+        if not linea.startswith(b"*"):
+            raise ValueError("se esperaba un arreglo RESP")
+        argumentos = []
+        for _ in range(int(linea[1:-2])):
+            largo = int(self.rfile.readline()[1:-2])
+            argumentos.append(self.rfile.read(largo + 2)[:-2])
+        return argumentos
+
+    def handle(self):
+        while True:
+            try:
+                argumentos = self._leer_comando()
+            except ValueError as e:
+                self.wfile.write(b"-ERR %s\r\n" % str(e).encode())
+                return
+            if argumentos is None:
+                return
+            self.wfile.write(self.server.ejecutar(argumentos))
+
+
+class ServidorRESP(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, direccion=("127.0.0.1", 0)):
+        super().__init__(direccion, _Manejador)
+        self._datos = {}    # clave -> (vence | None, valor)
+        self._lock = threading.Lock()
+
+    @property
+    def puerto(self) -> int:
+        return self.server_address[1]
+
+    def _vigente(self, clave):
+        entrada = self._datos.get(clave)
+        if entrada is not None and entrada[0] is not None and entrada[0] <= time.monotonic():
+            del self._datos[clave]
+            return None
+        return entrada
+
+    def _set(self, clave, valor, opciones):
+        vence, solo_si_falta = None, False
+        i = 0
+        while i < len(opciones):
+            opcion = opciones[i].upper()
+            if opcion == b"NX":
+                solo_si_falta = True
+            elif opcion in (b"PX", b"EX"):
+                i += 1
+                cantidad = int(opciones[i]) / (1000 if opcion == b"PX" else 1)
+                vence = time.monotonic() + cantidad
+            else:
+                return b"-ERR opcion de SET no soportada\r\n"
+            i += 1
+        if solo_si_falta and self._vigente(clave) is not None:
+            return b"$-1\r\n"
+        self._datos[clave] = (vence, valor)
+        return b"+OK\r\n"
+
+    def ejecutar(self, argumentos) -> bytes:
+        comando, resto = argumentos[0].upper(), argumentos[1:]
+        with self._lock:
+            if comando in (b"PING", b"AUTH", b"SELECT"):
+                return b"+OK\r\n" if comando != b"PING" else b"+PONG\r\n"
+            if comando == b"GET":
+                entrada = self._vigente(resto[0])
+                if entrada is None:
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(entrada[1]), entrada[1])
+            if comando == b"SET":
+                return self._set(resto[0], resto[1], resto[2:])
+            if comando == b"DEL":
+                borradas = sum(
+                    self._vigente(clave) is not None and self._datos.pop(clave) is not None
+                    for clave in resto
+                )
+                return b":%d\r\n" % borradas
+            if comando == b"EVAL" and resto[0].decode() == LIBERAR_BLOQUEO:
+                _, _, clave, ficha = resto
+                entrada = self._vigente(clave)
+                if entrada is not None and entrada[1] == ficha:
+                    del self._datos[clave]
+                    return b":1\r\n"
+                return b":0\r\n"
+        return b"-ERR comando no soportado por el servidor local\r\n"
+
+
+def iniciar(puerto: int = 0) -> ServidorRESP:
+    """Servidor en un hilo de fondo; puerto 0 = uno libre (ver .puerto)."""
+    servidor = ServidorRESP(("127.0.0.1", puerto))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+# ==========================
+# Prueba del backend
+# ==========================
+
+def probar(cache: CacheRedis, log=print) -> bool:
+    """
+    Ejercita GET / SET / PX / NX / DEL y el bloqueo de CacheRedis contra
+    el servidor de `cache`. Devuelve True si todo salió como se esperaba.
+    """
+    comando = cache.cliente.comando
+    clave = "rrhh:prueba:valor"
+    pruebas = []
+
+    def revisar(nombre, condicion):
+        pruebas.append(condicion)
+        log(f"{'✅' if condicion else '❌'} {nombre}")
+
+    comando("DEL", clave)
+    revisar("GET de clave inexistente", comando("GET", clave) is None)
+    revisar("SET / GET", comando("SET", clave, "uno") == "OK" and comando("GET", clave) == b"uno")
+    revisar("SET NX sobre clave existente", comando("SET", clave, "dos", "NX") is None
+            and comando("GET", clave) == b"uno")
+    revisar("DEL", comando("DEL", clave) == 1 and comando("GET", clave) is None)
+    comando("SET", clave, "tres", "PX", 100)
+    revisar("PX: vigente antes de vencer", comando("GET", clave) == b"tres")
+    time.sleep(0.15)
+    revisar("PX: vencida", comando("GET", clave) is None)
+
+    # Bloqueo que vence mientras se calcula: otro proceso lo toma y el
+    # primero, al terminar, no debe borrárselo
+    bloqueo = f"{clave}:calculando"
+    with cache._bloqueo(clave, 0.1) as obtenido:
+        revisar("bloqueo obtenido", obtenido)
+        time.sleep(0.15)
+        revisar("bloqueo vencido lo toma otro", comando("SET", bloqueo, "otro", "NX", "PX", 5000) == "OK")
+    revisar("liberar no borra el bloqueo ajeno", comando("GET", bloqueo) == b"otro")
+    comando("DEL", bloqueo)
+
+    with cache._bloqueo(clave, 5) as obtenido:
+        revisar("bloqueo propio", obtenido and comando("SET", bloqueo, "otro", "NX") is None)
+    revisar("liberar borra el bloqueo propio", comando("GET", bloqueo) is None)
+
+    valor = cache.obtener_o_calcular("prueba:calculado", lambda: {"ok": True}, ttl=5)
+    revisar("obtener_o_calcular", valor == {"ok": True} and cache.obtener("prueba:calculado") == valor)
+    cache.borrar("prueba:calculado")
+    return all(pruebas)
+
+
+def probar_local(log=print) -> bool:
+    """probar() contra un servidor local levantado para la ocasión."""
+    servidor = iniciar()
+    try:
+        return probar(CacheRedis(ClienteRESP(puerto=servidor.puerto)), log=log)
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,75 @@
+/*
+ * Autocompletar liviano sobre /api/buscar/<tipo>.
+ *
+ * Uso en un formulario:
+ *   <input type="text" data-typeahead="/api/buscar/trabajadores"
+ *          data-typeahead-target="trabajador_id" list="trabajadores_opciones">
+ *   <datalist id="trabajadores_opciones"></datalist>
+ *   <input type="hidden" id="trabajador_id" name="trabajador_id">
+ *
+ * Las opciones se piden a medida que se escribe (con una pequeña espera),
+ * en vez de mandar todas las opciones en el HTML.
+ */
+(function () {
+    "use strict";
+
+    var ESPERA_MS = 200;
+    var MIN_CARACTERES = 2;
+
+    function etiqueta(item) {
+        return item.rut ? item.rut + " · " + item.texto : item.texto;
+    }
+
+    function enlazar(input) {
+        var url = input.getAttribute("data-typeahead");
+        var lista = document.getElementById(input.getAttribute("list"));
+        var destino = document.getElementById(input.getAttribute("data-typeahead-target"));
+        var temporizador = null;
+        var porEtiqueta = {};
+        var ultimaConsulta = "";
+
+        function aplicarSeleccion() {
+            var item = porEtiqueta[input.value];
+            if (destino) {
+                destino.value = item ? item.id : "";
+            }
+        }
+
+        function pedir() {
+            var q = input.value.trim();
+            if (q.length < MIN_CARACTERES || q === ultimaConsulta) {
+                return;
+            }
+            ultimaConsulta = q;
+            fetch(url + "?q=" + encodeURIComponent(q), { headers: { "Accept": "application/json" } })
+                .then(function (r) { return r.ok ? r.json() : { resultados: [] }; })
+                .then(function (datos) {
+                    if (input.value.trim() !== q) {
+                        return;  // respuesta vieja
+                    }
+                    porEtiqueta = {};
+                    lista.innerHTML = "";
+                    datos.resultados.forEach(function (item) {
+                        var texto = etiqueta(item);
+                        porEtiqueta[texto] = item;
+                        var opcion = document.createElement("option");
+                        opcion.value = texto;
+                        lista.appendChild(opcion);
+                    });
+                    aplicarSeleccion();
+                })
+                .catch(function () { /* sin red: se deja escribir igual */ });
+        }
+
+        input.addEventListener("input", function () {
+            aplicarSeleccion();
+            clearTimeout(temporizador);
+            temporizador = setTimeout(pedir, ESPERA_MS);
+        });
+        input.addEventListener("change", aplicarSeleccion);
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        document.querySelectorAll("input[data-typeahead]").forEach(enlazar);
+    });
+})();
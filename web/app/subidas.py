@@ -0,0 +1,196 @@
+# web/app/subidas.py
+
+"""
+Subida del archivo de un documento laboral a su carpeta en Nextcloud.
+
+- El multipart se parsea con un stream_factory propio (ArchivoEntrante):
+  cada trozo que llega se escribe a un temporal dentro de
+  NEXTCLOUD_ROOT/.subidas y se suma al SHA-256 en la misma pasada. El
+  archivo nunca queda entero en memoria y, como el temporal está en el
+  mismo disco, dejarlo en su carpeta es un rename.
+- Con el hash y el tamaño guardados en DocumentoLaboral, si el mismo
+  escaneo ya se subió para otro contrato, el nuevo nombre se crea como
+  enlace duro al existente (los bytes quedan una sola vez en disco).
+  Nextcloud reemplaza los archivos al editarlos (no los reescribe), así
+  que modificar uno no arrastra al otro.
+- Ni el indexador ni el sincronizador miran nombres que empiezan con
+  punto, así que .subidas no aparece en el índice.
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+
+from werkzeug.formparser import parse_form_data
+
+from .config import get_nextcloud_base_path, ruta_fisica_documento
+from .derivados import rutas_documentos
+from .extensions import db
+from .indice_archivos import registrar_archivo
+from .models import DocumentoLaboral
+
+
+CARPETA_TEMPORAL = ".subidas"
+BLOQUE = 1024 * 1024
+PERMISOS = 0o664  # que Nextcloud (otro usuario del grupo) lo pueda leer
+
+
+class ArchivoEntrante:
+    """
+    Destino de un archivo del multipart: temporal en disco + SHA-256 y
+    tamaño calculados mientras werkzeug va escribiendo.
+    """
+
+    def __init__(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        self._archivo = tempfile.NamedTemporaryFile(dir=directorio, suffix=".part", delete=False)
+        self.ruta = self._archivo.name
+        self._hash = hashlib.sha256()
+        self.tamano = 0
+
+    def write(self, datos):
+        self._hash.update(datos)
+        self.tamano += len(datos)
+        return self._archivo.write(datos)
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def descartar(self):
+        self._archivo.close()
+        try:
+            os.unlink(self.ruta)
+        except FileNotFoundError:
+            pass
+
+    def __getattr__(self, nombre):
+        # seek / read / close / flush ... del temporal
+        return getattr(self._archivo, nombre)
+
+
+def parsear_formulario(environ, max_content_length=None):
+    """
+    (form, files) de un POST multipart; los archivos quedan como
+    FileStorage cuyo .stream es un ArchivoEntrante.
+    """
+    directorio = get_nextcloud_base_path() / CARPETA_TEMPORAL
+
+    def fabrica(total_content_length, content_type, filename, content_length=None):
+        return ArchivoEntrante(directorio)
+
+    _, form, files = parse_form_data(
+        environ, stream_factory=fabrica, max_content_length=max_content_length
+    )
+    return form, files
+
+
+def descartar_archivos(files):
+    """Borra los temporales que no se usaron."""
+    for archivo in files.values():
+        if isinstance(archivo.stream, ArchivoEntrante):
+            archivo.stream.descartar()
+
+
+@dataclass
+class ResultadoSubida:
+    ruta: str                                   # ruta lógica final
+    tamano: int
+    sha256: str
+    duplicado_de: DocumentoLaboral | None = None  # mismo contenido en otro documento
+    enlazado: bool = False                      # creado como enlace duro al anterior
+    destino: object = None                      # ruta física final
+    creado: bool = False                        # el archivo en destino lo puso esta subida
+
+
+def _mismo_contenido(ruta, sha256: str, tamano: int) -> bool:
+    if os.path.getsize(ruta) != tamano:
+        return False
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        while datos := archivo.read(BLOQUE):
+            resumen.update(datos)
+    return resumen.hexdigest() == sha256
+
+
+def guardar_archivo(documento: DocumentoLaboral, entrante: ArchivoEntrante) -> ResultadoSubida:
+    """
+    Deja el archivo subido en carpeta_destino/nombre_archivo del documento
+    (que ya debe estar en la sesión) y guarda hash, tamaño y presencia.
+    No confirma: si el commit falla, descartar_subida() quita el archivo.
+    Lanza ValueError si el archivo está vacío o si ya hay otro distinto
+    con ese nombre.
+    """
+    entrante.flush()
+    if entrante.tamano == 0:
+        raise ValueError("El archivo está vacío.")
+
+    db.session.flush()  # carpeta_destino la calculan los eventos de sesión
+    ruta_logica = rutas_documentos([documento])[documento.id]
+    if not ruta_logica:
+        raise ValueError("No se pudo determinar la carpeta del documento.")
+    destino = ruta_fisica_documento(ruta_logica)
+
+    resultado = ResultadoSubida(ruta_logica, entrante.tamano, entrante.sha256, destino=destino)
+    resultado.duplicado_de = (
+        DocumentoLaboral.query
+        .filter(
+            DocumentoLaboral.sha256 == resultado.sha256,
+            DocumentoLaboral.tamano_bytes == resultado.tamano,
+            DocumentoLaboral.id != documento.id,
+        )
+        .order_by(DocumentoLaboral.id)
+        .first()
+    )
+
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    if destino.exists():
+        if not _mismo_contenido(destino, resultado.sha256, resultado.tamano):
+            raise ValueError(f"Ya existe otro archivo con el nombre {destino.name}.")
+        entrante.descartar()
+    else:
+        if resultado.duplicado_de is not None:
+            resultado.enlazado = _enlazar(resultado.duplicado_de, destino, resultado)
+        if resultado.enlazado:
+            entrante.descartar()
+        else:
+            entrante.close()
+            os.chmod(entrante.ruta, PERMISOS)  # mkstemp lo crea 0600
+            os.replace(entrante.ruta, destino)
+        resultado.creado = True
+
+    documento.sha256 = resultado.sha256
+    documento.tamano_bytes = resultado.tamano
+    documento.archivo_en_disco = True
+    registrar_archivo(ruta_logica, destino)
+    return resultado
+
+
+def descartar_subida(resultado: ResultadoSubida) -> None:
+    """
+    Deshace guardar_archivo() cuando el commit falló: borra el archivo
+    (o enlace) que dejó en destino. Uno que ya estaba ahí no se toca.
+    """
+    if not resultado.creado:
+        return
+    try:
+        os.unlink(resultado.destino)
+    except FileNotFoundError:
+        pass
+
+
+def _enlazar(original: DocumentoLaboral, destino, resultado: ResultadoSubida) -> bool:
+    """Enlace duro al archivo del documento original, si sigue igual en disco."""
+    ruta_original = rutas_documentos([original])[original.id]
+    if not ruta_original:
+        return False
+    try:
+        fuente = ruta_fisica_documento(ruta_original)
+        if not _mismo_contenido(fuente, resultado.sha256, resultado.tamano):
+            return False
+        os.link(fuente, destino)
+    except (ValueError, OSError):
+        # No está, cambió, u otro sistema de archivos: se guarda la copia subida
+        return False
+    return True
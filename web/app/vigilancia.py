@@ -0,0 +1,368 @@
+# web/app/vigilancia.py
+
+"""
+Vigilancia en vivo del árbol de documentos (NEXTCLOUD_ROOT) con inotify.
+
+`flask watch-documentos` es un proceso opcional de larga duración:
+
+- Pone un watch de inotify en cada carpeta del árbol (empleadores,
+  trabajadores, tipos de documento...).
+- Cada evento solo marca su carpeta como "sucia". Nextcloud sincroniza a
+  ráfagas (temporales, renombres, varios archivos seguidos), así que una
+  carpeta se procesa cuando lleva `espera` segundos sin eventos.
+- Procesar = relistar esas carpetas con el Indexador de
+  app/indice_archivos.py, que aplica altas, bajas y movimientos en
+  archivos_indexados y actualiza DocumentoLaboral.archivo_en_disco.
+- Si se agota fs.inotify.max_user_watches (o no hay inotify), cae a
+  escaneos incrementales periódicos (los mismos de `flask indexar-documentos`).
+- Contadores (eventos, carpetas en cola, retraso...) en el log y, con
+  --estado, en un archivo JSON que otro proceso puede leer.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+from .extensions import db
+from .indice_archivos import Indexador, ignorar
+
+
+# ==========================
+# inotify (ctypes, solo Linux)
+# ==========================
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+MASCARA = (
+    IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENTO = struct.Struct("iIII")   # wd, mask, cookie, len
+
+
+class LimiteWatches(OSError):
+    """Se agotó fs.inotify.max_user_watches (ENOSPC)."""
+
+
+class Inotify:
+    """Envoltorio mínimo de inotify(7) sobre la libc."""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify solo existe en Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def agregar(self, ruta: str, mascara: int = MASCARA) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(ruta), mascara)
+        if wd < 0:
+            e = ctypes.get_errno()
+            if e == errno.ENOSPC:
+                raise LimiteWatches(e, "se agotó fs.inotify.max_user_watches")
+            raise OSError(e, os.strerror(e), ruta)
+        return wd
+
+    def quitar(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def leer(self):
+        """Eventos pendientes: [(wd, mask, cookie, nombre)]."""
+        eventos = []
+        while True:
+            try:
+                datos = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return eventos
+            pos = 0
+            while pos < len(datos):
+                wd, mascara, cookie, largo = _EVENTO.unpack_from(datos, pos)
+                pos += _EVENTO.size
+                nombre = os.fsdecode(datos[pos:pos + largo].rstrip(b"\0"))
+                pos += largo
+                eventos.append((wd, mascara, cookie, nombre))
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+# ==========================
+# Vigilante
+# ==========================
+
+@dataclass
+class Contadores:
+    modo: str = "inotify"               # inotify / escaneo
+    watches: int = 0
+    eventos: int = 0
+    desbordes: int = 0                  # IN_Q_OVERFLOW: la cola del kernel se llenó
+    carpetas_en_cola: int = 0           # sucias esperando a que pase la ráfaga
+    refrescos: int = 0                  # carpetas relistadas
+    escaneos: int = 0                   # escaneos incrementales completos
+    errores: int = 0
+    retraso_ultimo: float = 0.0         # s entre el primer evento de una carpeta y su aplicación
+    retraso_max: float = 0.0
+    ultimo_cambio: float = 0.0          # time.time() de la última aplicación
+
+
+class Vigilante:
+    """
+    Bucle principal de `flask watch-documentos`. Ver el docstring del módulo.
+
+    - espera: segundos sin eventos en una carpeta antes de procesarla.
+    - intervalo_escaneo: en modo escaneo, cada cuánto se recorre el árbol.
+    """
+
+    def __init__(self, raiz=None, espera: float = 2.0, intervalo_escaneo: float = 300.0,
+                 archivo_estado: str | None = None, intervalo_reporte: float = 60.0, log=print):
+        self.indexador = Indexador(raiz, log=lambda *a: None)
+        self.raiz = self.indexador.raiz
+        self.espera = espera
+        self.intervalo_escaneo = intervalo_escaneo
+        self.archivo_estado = archivo_estado
+        self.intervalo_reporte = intervalo_reporte
+        self.log = log
+        self.contadores = Contadores()
+
+        self._inotify = None
+        self._rutas = {}           # wd -> ruta lógica
+        self._wds = {}             # ruta lógica -> wd
+        self._sucias = {}          # ruta lógica -> (primer evento, último evento)
+        self._escaneo_pendiente = False
+        self._proximo_escaneo = 0.0
+        self._proximo_reporte = 0.0
+        self._proximo_estado = 0.0
+        self._activo = True
+
+    # ---------- watches ----------
+
+    def _vigilar_arbol(self, fisica: str):
+        """Agrega watches a `fisica` y todas sus subcarpetas."""
+        pendientes = [fisica]
+        while pendientes:
+            actual = pendientes.pop()
+            try:
+                wd = self._inotify.agregar(actual)
+            except FileNotFoundError:
+                continue
+            logica = self.indexador.logica(actual)
+            self._rutas[wd] = logica
+            self._wds[logica] = wd
+            try:
+                with os.scandir(actual) as entradas:
+                    pendientes.extend(
+                        e.path for e in entradas
+                        if e.is_dir(follow_symlinks=False) and not ignorar(e.name)
+                    )
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+        self.contadores.watches = len(self._rutas)
+
+    def _olvidar_arbol(self, logica: str):
+        """Quita los watches de una carpeta movida fuera (sus wd siguen vivos con la ruta vieja)."""
+        prefijo = f"{logica}/"
+        for ruta in [r for r in self._wds if r == logica or r.startswith(prefijo)]:
+            wd = self._wds.pop(ruta)
+            self._rutas.pop(wd, None)
+            self._inotify.quitar(wd)
+        self.contadores.watches = len(self._rutas)
+
+    def _pasar_a_escaneo(self, motivo: str):
+        self.log(f"⚠️  {motivo}: se pasa a escaneos incrementales cada {self.intervalo_escaneo:.0f} s")
+        if self._inotify is not None:
+            self._inotify.cerrar()
+            self._inotify = None
+        self._rutas.clear()
+        self._wds.clear()
+        self.contadores.modo = "escaneo"
+        self.contadores.watches = 0
+        self._proximo_escaneo = time.monotonic() + self.intervalo_escaneo
+
+    def _iniciar_inotify(self):
+        try:
+            self._inotify = Inotify()
+            self._vigilar_arbol(str(self.raiz))
+        except LimiteWatches:
+            self._pasar_a_escaneo(
+                f"Se agotaron los watches de inotify con {len(self._rutas)} carpetas "
+                f"(subir fs.inotify.max_user_watches)"
+            )
+        except OSError as e:
+            self._pasar_a_escaneo(f"inotify no disponible ({e})")
+
+    # ---------- eventos ----------
+
+    def _marcar(self, logica: str, ahora: float):
+        primero, _ = self._sucias.get(logica, (ahora, ahora))
+        self._sucias[logica] = (primero, ahora)
+
+    def _procesar_eventos(self):
+        ahora = time.monotonic()
+        for wd, mascara, _cookie, nombre in self._inotify.leer():
+            self.contadores.eventos += 1
+            if mascara & IN_Q_OVERFLOW:
+                # Se perdieron eventos: solo un escaneo completo es confiable
+                self.contadores.desbordes += 1
+                self._escaneo_pendiente = True
+                continue
+            carpeta = self._rutas.get(wd)
+            if carpeta is None:
+                continue
+            if mascara & IN_IGNORED:
+                self._rutas.pop(wd, None)
+                if self._wds.get(carpeta) == wd:
+                    del self._wds[carpeta]
+                continue
+            if mascara & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Lo registra el evento de la carpeta padre
+                continue
+            if nombre and ignorar(nombre):
+                continue
+
+            self._marcar(carpeta, ahora)
+            if mascara & IN_ISDIR:
+                hija = f"{carpeta}/{nombre}"
+                if mascara & IN_MOVED_FROM:
+                    self._olvidar_arbol(hija)
+                elif mascara & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._vigilar_arbol(self.indexador.fisica(hija))
+                    except LimiteWatches:
+                        self._pasar_a_escaneo("Se agotaron los watches de inotify")
+                        self._escaneo_pendiente = True
+                        return
+                    self._marcar(hija, ahora)
+
+    def _aplicar_vencidas(self, forzar: bool = False):
+        """Relista las carpetas que llevan `espera` segundos sin eventos."""
+        ahora = time.monotonic()
+        listas = [
+            carpeta for carpeta, (_, ultimo) in self._sucias.items()
+            if forzar or ahora - ultimo >= self.espera
+        ]
+        if not listas:
+            return
+        try:
+            self.indexador.refrescar(listas)
+        except Exception as e:   # noqa: BLE001 - el proceso debe seguir vivo
+            db.session.rollback()
+            self.contadores.errores += 1
+            self.log(f"❌ Error al aplicar cambios ({e}); se reintenta en el próximo ciclo")
+            return
+
+        for carpeta in listas:
+            primero, _ = self._sucias.pop(carpeta)
+            self.contadores.retraso_ultimo = round(ahora - primero, 3)
+            self.contadores.retraso_max = max(self.contadores.retraso_max, self.contadores.retraso_ultimo)
+        self.contadores.refrescos += len(listas)
+        self.contadores.ultimo_cambio = time.time()
+        r = self.indexador.resultado
+        if r.nuevos or r.actualizados or r.eliminados:
+            self.log(
+                f"🔄 {len(listas)} carpeta(s): +{r.nuevos} ~{r.actualizados} -{r.eliminados} archivos"
+            )
+
+    def _escanear(self):
+        try:
+            r = self.indexador.ejecutar()
+        except Exception as e:   # noqa: BLE001
+            db.session.rollback()
+            self.contadores.errores += 1
+            self.log(f"❌ Error en el escaneo ({e})")
+            return
+        self.contadores.escaneos += 1
+        self.contadores.ultimo_cambio = time.time()
+        self._escaneo_pendiente = False
+        if r.listadas:
+            self.log(
+                f"🔎 Escaneo: {r.listadas}/{r.directorios} carpetas con cambios · "
+                f"+{r.nuevos} ~{r.actualizados} -{r.eliminados} archivos"
+            )
+
+    # ---------- contadores ----------
+
+    def _reportar(self, forzar: bool = False):
+        ahora = time.monotonic()
+        self.contadores.carpetas_en_cola = len(self._sucias)
+        if self.archivo_estado and (forzar or ahora >= self._proximo_estado):
+            self._proximo_estado = ahora + 1.0
+            temporal = f"{self.archivo_estado}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(asdict(self.contadores), f)
+            os.replace(temporal, self.archivo_estado)
+        if forzar or ahora >= self._proximo_reporte:
+            c = self.contadores
+            self.log(
+                f"📊 {c.modo} · watches {c.watches} · eventos {c.eventos} · en cola {c.carpetas_en_cola} · "
+                f"retraso {c.retraso_ultimo:.1f}s (máx {c.retraso_max:.1f}s) · errores {c.errores}"
+            )
+            self._proximo_reporte = ahora + self.intervalo_reporte
+
+    # ---------- bucle ----------
+
+    def detener(self, *_):
+        self._activo = False
+
+    def ejecutar(self):
+        if not self.raiz.is_dir():
+            raise FileNotFoundError(f"No existe la carpeta de documentos: {self.raiz}")
+        signal.signal(signal.SIGTERM, self.detener)
+
+        # Primero los watches y después el escaneo de puesta al día: así no
+        # se pierde lo que cambie entre medio.
+        self._iniciar_inotify()
+        self.log(f"👀 Vigilando {self.raiz} ({self.contadores.modo}, {self.contadores.watches} carpetas)")
+        self._escanear()
+
+        try:
+            while self._activo:
+                if self._inotify is not None:
+                    espera = min(self.espera, 1.0)
+                    listos, _, _ = select.select([self._inotify.fd], [], [], espera)
+                    if listos:
+                        self._procesar_eventos()
+                    self._aplicar_vencidas()
+                else:
+                    time.sleep(min(1.0, max(0.0, self._proximo_escaneo - time.monotonic())))
+                    if time.monotonic() >= self._proximo_escaneo:
+                        self._escaneo_pendiente = True
+                        self._proximo_escaneo = time.monotonic() + self.intervalo_escaneo
+
+                if self._escaneo_pendiente:
+                    self._sucias.clear()
+                    self._escanear()
+                self._reportar()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Lo que quedó en cola se aplica antes de salir
+            if self._sucias:
+                self._aplicar_vencidas(forzar=True)
+            self._reportar(forzar=True)
+            if self._inotify is not None:
+                self._inotify.cerrar()
@@ -0,0 +1,141 @@
+# web/app/zip_documentos.py
+
+"""
+ZIP con todos los documentos de un trabajador, contrato u obra (para
+fiscalizaciones), armado en streaming.
+
+Las entradas llevan la ruta lógica de Nextcloud
+(DOCUMENTACION LABORAL/EMPLEADORES/.../CONTRATOS/archivo.pdf), así el ZIP
+reproduce la misma estructura de carpetas.
+
+- Los documentos se leen de la base por lotes y los archivos uno tras
+  otro, en bloques de BLOQUE bytes: la memoria no depende ni de la
+  cantidad ni del tamaño de los archivos.
+- El ZIP se escribe sobre exportar.BufferSalida (no seekable), que se
+  vacía después de cada bloque; no hay archivo temporal.
+- ZIP64 cuando hace falta (archivos o paquete > 4 GB), lo decide zipfile.
+- Los documentos sin archivo en disco se listan en FALTANTES.txt, al
+  final del ZIP.
+"""
+
+import os
+import zipfile
+from datetime import datetime
+
+from .config import ruta_fisica_documento
+from .derivados import rutas_documentos
+from .exportar import BufferSalida, iterar_filas
+from .models import Contrato, DocumentoLaboral
+
+
+BLOQUE = 1024 * 1024
+LOTE_DOCUMENTOS = 500
+
+ALCANCES = ("trabajador", "contrato", "obra")
+
+# Ya vienen comprimidos: deflate solo gastaría CPU
+_SIN_COMPRIMIR = {".pdf", ".jpg", ".jpeg", ".png", ".zip", ".docx", ".xlsx"}
+
+
+def consulta_documentos(alcance: str, id_: int):
+    """Documentos del trabajador / contrato / obra, en orden de carpeta."""
+    consulta = DocumentoLaboral.query
+    if alcance == "contrato":
+        consulta = consulta.filter(DocumentoLaboral.contrato_id == id_)
+    elif alcance == "trabajador":
+        consulta = consulta.join(Contrato).filter(Contrato.trabajador_id == id_)
+    elif alcance == "obra":
+        consulta = consulta.join(Contrato).filter(Contrato.obra_id == id_)
+    else:
+        raise ValueError(f"Alcance desconocido: {alcance}")
+    return consulta.order_by(
+        DocumentoLaboral.carpeta_destino,
+        DocumentoLaboral.nombre_archivo,
+        DocumentoLaboral.id,
+    )
+
+
+def _por_lotes(iterable, lote: int):
+    pendientes = []
+    for elemento in iterable:
+        pendientes.append(elemento)
+        if len(pendientes) >= lote:
+            yield pendientes
+            pendientes = []
+    if pendientes:
+        yield pendientes
+
+
+def archivos_documentos(consulta, faltantes: list, lote: int = LOTE_DOCUMENTOS):
+    """
+    (ruta lógica, ruta en disco) de cada documento con archivo. Los que no
+    lo tienen se agregan a `faltantes` (ruta lógica o "documento N").
+    Dos registros con la misma ruta (mismo archivo) van una sola vez.
+    """
+    anterior = None
+    for documentos in _por_lotes(iterar_filas(consulta, lote), lote):
+        rutas = rutas_documentos(documentos)
+        for documento in documentos:
+            ruta_logica = rutas.get(documento.id)
+            if not ruta_logica:
+                faltantes.append(f"documento {documento.id} (sin ruta)")
+                continue
+            if ruta_logica == anterior:
+                continue
+            anterior = ruta_logica
+            try:
+                ruta = ruta_fisica_documento(ruta_logica)
+            except ValueError:
+                faltantes.append(ruta_logica)
+                continue
+            if not ruta.is_file():
+                faltantes.append(ruta_logica)
+                continue
+            yield ruta_logica, ruta
+
+
+def generar_zip(archivos, faltantes: list | None = None, bloque: int = BLOQUE):
+    """
+    Genera los bytes del ZIP a medida que lee los archivos.
+    `archivos`: iterable de (nombre dentro del ZIP, ruta en disco).
+    """
+    salida = BufferSalida()
+    faltantes = faltantes if faltantes is not None else []
+
+    with zipfile.ZipFile(salida, mode="w", allowZip64=True) as zf:
+        for nombre, ruta in archivos:
+            try:
+                origen = open(ruta, "rb")
+            except OSError:
+                # Borrado entre la verificación y la lectura
+                faltantes.append(nombre)
+                continue
+            with origen:
+                # from_file toma tamaño (decide ZIP64) y fecha del archivo
+                info = zipfile.ZipInfo.from_file(ruta, nombre)
+                extension = os.path.splitext(nombre)[1].lower()
+                info.compress_type = (
+                    zipfile.ZIP_STORED if extension in _SIN_COMPRIMIR else zipfile.ZIP_DEFLATED
+                )
+                with zf.open(info, mode="w") as destino:
+                    while datos := origen.read(bloque):
+                        destino.write(datos)
+                        yield salida.vaciar()
+            yield salida.vaciar()
+
+        if faltantes:
+            zf.writestr(
+                "FALTANTES.txt",
+                "Documentos registrados sin archivo en disco "
+                f"({datetime.now():%d-%m-%Y %H:%M}):\r\n\r\n"
+                + "\r\n".join(faltantes) + "\r\n",
+            )
+
+    yield salida.vaciar()
+
+
+def generar_zip_documentos(alcance: str, id_: int, bloque: int = BLOQUE):
+    """ZIP (en trozos de bytes) con los documentos del alcance pedido."""
+    faltantes = []
+    archivos = archivos_documentos(consulta_documentos(alcance, id_), faltantes)
+    return generar_zip(archivos, faltantes, bloque)